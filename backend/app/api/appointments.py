@@ -3,8 +3,9 @@
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
-from app.api.deps import CurrentUser, DBClient
+from app.api.deps import CurrentUser, DBClient, Jobs
 from app.core.logging import audit_logger
 from app.models.appointments import (
     Appointment,
@@ -12,7 +13,7 @@ from app.models.appointments import (
     AppointmentStatus,
     AppointmentUpdate,
 )
-from app.workers.tasks import process_appointment_task
+from app.workers.dispatch import PROCESS_APPOINTMENT, DispatchError
 
 router = APIRouter()
 
@@ -185,6 +186,7 @@ async def process_appointment(
     appointment_id: UUID,
     current_user: CurrentUser,
     db: DBClient,
+    jobs: Jobs,
 ) -> dict:
     """
     Queue AI processing for an appointment.
@@ -234,27 +236,37 @@ async def process_appointment(
             detail="Appointment must have at least one recording",
         )
 
+    await run_in_threadpool(jobs.ensure_capacity, PROCESS_APPOINTMENT)
+
     # Update appointment status to IN_PROGRESS
     db.table("appointments").update(
         {"status": AppointmentStatus.IN_PROGRESS.value}
     ).eq("id", str(appointment_id)).execute()
 
     # Queue the processing task
-    task = process_appointment_task.delay(
-        appointment_id=str(appointment_id),
-        user_id=str(current_user.id),
-    )
+    try:
+        task_id = jobs.submit(
+            PROCESS_APPOINTMENT,
+            check=False,
+            appointment_id=str(appointment_id),
+            user_id=str(current_user.id),
+        )
+    except DispatchError:
+        db.table("appointments").update(
+            {"status": appointment.get("status", AppointmentStatus.SCHEDULED.value)}
+        ).eq("id", str(appointment_id)).execute()
+        raise
 
     audit_logger.log_access(
         user_id=str(current_user.id),
         action="process",
         resource_type="appointment",
         resource_id=str(appointment_id),
-        details={"task_id": task.id, "template_count": len(template_ids)},
+        details={"task_id": task_id, "template_count": len(template_ids)},
     )
 
     return {
         "message": "Appointment queued for processing",
-        "task_id": task.id,
+        "task_id": task_id,
         "appointment_id": str(appointment_id),
     }
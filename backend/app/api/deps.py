@@ -12,6 +12,7 @@ from app.core.logging import audit_logger
 from app.core.security import verify_token
 from app.db.client import get_supabase_client
 from app.models.users import User, UserRole
+from app.workers.dispatch import JobBackend, get_job_backend
 
 security = HTTPBearer()
 
@@ -105,4 +106,5 @@ def require_roles(*roles: UserRole):
 # Type aliases for cleaner dependency injection
 CurrentUser = Annotated[User, Depends(get_current_active_user)]
 DBClient = Annotated[Client, Depends(get_db)]
+Jobs = Annotated[JobBackend, Depends(get_job_backend)]
 
@@ -1,25 +1,33 @@
 """Clinical notes API endpoints."""
 
+import json
 from uuid import UUID
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 
-from app.api.deps import CurrentUser, DBClient
+from app.api.deps import CurrentUser, DBClient, Jobs
 from app.core.logging import audit_logger
-from app.models.notes import ClinicalNote, NoteCreate, NoteStatus, NoteUpdate
+from app.models.notes import (
+    ClinicalNote,
+    NoteCreate,
+    NoteStatus,
+    NoteUpdate,
+    SectionRegenerate,
+)
+from app.workers.dispatch import GENERATE_NOTE, DispatchError
 
 router = APIRouter()
 
 
-@router.post("/generate", response_model=ClinicalNote, status_code=status.HTTP_202_ACCEPTED)
-async def generate_note(
-    note_request: NoteCreate,
-    current_user: CurrentUser,
-    db: DBClient,
-    background_tasks: BackgroundTasks,
-) -> ClinicalNote:
-    """Generate a clinical note from a transcript using a template."""
+def _create_draft_note(note_request: NoteCreate, db) -> tuple[ClinicalNote, str, str]:
+    """
+    Validate a generation request and create its draft note record.
+
+    Returns:
+        Tuple of (note, transcript_content, template_content)
+    """
     # Verify transcript exists and is completed
     transcript_result = (
         db.table("transcripts")
@@ -72,26 +80,99 @@ async def generate_note(
             detail="Failed to create note record",
         )
 
-    note = ClinicalNote(**result.data[0])
+    return (
+        ClinicalNote(**result.data[0]),
+        transcript_result.data["content"],
+        template_result.data["content"],
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/generate", response_model=ClinicalNote, status_code=status.HTTP_202_ACCEPTED)
+async def generate_note(
+    note_request: NoteCreate,
+    current_user: CurrentUser,
+    db: DBClient,
+    jobs: Jobs,
+) -> ClinicalNote:
+    """Generate a clinical note from a transcript using a template."""
+    await run_in_threadpool(jobs.ensure_capacity, GENERATE_NOTE)
+    note, transcript_content, template_content = _create_draft_note(note_request, db)
 
     # Queue note generation
-    from app.services.note_generator import generate_clinical_note_task
+    try:
+        job_id = jobs.submit(
+            GENERATE_NOTE,
+            check=False,
+            note_id=str(note.id),
+            transcript_content=transcript_content,
+            template_content=template_content,
+        )
+    except DispatchError:
+        db.table("clinical_notes").delete().eq("id", str(note.id)).execute()
+        raise
 
-    background_tasks.add_task(
-        generate_clinical_note_task,
-        note_id=str(note.id),
-        transcript_content=transcript_result.data["content"],
-        template_content=template_result.data["content"],
+    audit_logger.log_access(
+        user_id=str(current_user.id),
+        action="generate",
+        resource_type="clinical_note",
+        resource_id=str(note.id),
+        details={"job_id": job_id},
     )
 
+    return note
+
+
+@router.post("/generate/stream")
+async def generate_note_stream(
+    note_request: NoteCreate,
+    current_user: CurrentUser,
+    db: DBClient,
+) -> StreamingResponse:
+    """
+    Generate a clinical note, streaming it to the client as Server-Sent Events.
+
+    Events:
+        note: the created note record, sent first
+        token: {"text": ...} for each fragment of generated content
+        done: {"id": ..., "status": "generated"} once the note is saved
+        error: {"detail": ...} if generation fails
+    """
+    note, transcript_content, template_content = _create_draft_note(note_request, db)
+
     audit_logger.log_access(
         user_id=str(current_user.id),
         action="generate",
         resource_type="clinical_note",
         resource_id=str(note.id),
+        details={"stream": True},
     )
 
-    return note
+    from app.services.note_generator import stream_clinical_note
+
+    async def events():
+        yield _sse("note", note.model_dump(mode="json"))
+        try:
+            async for text in stream_clinical_note(
+                note_id=str(note.id),
+                transcript_content=transcript_content,
+                template_content=template_content,
+            ):
+                yield _sse("token", {"text": text})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+        yield _sse("done", {"id": str(note.id), "status": NoteStatus.GENERATED.value})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{note_id}", response_model=ClinicalNote)
@@ -201,6 +282,129 @@ async def update_note(
     return ClinicalNote(**result.data[0])
 
 
+@router.post("/{note_id}/regenerate", response_model=ClinicalNote)
+async def regenerate_note_sections(
+    note_id: UUID,
+    request: SectionRegenerate,
+    current_user: CurrentUser,
+    db: DBClient,
+) -> ClinicalNote:
+    """
+    Regenerate some sections of a clinical note, e.g. after a transcript correction.
+
+    The other sections are kept and the transcript's stored analysis is
+    reused, so only the requested sections are written by the LLM. A note
+    the clinician has edited is regenerated from, and written back to, its
+    final content, so edits to the other sections are kept; its stored
+    sections keep describing the generated content. The note keeps its
+    status, except that a draft becomes generated.
+    """
+    result = (
+        db.table("clinical_notes")
+        .select("*")
+        .eq("id", str(note_id))
+        .single()
+        .execute()
+    )
+
+    if not result.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Clinical note not found",
+        )
+
+    note = ClinicalNote(**result.data)
+    if note.status in (NoteStatus.FINALIZED, NoteStatus.EXPORTED):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"A {note.status.value} note cannot be regenerated",
+        )
+
+    transcript_result = (
+        db.table("transcripts")
+        .select("content, segments, status")
+        .eq("id", str(note.transcript_id))
+        .single()
+        .execute()
+    )
+    template_result = (
+        db.table("templates")
+        .select("content")
+        .eq("id", str(note.template_id))
+        .single()
+        .execute()
+    )
+
+    if not transcript_result.data or not template_result.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Transcript or template not found",
+        )
+
+    if transcript_result.data["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transcript is not yet completed",
+        )
+
+    from app.db.client import run_db
+    from app.services.llm.usage import LLMUsage, collect_usage
+    from app.services.note_generator import NoteGeneratorService, parse_segments
+    from app.services.note_sections import join_sections, split_sections
+    from app.services.usage_accounting import record_note_usage
+
+    template_content = template_result.data["content"]
+    if note.final_content:
+        content_field = "final_content"
+        sections = split_sections(note.final_content, template_content)
+    else:
+        content_field = "generated_content"
+        # Notes generated before sections were stored are split on demand
+        sections = note.sections or split_sections(note.generated_content, template_content)
+    unknown = [name for name in request.sections if name not in {s.name for s in sections}]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown sections: {', '.join(unknown)}",
+        )
+
+    usage: list[LLMUsage] = []
+    try:
+        with collect_usage() as usage:
+            sections, analysis = await NoteGeneratorService().regenerate_sections(
+                transcript=transcript_result.data["content"],
+                template=template_content,
+                sections=sections,
+                names=request.sections,
+                segments=parse_segments(transcript_result.data.get("segments")),
+            )
+    finally:
+        await run_db(record_note_usage, db, [str(note_id)], usage)
+
+    update = {content_field: join_sections(sections), "analysis": analysis}
+    if content_field == "generated_content":
+        update["sections"] = [section.model_dump() for section in sections]
+    if note.status == NoteStatus.DRAFT:
+        update["status"] = NoteStatus.GENERATED.value
+
+    result = (
+        db.table("clinical_notes")
+        .update(update)
+        .eq("id", str(note_id))
+        .execute()
+    )
+
+    audit_logger.log_access(
+        user_id=str(current_user.id),
+        action="regenerate",
+        resource_type="clinical_note",
+        resource_id=str(note_id),
+        details={"sections": request.sections},
+    )
+
+    return ClinicalNote(**result.data[0])
+
+
 @router.get("/{note_id}/export/{format}")
 async def export_note(
     note_id: UUID,
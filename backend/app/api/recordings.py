@@ -1,5 +1,7 @@
 """Recordings API endpoints."""
 
+import hashlib
+from collections.abc import AsyncIterator
 from uuid import UUID, uuid4
 
 from fastapi import APIRouter, File, HTTPException, UploadFile, status
@@ -8,6 +10,7 @@ from app.api.deps import CurrentUser, DBClient
 from app.core.config import settings
 from app.core.logging import audit_logger
 from app.models.recordings import Recording, RecordingStatus
+from app.services.storage import upload_stream
 
 router = APIRouter()
 
@@ -22,6 +25,31 @@ ALLOWED_CONTENT_TYPES = {
     "audio/webm",
 }
 
+# Size of reads from the spooled upload
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB",
+    )
+
+
+async def _read_upload(
+    file: UploadFile,
+    max_size: int,
+    hasher,
+) -> AsyncIterator[bytes]:
+    """Yield an upload in chunks, hashing it and enforcing the size limit as it goes."""
+    size = 0
+    while chunk := await file.read(UPLOAD_READ_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise _too_large()
+        hasher.update(chunk)
+        yield chunk
+
 
 @router.post("/upload/{appointment_id}", response_model=Recording, status_code=status.HTTP_201_CREATED)
 async def upload_recording(
@@ -38,29 +66,33 @@ async def upload_recording(
             detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
         )
 
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
-
-    # Check file size
     max_size = settings.max_upload_size_mb * 1024 * 1024
+
+    # Starlette spools the multipart body to a temporary file, so the size is
+    # known without reading the content into memory
+    file_size = file.size
+    if file_size is None:
+        file_size = file.file.seek(0, 2)
+        file.file.seek(0)
     if file_size > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB",
-        )
+        raise _too_large()
 
     # Generate storage path
     recording_id = uuid4()
     storage_path = f"recordings/{appointment_id}/{recording_id}/{file.filename}"
 
-    # Upload to Supabase Storage
+    # Stream to Supabase Storage, hashing the content on the way through
+    hasher = hashlib.sha256()
     try:
-        db.storage.from_("recordings").upload(
-            path=storage_path,
-            file=content,
-            file_options={"content-type": file.content_type},
+        await upload_stream(
+            "recordings",
+            storage_path,
+            _read_upload(file, max_size, hasher),
+            total_size=file_size,
+            content_type=file.content_type,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -75,6 +107,7 @@ async def upload_recording(
         "filename": file.filename,
         "content_type": file.content_type,
         "file_size": file_size,
+        "content_hash": hasher.hexdigest(),
         "status": RecordingStatus.UPLOADED.value,
     }
 
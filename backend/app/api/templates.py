@@ -6,11 +6,37 @@ from fastapi import APIRouter, HTTPException, status
 
 from app.api.deps import CurrentUser, DBClient
 from app.core.logging import audit_logger
-from app.models.templates import Template, TemplateCreate, TemplateType, TemplateUpdate
+from app.models.templates import (
+    Template,
+    TemplateCreate,
+    TemplateType,
+    TemplateUpdate,
+    TemplateVariable,
+)
+from app.services.template_engine import get_template_engine
 
 router = APIRouter()
 
 
+def _template_variables(
+    content: str,
+    declared: list[TemplateVariable] | None = None,
+) -> list[dict]:
+    """
+    Variables a template uses, for the templates.variables column.
+
+    Computed when a template is written so reads never parse templates.
+    """
+    try:
+        variables = get_template_engine().declare_variables(content, declared)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return [v.model_dump() for v in variables]
+
+
 @router.post("/", response_model=Template, status_code=status.HTTP_201_CREATED)
 async def create_template(
     template: TemplateCreate,
@@ -20,7 +46,7 @@ async def create_template(
     """Create a new template."""
     data = template.model_dump()
     data["practice_id"] = str(template.practice_id) if template.practice_id else None
-    data["variables"] = [v.model_dump() for v in template.variables]
+    data["variables"] = _template_variables(template.content, template.variables)
 
     result = db.table("templates").insert(data).execute()
 
@@ -143,21 +169,24 @@ async def update_template(
             detail="No fields to update",
         )
 
-    # Convert variables if present
-    if "variables" in update_data and update_data["variables"]:
-        update_data["variables"] = [v.model_dump() for v in update_data["variables"]]
-
-    # Increment version on content change
-    if "content" in update_data:
+    # Recompute variables and increment version on content change
+    if "content" in update_data or "variables" in update_data:
         current = (
             db.table("templates")
-            .select("version")
+            .select("content, variables, version")
             .eq("id", str(template_id))
             .single()
             .execute()
         )
         if current.data:
-            update_data["version"] = current.data["version"] + 1
+            declared = template_update.variables
+            if declared is None:
+                declared = [TemplateVariable(**v) for v in current.data.get("variables") or []]
+            update_data["variables"] = _template_variables(
+                update_data.get("content", current.data["content"]), declared
+            )
+            if "content" in update_data:
+                update_data["version"] = current.data["version"] + 1
 
     result = (
         db.table("templates")
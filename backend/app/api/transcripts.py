@@ -2,11 +2,13 @@
 
 from uuid import UUID
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
-from app.api.deps import CurrentUser, DBClient
+from app.api.deps import CurrentUser, DBClient, Jobs
 from app.core.logging import audit_logger
 from app.models.transcripts import Transcript, TranscriptStatus
+from app.workers.dispatch import TRANSCRIBE_RECORDING, DispatchError
 
 router = APIRouter()
 
@@ -16,7 +18,7 @@ async def generate_transcript(
     recording_id: UUID,
     current_user: CurrentUser,
     db: DBClient,
-    background_tasks: BackgroundTasks,
+    jobs: Jobs,
 ) -> Transcript:
     """Start transcript generation for a recording."""
     # Check if recording exists
@@ -45,6 +47,8 @@ async def generate_transcript(
     if existing.data:
         return Transcript(**existing.data[0])
 
+    await run_in_threadpool(jobs.ensure_capacity, TRANSCRIBE_RECORDING)
+
     # Create pending transcript record
     transcript_data = {
         "recording_id": str(recording_id),
@@ -64,21 +68,25 @@ async def generate_transcript(
 
     transcript = Transcript(**result.data[0])
 
-    # Queue transcription job (will be processed by Celery worker)
-    from app.services.transcription import process_transcription_task
-
-    background_tasks.add_task(
-        process_transcription_task,
-        transcript_id=str(transcript.id),
-        recording_id=str(recording_id),
-    )
+    # Queue transcription job
+    try:
+        job_id = jobs.submit(
+            TRANSCRIBE_RECORDING,
+            check=False,
+            transcript_id=str(transcript.id),
+            recording_id=str(recording_id),
+        )
+    except DispatchError:
+        # Otherwise a retry would find this transcript and never queue it
+        db.table("transcripts").delete().eq("id", str(transcript.id)).execute()
+        raise
 
     audit_logger.log_access(
         user_id=str(current_user.id),
         action="generate",
         resource_type="transcript",
         resource_id=str(transcript.id),
-        details={"recording_id": str(recording_id)},
+        details={"recording_id": str(recording_id), "job_id": job_id},
     )
 
     return transcript
@@ -154,9 +162,11 @@ async def update_transcript(
     db: DBClient,
 ) -> Transcript:
     """Update transcript content (for manual corrections)."""
+    # Clearing audio_hash takes the edited text out of the transcript cache,
+    # which must only serve Whisper output for identical audio
     result = (
         db.table("transcripts")
-        .update({"content": content, "word_count": len(content.split())})
+        .update({"content": content, "word_count": len(content.split()), "audio_hash": None})
         .eq("id", str(transcript_id))
         .execute()
     )
@@ -0,0 +1,90 @@
+"""LLM usage and cost API endpoints."""
+
+from datetime import datetime
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.api.deps import CurrentUser, DBClient
+from app.core.logging import audit_logger
+from app.models.usage import UsageRollup
+from app.models.users import User
+from app.services.usage_accounting import fetch_usage, rollup
+
+router = APIRouter()
+
+
+def _practice_id(current_user: User) -> str:
+    """The practice whose usage the user may see."""
+    if current_user.practice_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not assigned to a practice",
+        )
+    return str(current_user.practice_id)
+
+
+def _usage_rollup(
+    db,
+    current_user: User,
+    resource_type: str,
+    resource_id: str,
+    filters: dict[str, str],
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> UsageRollup:
+    """Roll up the user's practice's usage rows matching filters."""
+    rows = fetch_usage(
+        db, {**filters, "practice_id": _practice_id(current_user)}, since, until
+    )
+
+    audit_logger.log_access(
+        user_id=str(current_user.id),
+        action="read",
+        resource_type=f"{resource_type}_usage",
+        resource_id=resource_id,
+        details={"count": len(rows)},
+    )
+
+    return rollup(rows)
+
+
+@router.get("/notes/{note_id}", response_model=UsageRollup)
+async def get_note_usage(
+    note_id: UUID,
+    current_user: CurrentUser,
+    db: DBClient,
+) -> UsageRollup:
+    """Get the tokens and cost spent generating a note."""
+    return _usage_rollup(
+        db, current_user, "note", str(note_id), {"note_id": str(note_id)}
+    )
+
+
+@router.get("/appointments/{appointment_id}", response_model=UsageRollup)
+async def get_appointment_usage(
+    appointment_id: UUID,
+    current_user: CurrentUser,
+    db: DBClient,
+) -> UsageRollup:
+    """Get the tokens and cost spent on an appointment's notes, per template."""
+    return _usage_rollup(
+        db,
+        current_user,
+        "appointment",
+        str(appointment_id),
+        {"appointment_id": str(appointment_id)},
+    )
+
+
+@router.get("/practice", response_model=UsageRollup)
+async def get_practice_usage(
+    current_user: CurrentUser,
+    db: DBClient,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> UsageRollup:
+    """Get the tokens and cost spent by the user's practice, optionally over a period."""
+    return _usage_rollup(
+        db, current_user, "practice", _practice_id(current_user), {}, since, until
+    )
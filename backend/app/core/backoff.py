@@ -0,0 +1,15 @@
+"""Retry delays."""
+
+import random
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with jitter for the given retry attempt (0-based).
+
+    Uses "equal jitter": half of the exponential delay is kept and the other
+    half randomized, so retries after a shared outage spread out instead of
+    arriving in synchronized waves, while each still waits a minimum time.
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
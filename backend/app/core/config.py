@@ -25,6 +25,9 @@ class Settings(BaseSettings):
     # Backend uses service role key (secret) for full database access
     supabase_url: str = ""
     supabase_service_role_key: str = ""
+    # Threads for blocking Supabase calls from async code; 0 sizes the pool to
+    # worker_async_concurrency so concurrent tasks do not wait for a thread
+    db_executor_workers: int = 0
     # Note: JWT verification uses JWKS (public keys) fetched from:
     # https://<project>.supabase.co/auth/v1/.well-known/jwks.json
     # No shared secret needed - Supabase uses ES256 asymmetric signing
@@ -32,15 +35,114 @@ class Settings(BaseSettings):
     # OpenAI settings
     openai_api_key: str = ""
 
+    # Transcription settings
+    transcription_model: str = "whisper-1"
+    # Long recordings are split on silence and transcribed chunk by chunk
+    transcription_chunking_enabled: bool = True
+    transcription_chunk_seconds: int = 600
+    transcription_concurrency: int = 4
+    transcription_min_silence_ms: int = 500
+    transcription_silence_threshold_db: float = -40.0
+    # Threads for blocking audio work (transcoding, splitting) so it never
+    # runs on the event loop
+    transcription_executor_workers: int = 4
+    # Completed transcripts are reused for identical audio; this bounds the
+    # in-process index of (audio hash, language, model) -> transcript id
+    transcript_cache_enabled: bool = True
+    transcript_cache_max_entries: int = 10000
+
     # Anthropic settings
     anthropic_api_key: str = ""
 
     # Default LLM provider
     default_llm_provider: Literal["openai", "anthropic", "azure", "ollama"] = "openai"
 
+    # In-process LRU in front of the transcript_analyses table
+    analysis_cache_max_entries: int = 1000
+    # Transcripts over this many (estimated) tokens are analyzed in windows of
+    # analysis_window_tokens concurrently and the results merged; 0 disables
+    analysis_map_reduce_threshold_tokens: int = 16000
+    analysis_window_tokens: int = 6000
+    # Connection pool for LLM API clients (shared per process and event loop)
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 120.0
+
+    # Rate limits per provider and model. LLM_RATE_LIMITS overrides the
+    # defaults per "provider:model", e.g. {"openai:gpt-4o": {"requests_per_minute":
+    # 500, "tokens_per_minute": 30000}}. 0 disables a bucket. The redis
+    # backend shares budgets across worker processes.
+    llm_rate_limit_enabled: bool = True
+    llm_rate_limit_backend: Literal["memory", "redis"] = "memory"
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0
+    llm_rate_limits: dict[str, dict[str, int]] = {}
+    llm_rate_limit_retries: int = 3
+    # Adaptive (AIMD) concurrency per provider and model
+    llm_concurrency_initial: int = 32
+    llm_concurrency_min: int = 1
+    llm_concurrency_max: int = 128
+
+    # Prices in USD per million tokens, by model name or prefix, overriding
+    # the built-in table, e.g. {"gpt-4o": {"input": 2.5, "output": 10,
+    # "cache_read": 1.25}}. Unpriced models are recorded at zero cost.
+    llm_pricing: dict[str, dict[str, float]] = {}
+
+    # Fill several templates for one transcript in a single LLM request
+    llm_batch_generation: bool = True
+    llm_batch_max_templates: int = 4
+
+    # "structured" extracts every template variable in the analysis call and
+    # renders notes locally, asking the LLM only for variables marked
+    # narrative; "llm" has the LLM write each note from its template
+    note_generation_mode: Literal["llm", "structured"] = "llm"
+
+    # Deployment handles patient data. Caches that keep prompts or responses
+    # then only run when they can encrypt what they store.
+    phi_sensitive: bool = True
+
+    # Opt-in cache of LLM responses to identical requests (template
+    # iteration, re-generation). "sqlite" suits the CLI; the path defaults to
+    # ~/.notesmith/llm-cache.sqlite3. With phi_sensitive set it stays off
+    # unless llm_response_cache_encryption_key (a Fernet key) is configured.
+    llm_response_cache_enabled: bool = False
+    llm_response_cache_backend: Literal["memory", "redis", "sqlite"] = "memory"
+    llm_response_cache_max_entries: int = 1000
+    llm_response_cache_ttl_seconds: int = 86400
+    llm_response_cache_path: str = ""
+    llm_response_cache_encryption_key: str = ""
+
+    # Compiled note templates kept in memory per process
+    template_cache_max_entries: int = 256
+
     # Redis settings (for Celery)
     redis_url: str = "redis://localhost:6379/0"
 
+    # Retried Celery tasks wait base * 2^attempt seconds (jittered), up to this
+    task_retry_max_seconds: int = 600
+
+    # Progress checkpoints for resuming retried jobs ("memory" keeps them in
+    # the worker process only). Downloaded audio awaiting a retry is kept in
+    # checkpoint_dir (defaults to the system temp directory).
+    checkpoint_backend: Literal["redis", "memory"] = "redis"
+    checkpoint_ttl_seconds: int = 86400
+    checkpoint_dir: str = ""
+
+    # Celery worker mode: "prefork" runs one task per process; "async" runs
+    # many task coroutines concurrently on each process's event loop
+    worker_mode: Literal["prefork", "async"] = "prefork"
+    worker_async_concurrency: int = 64
+
+    # Where the API sends transcription, note generation and appointment jobs:
+    # "celery" workers, or "inprocess" tasks on the web process's event loop
+    # (development only; jobs are lost on restart). Once job_queue_max_depth
+    # jobs are waiting the API answers 429 (0 disables the limit).
+    job_backend: Literal["celery", "inprocess"] = "celery"
+    job_queue_max_depth: int = 1000
+    job_queue_retry_after_seconds: int = 30
+    job_inprocess_concurrency: int = 4
+
     # CORS settings
     cors_origins: list[str] = ["http://localhost:3000"]
 
@@ -51,6 +153,11 @@ class Settings(BaseSettings):
     # File upload limits
     max_upload_size_mb: int = 100
 
+    # Storage streaming: recordings are moved in chunks of this size so
+    # memory per transfer stays constant
+    storage_download_chunk_kb: int = 1024
+    storage_timeout_seconds: float = 120.0
+
 
 @lru_cache
 def get_settings() -> Settings:
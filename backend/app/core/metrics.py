@@ -0,0 +1,43 @@
+"""Process-wide counters for operational metrics."""
+
+from collections import defaultdict
+from threading import Lock
+
+
+def _metric_key(name: str, labels: dict[str, str]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters."""
+
+    def __init__(self):
+        self._counters: dict[str, float] = defaultdict(float)
+        self._lock = Lock()
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add value to a counter."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def get(self, name: str, **labels: str) -> float:
+        """Current value of a counter."""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0.0)
+
+    def snapshot(self) -> dict[str, float]:
+        """Copy of all counters."""
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def reset(self) -> None:
+        """Clear all counters (for tests)."""
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = Metrics()
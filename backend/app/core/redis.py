@@ -0,0 +1,22 @@
+"""Shared Redis client."""
+
+from functools import lru_cache
+
+from redis import Redis
+
+from app.core.config import settings
+
+
+@lru_cache
+def get_redis() -> Redis:
+    """
+    Get the process-wide synchronous Redis client.
+
+    Short timeouts keep callers responsive when Redis is unavailable;
+    callers that can degrade (caches, checkpoints) should catch RedisError.
+    """
+    return Redis.from_url(
+        settings.redis_url,
+        socket_connect_timeout=1,
+        socket_timeout=2,
+    )
@@ -1,6 +1,8 @@
 """Supabase client configuration."""
 
-from functools import lru_cache
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 
 from supabase import Client, create_client
 
@@ -13,6 +15,26 @@ def get_supabase_client() -> Client:
     return create_client(settings.supabase_url, settings.supabase_service_role_key)
 
 
+@lru_cache
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for blocking Supabase calls from async code."""
+    return ThreadPoolExecutor(
+        max_workers=settings.db_executor_workers or settings.worker_async_concurrency,
+        thread_name_prefix="db",
+    )
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking Supabase call without blocking the event loop.
+
+    Database calls get their own executor so they never queue behind audio
+    splitting on the transcription executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(func, *args, **kwargs))
+
+
 # Convenience instance
 supabase = get_supabase_client() if settings.supabase_url else None
 
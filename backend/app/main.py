@@ -2,11 +2,16 @@
 
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.api import appointments, notes, recordings, templates, transcripts
+from app.api import appointments, notes, recordings, templates, transcripts, usage
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.llm.base import LLMProviderFactory
+from app.services.llm.rate_limit import aclose_rate_limiters
+from app.workers.dispatch import BackendUnavailableError, QueueFullError
 
 
 @asynccontextmanager
@@ -15,6 +20,8 @@ async def lifespan(app: FastAPI):
     # Startup
     yield
     # Shutdown
+    await LLMProviderFactory.aclose()
+    await aclose_rate_limiters()
 
 
 app = FastAPI(
@@ -33,12 +40,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject recording uploads by Content-Length before the body is read."""
+    if request.url.path.startswith("/api/v1/recordings/upload"):
+        content_length = request.headers.get("content-length")
+        max_size = settings.max_upload_size_mb * 1024 * 1024
+        # Allow a little headroom for the multipart envelope
+        limit = max_size + 64 * 1024
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={
+                    "detail": f"File too large. Maximum size: {settings.max_upload_size_mb}MB"
+                },
+            )
+    return await call_next(request)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, exc: QueueFullError):
+    """Ask clients to back off while the job queue is saturated."""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many jobs queued, retry later"},
+        headers={"Retry-After": str(settings.job_queue_retry_after_seconds)},
+    )
+
+
+@app.exception_handler(BackendUnavailableError)
+async def job_backend_unavailable(request: Request, exc: BackendUnavailableError):
+    """Report that jobs cannot be queued at all."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Job queue unavailable, retry later"},
+        headers={"Retry-After": str(settings.job_queue_retry_after_seconds)},
+    )
+
+
 # Include routers
 app.include_router(appointments.router, prefix="/api/v1/appointments", tags=["appointments"])
 app.include_router(recordings.router, prefix="/api/v1/recordings", tags=["recordings"])
 app.include_router(transcripts.router, prefix="/api/v1/transcripts", tags=["transcripts"])
 app.include_router(templates.router, prefix="/api/v1/templates", tags=["templates"])
 app.include_router(notes.router, prefix="/api/v1/notes", tags=["notes"])
+app.include_router(usage.router, prefix="/api/v1/usage", tags=["usage"])
 
 
 @app.get("/health")
@@ -47,6 +94,12 @@ async def health_check():
     return {"status": "healthy", "version": "0.1.0"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Operational counters (cache hit rates, etc.). Contains no PHI."""
+    return metrics.snapshot()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
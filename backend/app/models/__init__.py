@@ -6,10 +6,18 @@ from app.models.appointments import (
     AppointmentStatus,
     AppointmentUpdate,
 )
-from app.models.notes import ClinicalNote, NoteCreate, NoteStatus, NoteUpdate
+from app.models.notes import (
+    ClinicalNote,
+    NoteCreate,
+    NoteSection,
+    NoteStatus,
+    NoteUpdate,
+    SectionRegenerate,
+)
 from app.models.recordings import Recording, RecordingCreate, RecordingStatus
 from app.models.templates import Template, TemplateCreate, TemplateUpdate
 from app.models.transcripts import Transcript, TranscriptSegment, TranscriptStatus
+from app.models.usage import UsageRollup, UsageTotals
 from app.models.users import User, UserCreate, UserRole
 
 __all__ = [
@@ -30,6 +38,10 @@ __all__ = [
     "NoteCreate",
     "NoteUpdate",
     "NoteStatus",
+    "NoteSection",
+    "SectionRegenerate",
+    "UsageRollup",
+    "UsageTotals",
     "User",
     "UserCreate",
     "UserRole",
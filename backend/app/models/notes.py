@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import StrEnum
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.models.base import BaseDBModel, BaseSchema
 
@@ -36,6 +36,16 @@ class AnalysisResult(BaseModel):
     recommendations: list[str] = []
     entities: list[ClinicalEntity] = []
     summary: str | None = None
+    # Template variables extracted alongside the analysis (structured fill)
+    variables: dict[str, str | None] = {}
+
+
+class NoteSection(BaseModel):
+    """One section of a generated note, split at its template's headings."""
+
+    name: str  # e.g. "subjective"; "header" for text before the first heading
+    heading: str  # heading line as written in the note, "" for the header
+    content: str
 
 
 class NoteCreate(BaseSchema):
@@ -52,6 +62,12 @@ class NoteUpdate(BaseSchema):
     status: NoteStatus | None = None
 
 
+class SectionRegenerate(BaseSchema):
+    """Schema for regenerating some sections of a clinical note."""
+
+    sections: list[str] = Field(min_length=1)
+
+
 class ClinicalNote(BaseDBModel):
     """Clinical note model."""
 
@@ -60,6 +76,7 @@ class ClinicalNote(BaseDBModel):
     generated_content: str
     final_content: str | None = None
     analysis: AnalysisResult | None = None
+    sections: list[NoteSection] = []
     status: NoteStatus = NoteStatus.DRAFT
     reviewed_at: datetime | None = None
     reviewed_by: UUID | None = None
@@ -34,5 +34,6 @@ class Recording(BaseDBModel):
     content_type: str
     file_size: int
     duration_seconds: int | None = None
+    content_hash: str | None = None  # SHA-256 of the uploaded audio
     status: RecordingStatus = RecordingStatus.UPLOADING
 
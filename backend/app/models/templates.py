@@ -24,6 +24,9 @@ class TemplateVariable(BaseModel):
     description: str
     required: bool = False
     default_value: str | None = None
+    # Written as free text by the LLM in structured fill mode; other
+    # variables are extracted as values and rendered locally
+    narrative: bool = False
 
 
 class TemplateCreate(BaseSchema):
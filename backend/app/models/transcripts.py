@@ -50,4 +50,6 @@ class Transcript(BaseDBModel):
     status: TranscriptStatus = TranscriptStatus.PENDING
     language: str = "en"
     word_count: int | None = None
+    model: str | None = None  # Transcription model that produced the content
+    audio_hash: str | None = None  # content_hash of the source recording
 
@@ -0,0 +1,24 @@
+"""LLM usage and cost rollup models."""
+
+from pydantic import BaseModel
+
+
+class UsageTotals(BaseModel):
+    """Tokens, cost and latency summed over a set of LLM calls."""
+
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost_usd: float = 0.0
+    avg_latency_ms: float = 0.0
+
+
+class UsageRollup(BaseModel):
+    """Usage totals for a note, appointment or practice, with breakdowns."""
+
+    totals: UsageTotals
+    by_template: dict[str, UsageTotals] = {}
+    by_model: dict[str, UsageTotals] = {}
+    by_operation: dict[str, UsageTotals] = {}
@@ -0,0 +1,93 @@
+"""Persistent store of transcript analyses shared across note generations."""
+
+import hashlib
+import logging
+
+from supabase import Client
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+def transcript_hash(transcript: str) -> str:
+    """SHA-256 of the transcript text."""
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+
+def analysis_key(transcript: str, provider: str, model: str, prompt_version: str) -> str:
+    """Cache key for an analysis of a transcript by a given provider, model and prompt."""
+    return f"{transcript_hash(transcript)}:{provider}:{model}:{prompt_version}"
+
+
+class AnalysisStore:
+    """
+    Analyses keyed by transcript hash, provider, model and prompt version.
+
+    Results are persisted in the `transcript_analyses` table so every note
+    generated from a transcript (in any worker) reuses one analysis. A
+    bounded in-process LRU sits in front of the table.
+    """
+
+    def __init__(self, db: Client | None = None, max_entries: int | None = None):
+        self.db = db
+        self.cache = LRUCache(max_entries or settings.analysis_cache_max_entries)
+
+    def get(self, key: str) -> AnalysisResult | None:
+        """Return a stored analysis, if any."""
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.increment("analysis_store_hits")
+            return cached
+
+        if self.db is not None:
+            try:
+                result = (
+                    self.db.table("transcript_analyses")
+                    .select("analysis")
+                    .eq("cache_key", key)
+                    .execute()
+                )
+            except Exception as e:
+                logger.warning(f"Analysis lookup failed: {e}")
+                result = None
+
+            if result and result.data:
+                analysis = AnalysisResult(**result.data[0]["analysis"])
+                self.cache.set(key, analysis)
+                metrics.increment("analysis_store_hits")
+                return analysis
+
+        metrics.increment("analysis_store_misses")
+        return None
+
+    def put(
+        self,
+        key: str,
+        analysis: AnalysisResult,
+        provider: str,
+        model: str,
+        prompt_version: str,
+    ) -> None:
+        """Persist an analysis. Storage failures are logged, not raised."""
+        self.cache.set(key, analysis)
+
+        if self.db is None:
+            return
+        try:
+            self.db.table("transcript_analyses").upsert(
+                {
+                    "cache_key": key,
+                    "transcript_hash": key.split(":", 1)[0],
+                    "provider": provider,
+                    "model": model,
+                    "prompt_version": prompt_version,
+                    "analysis": analysis.model_dump(),
+                },
+                on_conflict="cache_key",
+            ).execute()
+        except Exception as e:
+            logger.warning(f"Failed to store analysis: {e}")
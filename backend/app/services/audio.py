@@ -0,0 +1,243 @@
+"""Audio utilities for splitting long recordings into transcribable chunks."""
+
+import logging
+import math
+import shutil
+import subprocess
+import wave
+from array import array
+from dataclasses import dataclass
+from operator import mul
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Length of the analysis window used for silence detection
+WINDOW_MS = 50
+
+# Whisper accepts at most 25 MB per request
+WHISPER_MAX_FILE_BYTES = 25 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class AudioChunk:
+    """A slice of a recording written to its own file."""
+
+    index: int
+    path: Path
+    offset_seconds: float
+    duration_seconds: float
+
+
+def wav_duration(path: str | Path) -> float:
+    """Return the duration of a PCM WAV file in seconds."""
+    with wave.open(str(path), "rb") as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+
+def is_chunkable_wav(path: str | Path) -> bool:
+    """
+    Whether a file is PCM WAV that split_on_silence can cut directly.
+
+    Chunks keep the source format, so only 16-bit mono audio at up to
+    16 kHz stays under Whisper's 25 MB limit for a full-length chunk.
+    """
+    try:
+        with wave.open(str(path), "rb") as wav:
+            return (
+                wav.getsampwidth() == 2
+                and wav.getnchannels() == 1
+                and wav.getframerate() <= 16000
+            )
+    except (wave.Error, EOFError):
+        return False
+
+
+def audio_duration(path: str | Path) -> float | None:
+    """
+    Return the duration of any audio file in seconds.
+
+    PCM WAV is read from its header; other formats are probed with ffprobe.
+    Returns None when the container does not record a duration (e.g. WebM
+    written by a browser's MediaRecorder).
+    """
+    try:
+        return wav_duration(path)
+    except (wave.Error, EOFError):
+        pass
+
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        raise RuntimeError("ffprobe is required to measure non-WAV recordings")
+
+    result = subprocess.run(
+        [
+            ffprobe, "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def convert_to_wav(source: str | Path, dest: str | Path, sample_rate: int = 16000) -> Path:
+    """
+    Transcode any audio file to 16-bit mono PCM WAV using ffmpeg.
+
+    16 kHz mono keeps a 10 minute chunk under Whisper's 25 MB limit.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required to split long recordings")
+
+    subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error", "-y",
+            "-i", str(source),
+            "-ac", "1",
+            "-ar", str(sample_rate),
+            "-sample_fmt", "s16",
+            str(dest),
+        ],
+        check=True,
+    )
+    return Path(dest)
+
+
+def _window_rms(wav: wave.Wave_read, window_frames: int) -> list[float]:
+    """Compute the RMS level (0.0-1.0) of each analysis window of a 16-bit WAV."""
+    channels = wav.getnchannels()
+    # Subsample long windows; silence detection does not need every sample
+    stride = max(1, (window_frames * channels) // 200)
+    levels = []
+
+    while True:
+        data = wav.readframes(window_frames)
+        if not data:
+            break
+        samples = array("h", data)[::stride]
+        if not samples:
+            levels.append(0.0)
+            continue
+        energy = sum(map(mul, samples, samples)) / len(samples)
+        levels.append(math.sqrt(energy) / 32768.0)
+
+    return levels
+
+
+def _longest_silent_run(silent: list[bool], lo: int, hi: int, min_run: int) -> int | None:
+    """Return the midpoint of the longest silent run within [lo, hi), if any."""
+    best_len, best_mid = 0, None
+    run_start = None
+
+    for i in range(lo, hi + 1):
+        if i < hi and silent[i]:
+            if run_start is None:
+                run_start = i
+            continue
+        if run_start is not None:
+            run_len = i - run_start
+            # Prefer later runs on ties so chunks stay close to the target length
+            if run_len >= min_run and run_len >= best_len:
+                best_len, best_mid = run_len, run_start + run_len // 2
+            run_start = None
+
+    return best_mid
+
+
+def find_split_points(
+    levels: list[float],
+    max_windows: int,
+    min_silence_windows: int,
+    threshold: float,
+) -> list[int]:
+    """
+    Choose window indexes at which to cut the recording.
+
+    Each cut falls in the middle of the longest silence found in the last
+    half of the allowed chunk length; if there is no silence, the chunk is
+    cut hard at the maximum length.
+    """
+    silent = [level < threshold for level in levels]
+    cuts = []
+    start = 0
+
+    while len(levels) - start > max_windows:
+        lo = start + max_windows // 2
+        hi = start + max_windows
+        cut = _longest_silent_run(silent, lo, hi, min_silence_windows)
+        if cut is None or cut <= start:
+            cut = hi
+        cuts.append(cut)
+        start = cut
+
+    return cuts
+
+
+def split_on_silence(
+    audio_path: str | Path,
+    dest_dir: str | Path,
+    max_chunk_seconds: float,
+    min_silence_ms: int = 500,
+    silence_threshold_db: float = -40.0,
+) -> list[AudioChunk]:
+    """
+    Split a 16-bit PCM WAV file into chunks no longer than max_chunk_seconds.
+
+    Cuts are placed on silence boundaries where possible so words are not
+    split between chunks. Chunks are written as WAV files into dest_dir.
+    """
+    dest_dir = Path(dest_dir)
+    threshold = 10 ** (silence_threshold_db / 20)
+
+    with wave.open(str(audio_path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV audio can be split")
+
+        rate = wav.getframerate()
+        total_frames = wav.getnframes()
+        window_frames = max(1, rate * WINDOW_MS // 1000)
+
+        levels = _window_rms(wav, window_frames)
+        cuts = find_split_points(
+            levels,
+            max_windows=max(1, int(max_chunk_seconds * 1000 // WINDOW_MS)),
+            min_silence_windows=max(1, min_silence_ms // WINDOW_MS),
+            threshold=threshold,
+        )
+
+        boundaries = [0] + [cut * window_frames for cut in cuts] + [total_frames]
+        frame_bytes = wav.getsampwidth() * wav.getnchannels()
+        chunks = []
+        wav.rewind()
+
+        for index, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+            chunk_path = dest_dir / f"chunk_{index:04d}.wav"
+            with wave.open(str(chunk_path), "wb") as out:
+                out.setparams(wav.getparams())
+                remaining = end - start
+                while remaining > 0:
+                    data = wav.readframes(min(remaining, rate * 10))
+                    if not data:
+                        break
+                    out.writeframes(data)
+                    remaining -= len(data) // frame_bytes
+
+            chunks.append(
+                AudioChunk(
+                    index=index,
+                    path=chunk_path,
+                    offset_seconds=start / rate,
+                    duration_seconds=(end - start) / rate,
+                )
+            )
+
+    logger.info(f"Split {audio_path} into {len(chunks)} chunks")
+    return chunks
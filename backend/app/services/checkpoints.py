@@ -0,0 +1,122 @@
+"""Progress checkpoints so retried jobs resume from their last completed stage."""
+
+import json
+import logging
+import threading
+import time
+from typing import Any
+
+from redis import Redis, RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# After a Redis failure, use the in-memory fallback for this long
+REDIS_RETRY_SECONDS = 30.0
+
+
+class CheckpointStore:
+    """
+    Per-job stage markers stored in Redis, with an in-memory fallback.
+
+    Each job (e.g. "transcript:<id>") is a Redis hash of stage -> JSON value
+    that expires after ttl_seconds. When Redis is not configured or not
+    reachable, checkpoints are kept in process memory, which still lets a
+    retry on the same worker process resume.
+    """
+
+    def __init__(self, redis: Redis | None = None, ttl_seconds: int | None = None):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds or settings.checkpoint_ttl_seconds
+        self._memory: dict[str, tuple[float, dict[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._redis_down_until = 0.0
+
+    def _use_redis(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: RedisError) -> None:
+        logger.warning(f"Checkpoint store falling back to memory: {e}")
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _memory_job(self, job: str) -> dict[str, str]:
+        expires, stages = self._memory.get(job, (0.0, {}))
+        if expires < time.monotonic():
+            self._memory.pop(job, None)
+            return {}
+        return stages
+
+    def get(self, job: str, stage: str) -> Any | None:
+        """Value recorded for a stage, or None if the stage has not completed."""
+        raw = None
+        if self._use_redis():
+            try:
+                raw = self.redis.hget(f"checkpoint:{job}", stage)
+            except RedisError as e:
+                self._redis_failed(e)
+        if raw is None:
+            with self._lock:
+                raw = self._memory_job(job).get(stage)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, job: str, stage: str, value: Any) -> None:
+        """Record that a stage completed, with the value needed to skip it."""
+        raw = json.dumps(value)
+        if self._use_redis():
+            try:
+                key = f"checkpoint:{job}"
+                pipe = self.redis.pipeline()
+                pipe.hset(key, stage, raw)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.execute()
+                return
+            except RedisError as e:
+                self._redis_failed(e)
+        with self._lock:
+            stages = self._memory_job(job)
+            stages[stage] = raw
+            self._memory[job] = (time.monotonic() + self.ttl_seconds, stages)
+
+    def clear(self, job: str) -> None:
+        """Forget every stage of a job once it has finished."""
+        with self._lock:
+            self._memory.pop(job, None)
+        if self._use_redis():
+            try:
+                self.redis.delete(f"checkpoint:{job}")
+            except RedisError as e:
+                self._redis_failed(e)
+
+
+class JobCheckpoint:
+    """A CheckpointStore bound to one job."""
+
+    def __init__(self, store: CheckpointStore, job: str):
+        self.store = store
+        self.job = job
+
+    def get(self, stage: str) -> Any | None:
+        return self.store.get(self.job, stage)
+
+    def set(self, stage: str, value: Any) -> None:
+        self.store.set(self.job, stage, value)
+
+    def clear(self) -> None:
+        self.store.clear(self.job)
+
+
+_checkpoint_store: CheckpointStore | None = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Get the process-wide checkpoint store."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        redis = None
+        if settings.checkpoint_backend == "redis":
+            from app.core.redis import get_redis
+
+            redis = get_redis()
+        _checkpoint_store = CheckpointStore(redis)
+    return _checkpoint_store
@@ -1,81 +1,136 @@
 """Anthropic Claude LLM provider implementation."""
 
-import json
 import logging
+import time
+from collections.abc import AsyncIterator
 
+import httpx
 from anthropic import AsyncAnthropic
 
 from app.core.config import settings
-from app.models.notes import AnalysisResult, ClinicalEntity
-from app.services.llm.base import BaseLLMProvider
-from app.services.llm.prompts import ANALYSIS_SYSTEM_PROMPT, NOTE_GENERATION_SYSTEM_PROMPT
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider, build_http_client
+from app.services.llm.prompts import (
+    CLINICAL_SYSTEM_PROMPT,
+    build_analysis_instructions,
+    build_generation_instructions,
+    build_transcript_block,
+)
+from app.services.llm.structured import ANALYSIS_TOOL_NAME, analysis_schema, parse_analysis
+from app.services.llm.usage import anthropic_usage, record_usage
 
 logger = logging.getLogger(__name__)
 
+# Marks the end of a prompt prefix Anthropic should cache (5 minute TTL)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Analysis is returned as the input of a forced, schema-checked tool call
+ANALYSIS_TOOL = {
+    "name": ANALYSIS_TOOL_NAME,
+    "description": "Record the clinical information extracted from the transcript.",
+    "input_schema": analysis_schema(),
+    "strict": True,
+}
+
+
+def analysis_tool(fields: dict[str, str] | None = None) -> dict:
+    """The analysis tool, with template fields added to its schema when given."""
+    if not fields:
+        return ANALYSIS_TOOL
+    return {**ANALYSIS_TOOL, "input_schema": analysis_schema(tuple(fields))}
+
+
+def _text(response) -> str:
+    """
+    The text of a generation response.
+
+    Raises:
+        ValueError: If the response has no text, so an empty note is never saved
+    """
+    text = "".join(block.text for block in response.content if block.type == "text")
+    if not text.strip() or getattr(response, "stop_reason", None) == "tool_use":
+        raise ValueError("Claude returned no text")
+    return text
+
 
 class AnthropicProvider(BaseLLMProvider):
     """Anthropic Claude provider for transcript analysis and note generation."""
 
-    def __init__(self, model: str = "claude-sonnet-4-20250514"):
+    name = "anthropic"
+
+    def __init__(
+        self,
+        model: str = "claude-sonnet-4-20250514",
+        http_client: httpx.AsyncClient | None = None,
+    ):
         self.model = model
-        self.client = AsyncAnthropic(api_key=settings.anthropic_api_key)
+        self.http_client = http_client or build_http_client()
+        self.client = AsyncAnthropic(
+            api_key=settings.anthropic_api_key, http_client=self.http_client
+        )
+
+    def _transcript_request(self, transcript: str, instructions: str) -> dict:
+        """
+        System prompt and messages for a task about a transcript.
+
+        Cache breakpoints after the system prompt and after the transcript let
+        every note for the same transcript read the prefix from Anthropic's
+        prompt cache instead of reprocessing it. The analysis sends its forced
+        tool in front of that prefix, so it writes a cache entry of its own;
+        constrained output is worth that one uncached read.
+        """
+        return {
+            "system": [
+                {"type": "text", "text": CLINICAL_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}
+            ],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": build_transcript_block(transcript),
+                            "cache_control": CACHE_CONTROL,
+                        },
+                        {"type": "text", "text": instructions},
+                    ],
+                }
+            ],
+        }
+
+    def _record_usage(self, response, started: float, operation: str) -> None:
+        """Report a response's token usage, including prompt cache reads and writes."""
+        if getattr(response, "usage", None) is not None:
+            record_usage(
+                anthropic_usage(
+                    self.model,
+                    response.usage,
+                    latency_ms=(time.perf_counter() - started) * 1000,
+                    operation=operation,
+                )
+            )
 
     async def analyze_transcript(
         self,
         transcript: str,
         context: dict | None = None,
+        fields: dict[str, str] | None = None,
     ) -> AnalysisResult:
         """Extract clinical entities from transcript using Claude."""
-        user_prompt = f"""Analyze the following dental appointment transcript and extract clinical information.
-
-Transcript:
----
-{transcript}
----
-
-{f"Additional context: {json.dumps(context)}" if context else ""}
-
-Provide your analysis in the specified JSON format. Return ONLY valid JSON, no other text."""
-
+        started = time.perf_counter()
         response = await self.client.messages.create(
             model=self.model,
             max_tokens=2048,
-            system=ANALYSIS_SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": user_prompt}],
+            tools=[analysis_tool(fields)],
+            tool_choice={"type": "tool", "name": ANALYSIS_TOOL_NAME},
+            **self._transcript_request(transcript, build_analysis_instructions(context, fields)),
         )
+        self._record_usage(response, started, "analysis")
 
-        result_text = response.content[0].text
-
-        # Try to extract JSON from response
-        try:
-            # Handle case where response might have markdown code blocks
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            data = json.loads(result_text.strip())
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse analysis response: {result_text}")
-            data = {}
-
-        # Build entities list
-        entities = []
-        for procedure in data.get("procedures", []):
-            entities.append(ClinicalEntity(entity_type="procedure", value=procedure))
-        for finding in data.get("findings", []):
-            entities.append(ClinicalEntity(entity_type="finding", value=finding))
-        for rec in data.get("recommendations", []):
-            entities.append(ClinicalEntity(entity_type="recommendation", value=rec))
-
-        return AnalysisResult(
-            chief_complaint=data.get("chief_complaint"),
-            procedures=data.get("procedures", []),
-            findings=data.get("findings", []),
-            recommendations=data.get("recommendations", []),
-            entities=entities,
-            summary=data.get("summary"),
+        tool_input = next(
+            (block.input for block in response.content if block.type == "tool_use"), None
         )
+        return parse_analysis(tool_input, self.name)
 
     async def generate_note(
         self,
@@ -84,39 +139,57 @@ Provide your analysis in the specified JSON format. Return ONLY valid JSON, no o
         analysis: AnalysisResult | None = None,
     ) -> str:
         """Generate clinical note using Claude."""
-        analysis_context = ""
-        if analysis:
-            analysis_context = f"""
-Pre-analyzed information:
-- Chief Complaint: {analysis.chief_complaint or 'Not specified'}
-- Procedures: {', '.join(analysis.procedures) if analysis.procedures else 'None'}
-- Findings: {', '.join(analysis.findings) if analysis.findings else 'None'}
-- Recommendations: {', '.join(analysis.recommendations) if analysis.recommendations else 'None'}
-"""
-
-        user_prompt = f"""Generate a clinical note using the following template and transcript.
-
-Template:
----
-{template}
----
-
-Transcript:
----
-{transcript}
----
-{analysis_context}
-
-Generate the clinical note following the template structure. Replace all placeholders with appropriate content from the transcript."""
-
+        started = time.perf_counter()
         response = await self.client.messages.create(
             model=self.model,
             max_tokens=4096,
-            system=NOTE_GENERATION_SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": user_prompt}],
+            **self._transcript_request(
+                transcript, build_generation_instructions(template, analysis)
+            ),
         )
+        self._record_usage(response, started, "generation")
 
-        return response.content[0].text
+        return _text(response)
+
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a clinical note from Claude as text deltas arrive."""
+        started = time.perf_counter()
+        async with self.client.messages.stream(
+            model=self.model,
+            max_tokens=4096,
+            **self._transcript_request(
+                transcript, build_generation_instructions(template, analysis)
+            ),
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            message = await stream.get_final_message()
+            self._record_usage(message, started, "generation")
+            # Raises rather than let an empty streamed note be saved
+            _text(message)
+
+    async def complete_with_transcript(
+        self,
+        transcript: str,
+        instructions: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Complete a task about a transcript, caching the system prompt and transcript."""
+        started = time.perf_counter()
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **self._transcript_request(transcript, instructions),
+        )
+        self._record_usage(response, started, "completion")
+        return _text(response)
 
     async def complete(
         self,
@@ -135,6 +208,11 @@ Generate the clinical note following the template structure. Replace all placeho
         if system_prompt:
             kwargs["system"] = system_prompt
 
+        started = time.perf_counter()
         response = await self.client.messages.create(**kwargs)
+        self._record_usage(response, started, "completion")
         return response.content[0].text
 
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self.client.close()
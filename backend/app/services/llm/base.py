@@ -1,20 +1,74 @@
 """Base LLM provider interface."""
 
+import asyncio
+import logging
+import re
+import threading
+import weakref
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from typing import Literal
 
+import httpx
+
 from app.core.config import settings
 from app.models.notes import AnalysisResult
+from app.services.llm.prompts import (
+    BATCH_NOTE_END,
+    BATCH_NOTE_START,
+    CLINICAL_SYSTEM_PROMPT,
+    build_batch_generation_instructions,
+    build_transcript_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch_notes(text: str, keys: list[str]) -> dict[str, str]:
+    """Extract each template's note from a batched generation response."""
+    notes = {}
+    for key in keys:
+        pattern = (
+            re.escape(BATCH_NOTE_START.format(key=key))
+            + r"\s*\n(.*?)\n?\s*"
+            + re.escape(BATCH_NOTE_END.format(key=key))
+        )
+        match = re.search(pattern, text, re.DOTALL)
+        if match and match.group(1).strip():
+            notes[key] = match.group(1).strip()
+    return notes
+
+
+def build_http_client(timeout: float | None = None) -> httpx.AsyncClient:
+    """
+    Create an HTTP client for LLM API calls with the configured pool limits.
+
+    Clients keep connections alive between requests, so a provider reused
+    across calls skips the TCP and TLS handshakes after the first request.
+    """
+    return httpx.AsyncClient(
+        timeout=timeout or settings.llm_timeout_seconds,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        ),
+    )
 
 
 class BaseLLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    # Registry name and model, used to key cached results
+    name: str = ""
+    model: str = ""
+
     @abstractmethod
     async def analyze_transcript(
         self,
         transcript: str,
         context: dict | None = None,
+        fields: dict[str, str] | None = None,
     ) -> AnalysisResult:
         """
         Extract clinical entities and insights from transcript.
@@ -22,6 +76,8 @@ class BaseLLMProvider(ABC):
         Args:
             transcript: The full transcript text
             context: Optional context (patient info, appointment type, etc.)
+            fields: Template fields to extract into AnalysisResult.variables,
+                name -> description
             
         Returns:
             AnalysisResult with extracted information
@@ -48,6 +104,97 @@ class BaseLLMProvider(ABC):
         """
         pass
 
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Generate a clinical note, yielding text as the model produces it.
+
+        Providers without a streaming API yield the whole note at once.
+
+        Args:
+            transcript: The full transcript text
+            template: Template with placeholders
+            analysis: Optional pre-computed analysis
+
+        Yields:
+            Fragments of the generated note, in order
+        """
+        yield await self.generate_note(transcript, template, analysis)
+
+    async def generate_notes(
+        self,
+        transcript: str,
+        templates: dict[str, str],
+        analysis: AnalysisResult | None = None,
+    ) -> dict[str, str]:
+        """
+        Generate notes for several templates from one transcript in a single request.
+
+        The transcript is sent once instead of once per template. Any note
+        missing from the response is generated with a per-template call.
+
+        Args:
+            transcript: The full transcript text
+            templates: Template content keyed by an identifier (e.g. note id)
+            analysis: Optional pre-computed analysis
+
+        Returns:
+            Generated note content keyed like `templates`
+        """
+        if len(templates) == 1:
+            key, template = next(iter(templates.items()))
+            return {key: await self.generate_note(transcript, template, analysis)}
+
+        response = await self.complete_with_transcript(
+            transcript,
+            build_batch_generation_instructions(templates, analysis),
+            max_tokens=min(4096 * len(templates), 16384),
+        )
+        notes = parse_batch_notes(response, list(templates))
+
+        for key, template in templates.items():
+            if key not in notes:
+                logger.warning(f"Batched generation missing note {key}, generating separately")
+                notes[key] = await self.generate_note(transcript, template, analysis)
+
+        return notes
+
+    async def complete_with_transcript(
+        self,
+        transcript: str,
+        instructions: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """
+        Complete a task about a transcript.
+
+        The request starts with CLINICAL_SYSTEM_PROMPT and the transcript, the
+        prefix shared by every request about that transcript. Providers with
+        prompt caching override this to mark that prefix as cacheable.
+
+        Args:
+            transcript: The full transcript text
+            instructions: The task, sent after the transcript
+
+        Returns:
+            Completion text
+        """
+        return await self.complete(
+            prompt=build_transcript_prompt(transcript, instructions),
+            system_prompt=CLINICAL_SYSTEM_PROMPT,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+
+    async def aclose(self) -> None:
+        """Release network resources held by the provider."""
+        pass
+
     @abstractmethod
     async def complete(
         self,
@@ -63,31 +210,34 @@ class BaseLLMProvider(ABC):
 
 
 class LLMProviderFactory:
-    """Factory for creating LLM provider instances."""
+    """
+    Factory and process-wide registry of LLM provider instances.
+
+    Providers hold HTTP connection pools, which are bound to the event loop
+    they were created on. Instances are therefore shared per event loop:
+    every caller on the same loop gets the same provider and its warm
+    connections. Providers requested outside a running loop are not shared.
+    """
 
     _providers: dict[str, type[BaseLLMProvider]] = {}
+    # event loop -> provider name -> shared instance
+    _instances: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
 
     @classmethod
     def register(cls, name: str, provider_class: type[BaseLLMProvider]) -> None:
         """Register a provider class."""
-        cls._providers[name] = provider_class
+        with cls._lock:
+            replaced = cls._providers.get(name) not in (None, provider_class)
+            cls._providers[name] = provider_class
+            # Drop shared instances of a replaced class
+            if replaced:
+                for instances in cls._instances.values():
+                    instances.pop(name, None)
 
     @classmethod
-    def get_provider(
-        cls,
-        provider_name: Literal["openai", "anthropic", "azure", "ollama"] | None = None,
-    ) -> BaseLLMProvider:
-        """
-        Get an instance of the specified LLM provider.
-        
-        Args:
-            provider_name: Name of provider. If None, uses default from settings.
-            
-        Returns:
-            Configured LLM provider instance
-        """
-        name = provider_name or settings.default_llm_provider
-
+    def _provider_class(cls, name: str) -> type[BaseLLMProvider]:
+        """Look up a provider class, importing built-in providers on first use."""
         if name not in cls._providers:
             # Lazy import and register providers
             if name == "openai":
@@ -102,10 +252,65 @@ class LLMProviderFactory:
             else:
                 raise ValueError(f"Unknown LLM provider: {name}")
 
-        return cls._providers[name]()
+        return cls._providers[name]
+
+    @classmethod
+    def get_provider(
+        cls,
+        provider_name: Literal["openai", "anthropic", "azure", "ollama"] | None = None,
+    ) -> BaseLLMProvider:
+        """
+        Get the shared instance of the specified LLM provider.
+
+        Args:
+            provider_name: Name of provider. If None, uses default from settings.
+
+        Returns:
+            Configured LLM provider instance, shared with other callers on
+            the current event loop
+        """
+        name = provider_name or settings.default_llm_provider
+        provider_class = cls._provider_class(name)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return cls._create(provider_class)
+
+        with cls._lock:
+            instances = cls._instances.setdefault(loop, {})
+            if name not in instances:
+                instances[name] = cls._create(provider_class)
+            return instances[name]
+
+    @staticmethod
+    def _create(provider_class: type[BaseLLMProvider]) -> BaseLLMProvider:
+        """Instantiate a provider, behind the rate limiter and response cache when enabled."""
+        provider = provider_class()
+        if settings.llm_rate_limit_enabled:
+            from app.services.llm.rate_limit import RateLimitedProvider
+
+            provider = RateLimitedProvider(provider)
+        from app.services.llm.response_cache import CachedProvider, response_cache_allowed
+
+        # Outside the rate limiter, so cache hits never wait for a slot
+        if response_cache_allowed():
+            provider = CachedProvider(provider)
+        return provider
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close and forget the providers shared on the current event loop."""
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            instances = cls._instances.pop(loop, {})
+        for name, provider in instances.items():
+            try:
+                await provider.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close LLM provider {name}: {e}")
 
     @classmethod
     def list_providers(cls) -> list[str]:
         """List available provider names."""
         return ["openai", "anthropic", "ollama"]
-
@@ -0,0 +1,161 @@
+"""Map-reduce analysis of transcripts too long for one analysis request."""
+
+import asyncio
+import logging
+import re
+
+from app.models.notes import AnalysisResult, ClinicalEntity
+from app.models.transcripts import TranscriptSegment
+from app.services.llm.base import BaseLLMProvider
+from app.services.llm.rate_limit import CHARS_PER_TOKEN
+from app.services.llm.structured import AnalysisParseError
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends and line breaks, used when no segments are available
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _pieces(transcript: str, segments: list[TranscriptSegment] | None) -> list[str]:
+    """Smallest units a window may be cut between."""
+    if segments:
+        return [
+            f"{segment.speaker}: {segment.text.strip()}"
+            if segment.speaker
+            else segment.text.strip()
+            for segment in segments
+            if segment.text.strip()
+        ]
+    return [piece.strip() for piece in _SENTENCE_BREAK.split(transcript) if piece.strip()]
+
+
+def split_transcript(
+    transcript: str,
+    window_tokens: int,
+    segments: list[TranscriptSegment] | None = None,
+) -> list[str]:
+    """
+    Split a transcript into windows of at most window_tokens (estimated).
+
+    Windows are cut between segments when segments are given, otherwise
+    between sentences. A single piece longer than a window is cut hard.
+    """
+    max_chars = max(1, window_tokens * CHARS_PER_TOKEN)
+    separator = "\n" if segments else " "
+    windows: list[str] = []
+    current: list[str] = []
+    size = 0
+
+    def flush() -> None:
+        nonlocal current, size
+        if current:
+            windows.append(separator.join(current))
+        current, size = [], 0
+
+    for piece in _pieces(transcript, segments):
+        while len(piece) > max_chars:
+            flush()
+            windows.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        if current and size + len(separator) + len(piece) > max_chars:
+            flush()
+        size += len(piece) + (len(separator) if current else 0)
+        current.append(piece)
+    flush()
+
+    return windows
+
+
+def _normalize(value: str) -> str:
+    """Comparison form of an extracted item: case, spacing and final period ignored."""
+    return " ".join(value.lower().split()).rstrip(".")
+
+
+def _dedupe(values: list[str]) -> list[str]:
+    """Drop repeated items, keeping the first wording of each."""
+    seen = set()
+    unique = []
+    for value in values:
+        key = _normalize(value)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(value)
+    return unique
+
+
+def merge_analyses(analyses: list[AnalysisResult]) -> AnalysisResult:
+    """
+    Merge the analyses of consecutive transcript windows into one.
+
+    The first chief complaint wins, list items and entities are
+    deduplicated (keeping the highest confidence), and summaries and
+    template variables are joined in transcript order.
+    """
+    entities: dict[tuple[str, str], ClinicalEntity] = {}
+    for analysis in analyses:
+        for entity in analysis.entities:
+            key = (entity.entity_type, _normalize(entity.value))
+            kept = entities.get(key)
+            if kept is None or (entity.confidence or 0) > (kept.confidence or 0):
+                entities[key] = entity
+
+    return AnalysisResult(
+        chief_complaint=next((a.chief_complaint for a in analyses if a.chief_complaint), None),
+        procedures=_dedupe([p for a in analyses for p in a.procedures]),
+        findings=_dedupe([f for a in analyses for f in a.findings]),
+        recommendations=_dedupe([r for a in analyses for r in a.recommendations]),
+        entities=list(entities.values()),
+        summary=" ".join(a.summary for a in analyses if a.summary) or None,
+        variables={
+            name: " ".join(_dedupe([a.variables[name] for a in analyses if a.variables.get(name)]))
+            or None
+            for name in dict.fromkeys(name for a in analyses for name in a.variables)
+        },
+    )
+
+
+async def analyze_in_windows(
+    llm: BaseLLMProvider,
+    transcript: str,
+    window_tokens: int,
+    segments: list[TranscriptSegment] | None = None,
+    context: dict | None = None,
+    fields: dict[str, str] | None = None,
+) -> AnalysisResult:
+    """
+    Analyze a long transcript window by window, concurrently, and merge the results.
+
+    Windows whose analysis is malformed are skipped.
+
+    Raises:
+        AnalysisParseError: If no window could be analyzed
+    """
+    windows = split_transcript(transcript, window_tokens, segments)
+    if len(windows) == 1:
+        return await llm.analyze_transcript(transcript, context, fields)
+
+    results = await asyncio.gather(
+        *(
+            llm.analyze_transcript(
+                window,
+                {**(context or {}), "transcript_part": f"{i} of {len(windows)}"},
+                fields,
+            )
+            for i, window in enumerate(windows, 1)
+        ),
+        return_exceptions=True,
+    )
+
+    analyses = []
+    for i, result in enumerate(results, 1):
+        if isinstance(result, AnalysisParseError):
+            logger.warning(f"Skipping malformed analysis of transcript part {i}")
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            analyses.append(result)
+
+    if not analyses:
+        raise AnalysisParseError("no transcript window could be analyzed")
+    logger.info(f"Analyzed transcript in {len(windows)} windows")
+    return merge_analyses(analyses)
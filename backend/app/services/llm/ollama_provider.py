@@ -2,12 +2,20 @@
 
 import json
 import logging
+import time
+from collections.abc import AsyncIterator
 
 import httpx
 
-from app.models.notes import AnalysisResult, ClinicalEntity
-from app.services.llm.base import BaseLLMProvider
-from app.services.llm.prompts import ANALYSIS_SYSTEM_PROMPT, NOTE_GENERATION_SYSTEM_PROMPT
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider, build_http_client
+from app.services.llm.prompts import (
+    CLINICAL_SYSTEM_PROMPT,
+    build_analysis_prompt,
+    build_generation_prompt,
+)
+from app.services.llm.structured import analysis_schema, parse_analysis
+from app.services.llm.usage import ollama_usage, record_usage
 
 logger = logging.getLogger(__name__)
 
@@ -15,22 +23,31 @@ logger = logging.getLogger(__name__)
 class OllamaProvider(BaseLLMProvider):
     """Ollama local LLM provider for transcript analysis and note generation."""
 
+    name = "ollama"
+
     def __init__(
         self,
         model: str = "llama3.1",
         base_url: str = "http://localhost:11434",
+        http_client: httpx.AsyncClient | None = None,
     ):
         self.model = model
         self.base_url = base_url
-        self.client = httpx.AsyncClient(timeout=120.0)
+        self.client = http_client or build_http_client()
 
     async def _generate(
         self,
         prompt: str,
         system: str | None = None,
         temperature: float = 0.3,
+        format: dict | str | None = None,
+        operation: str = "completion",
     ) -> str:
-        """Send generation request to Ollama."""
+        """
+        Send generation request to Ollama.
+
+        format constrains the output to "json" or to a JSON schema.
+        """
         payload = {
             "model": self.model,
             "prompt": prompt,
@@ -42,68 +59,82 @@ class OllamaProvider(BaseLLMProvider):
         
         if system:
             payload["system"] = system
+        if format:
+            payload["format"] = format
 
+        started = time.perf_counter()
         response = await self.client.post(
             f"{self.base_url}/api/generate",
             json=payload,
         )
         response.raise_for_status()
-        
-        return response.json()["response"]
+        data = response.json()
+        self._record_usage(data, started, operation)
+
+        return data["response"]
+
+    def _record_usage(self, data: dict, started: float, operation: str) -> None:
+        """Report the token counts Ollama includes in its final response."""
+        record_usage(
+            ollama_usage(
+                self.model,
+                data,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                operation=operation,
+            )
+        )
+
+    async def _generate_stream(
+        self,
+        prompt: str,
+        system: str | None = None,
+        temperature: float = 0.3,
+    ) -> AsyncIterator[str]:
+        """Send a streaming generation request, yielding response fragments."""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+            },
+        }
+
+        if system:
+            payload["system"] = system
+
+        started = time.perf_counter()
+        # Ollama streams one JSON object per line
+        async with self.client.stream(
+            "POST", f"{self.base_url}/api/generate", json=payload
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    self._record_usage(data, started, "generation")
+                    break
 
     async def analyze_transcript(
         self,
         transcript: str,
         context: dict | None = None,
+        fields: dict[str, str] | None = None,
     ) -> AnalysisResult:
         """Extract clinical entities from transcript using local LLM."""
-        user_prompt = f"""Analyze the following dental appointment transcript and extract clinical information.
-
-Transcript:
----
-{transcript}
----
-
-{f"Additional context: {json.dumps(context)}" if context else ""}
-
-Provide your analysis in the specified JSON format. Return ONLY valid JSON, no other text."""
-
         result_text = await self._generate(
-            prompt=user_prompt,
-            system=ANALYSIS_SYSTEM_PROMPT,
+            prompt=build_analysis_prompt(transcript, context, fields),
+            system=CLINICAL_SYSTEM_PROMPT,
             temperature=0.2,
+            format=analysis_schema(tuple(fields or ())),
+            operation="analysis",
         )
 
-        # Try to extract JSON from response
-        try:
-            # Handle case where response might have markdown code blocks
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            data = json.loads(result_text.strip())
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse analysis response: {result_text}")
-            data = {}
-
-        # Build entities list
-        entities = []
-        for procedure in data.get("procedures", []):
-            entities.append(ClinicalEntity(entity_type="procedure", value=procedure))
-        for finding in data.get("findings", []):
-            entities.append(ClinicalEntity(entity_type="finding", value=finding))
-        for rec in data.get("recommendations", []):
-            entities.append(ClinicalEntity(entity_type="recommendation", value=rec))
-
-        return AnalysisResult(
-            chief_complaint=data.get("chief_complaint"),
-            procedures=data.get("procedures", []),
-            findings=data.get("findings", []),
-            recommendations=data.get("recommendations", []),
-            entities=entities,
-            summary=data.get("summary"),
-        )
+        return parse_analysis(result_text, self.name)
 
     async def generate_note(
         self,
@@ -112,37 +143,29 @@ Provide your analysis in the specified JSON format. Return ONLY valid JSON, no o
         analysis: AnalysisResult | None = None,
     ) -> str:
         """Generate clinical note using local LLM."""
-        analysis_context = ""
-        if analysis:
-            analysis_context = f"""
-Pre-analyzed information:
-- Chief Complaint: {analysis.chief_complaint or 'Not specified'}
-- Procedures: {', '.join(analysis.procedures) if analysis.procedures else 'None'}
-- Findings: {', '.join(analysis.findings) if analysis.findings else 'None'}
-- Recommendations: {', '.join(analysis.recommendations) if analysis.recommendations else 'None'}
-"""
-
-        user_prompt = f"""Generate a clinical note using the following template and transcript.
-
-Template:
----
-{template}
----
-
-Transcript:
----
-{transcript}
----
-{analysis_context}
-
-Generate the clinical note following the template structure. Replace all placeholders with appropriate content from the transcript."""
+        user_prompt = build_generation_prompt(transcript, template, analysis)
 
         return await self._generate(
             prompt=user_prompt,
-            system=NOTE_GENERATION_SYSTEM_PROMPT,
+            system=CLINICAL_SYSTEM_PROMPT,
             temperature=0.3,
+            operation="generation",
         )
 
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a clinical note from the local LLM."""
+        async for text in self._generate_stream(
+            prompt=build_generation_prompt(transcript, template, analysis),
+            system=CLINICAL_SYSTEM_PROMPT,
+            temperature=0.3,
+        ):
+            yield text
+
     async def complete(
         self,
         prompt: str,
@@ -157,3 +180,6 @@ Generate the clinical note following the template structure. Replace all placeho
             temperature=temperature,
         )
 
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self.client.aclose()
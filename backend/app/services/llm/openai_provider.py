@@ -1,14 +1,24 @@
 """OpenAI LLM provider implementation."""
 
-import json
+import hashlib
 import logging
+import time
+from collections.abc import AsyncIterator
 
+import httpx
 from openai import AsyncOpenAI
 
 from app.core.config import settings
-from app.models.notes import AnalysisResult, ClinicalEntity
-from app.services.llm.base import BaseLLMProvider
-from app.services.llm.prompts import ANALYSIS_SYSTEM_PROMPT, NOTE_GENERATION_SYSTEM_PROMPT
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider, build_http_client
+from app.services.llm.prompts import (
+    CLINICAL_SYSTEM_PROMPT,
+    build_analysis_instructions,
+    build_generation_instructions,
+    build_transcript_prompt,
+)
+from app.services.llm.structured import analysis_schema, parse_analysis
+from app.services.llm.usage import openai_usage, record_usage
 
 logger = logging.getLogger(__name__)
 
@@ -16,62 +26,69 @@ logger = logging.getLogger(__name__)
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI GPT provider for transcript analysis and note generation."""
 
-    def __init__(self, model: str = "gpt-4o"):
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        http_client: httpx.AsyncClient | None = None,
+    ):
         self.model = model
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.http_client = http_client or build_http_client()
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key, http_client=self.http_client)
+
+    def _transcript_request(self, transcript: str, instructions: str) -> dict:
+        """
+        Messages for a task about a transcript.
+
+        OpenAI caches prompt prefixes automatically, so the static system
+        prompt and the transcript come first and the task last. The cache key
+        routes every request about a transcript to the same cache.
+        """
+        return {
+            "messages": [
+                {"role": "system", "content": CLINICAL_SYSTEM_PROMPT},
+                {"role": "user", "content": build_transcript_prompt(transcript, instructions)},
+            ],
+            "prompt_cache_key": hashlib.sha256(transcript.encode()).hexdigest()[:32],
+        }
+
+    def _record_usage(self, response, started: float, operation: str) -> None:
+        """Report a response's token usage, including cached prompt tokens."""
+        if getattr(response, "usage", None) is not None:
+            record_usage(
+                openai_usage(
+                    self.model,
+                    response.usage,
+                    latency_ms=(time.perf_counter() - started) * 1000,
+                    operation=operation,
+                )
+            )
 
     async def analyze_transcript(
         self,
         transcript: str,
         context: dict | None = None,
+        fields: dict[str, str] | None = None,
     ) -> AnalysisResult:
         """Extract clinical entities from transcript using GPT."""
-        user_prompt = f"""Analyze the following dental appointment transcript and extract clinical information.
-
-Transcript:
----
-{transcript}
----
-
-{f"Additional context: {json.dumps(context)}" if context else ""}
-
-Provide your analysis in the specified JSON format."""
-
+        started = time.perf_counter()
         response = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
+            **self._transcript_request(transcript, build_analysis_instructions(context, fields)),
             temperature=0.2,
-            response_format={"type": "json_object"},
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "clinical_analysis",
+                    "schema": analysis_schema(tuple(fields or ())),
+                    "strict": True,
+                },
+            },
         )
+        self._record_usage(response, started, "analysis")
 
-        result_text = response.choices[0].message.content
-        
-        try:
-            data = json.loads(result_text)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse analysis response: {result_text}")
-            data = {}
-
-        # Build entities list
-        entities = []
-        for procedure in data.get("procedures", []):
-            entities.append(ClinicalEntity(entity_type="procedure", value=procedure))
-        for finding in data.get("findings", []):
-            entities.append(ClinicalEntity(entity_type="finding", value=finding))
-        for rec in data.get("recommendations", []):
-            entities.append(ClinicalEntity(entity_type="recommendation", value=rec))
-
-        return AnalysisResult(
-            chief_complaint=data.get("chief_complaint"),
-            procedures=data.get("procedures", []),
-            findings=data.get("findings", []),
-            recommendations=data.get("recommendations", []),
-            entities=entities,
-            summary=data.get("summary"),
-        )
+        return parse_analysis(response.choices[0].message.content, self.name)
 
     async def generate_note(
         self,
@@ -80,41 +97,60 @@ Provide your analysis in the specified JSON format."""
         analysis: AnalysisResult | None = None,
     ) -> str:
         """Generate clinical note using GPT."""
-        analysis_context = ""
-        if analysis:
-            analysis_context = f"""
-Pre-analyzed information:
-- Chief Complaint: {analysis.chief_complaint or 'Not specified'}
-- Procedures: {', '.join(analysis.procedures) if analysis.procedures else 'None'}
-- Findings: {', '.join(analysis.findings) if analysis.findings else 'None'}
-- Recommendations: {', '.join(analysis.recommendations) if analysis.recommendations else 'None'}
-"""
-
-        user_prompt = f"""Generate a clinical note using the following template and transcript.
-
-Template:
----
-{template}
----
-
-Transcript:
----
-{transcript}
----
-{analysis_context}
-
-Generate the clinical note following the template structure. Replace all placeholders with appropriate content from the transcript."""
-
+        started = time.perf_counter()
         response = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": NOTE_GENERATION_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
+            **self._transcript_request(
+                transcript, build_generation_instructions(template, analysis)
+            ),
             temperature=0.3,
             max_tokens=4096,
         )
+        self._record_usage(response, started, "generation")
+
+        return response.choices[0].message.content
 
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a clinical note from GPT as content deltas arrive."""
+        started = time.perf_counter()
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            **self._transcript_request(
+                transcript, build_generation_instructions(template, analysis)
+            ),
+            temperature=0.3,
+            max_tokens=4096,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # The final chunk carries usage and no choices
+            self._record_usage(chunk, started, "generation")
+
+    async def complete_with_transcript(
+        self,
+        transcript: str,
+        instructions: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Complete a task about a transcript, routed to the transcript's prompt cache."""
+        started = time.perf_counter()
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            **self._transcript_request(transcript, instructions),
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        self._record_usage(response, started, "completion")
         return response.choices[0].message.content
 
     async def complete(
@@ -130,12 +166,17 @@ Generate the clinical note following the template structure. Replace all placeho
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
 
+        started = time.perf_counter()
         response = await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
         )
+        self._record_usage(response, started, "completion")
 
         return response.choices[0].message.content
 
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self.client.close()
@@ -0,0 +1,63 @@
+"""Token prices for estimating what LLM calls cost."""
+
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.llm.usage import LLMUsage
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """
+    USD per million tokens.
+
+    Cached prompt tokens fall back to the input price when a model has no
+    separate cache price.
+    """
+
+    input: float
+    output: float
+    cache_read: float | None = None
+    cache_write: float | None = None
+
+
+# Published list prices; LLM_PRICING overrides or extends them
+MODEL_PRICES: dict[str, ModelPrice] = {
+    "claude-opus-4": ModelPrice(input=15.0, output=75.0, cache_read=1.5, cache_write=18.75),
+    "claude-sonnet-4": ModelPrice(input=3.0, output=15.0, cache_read=0.3, cache_write=3.75),
+    "claude-3-5-haiku": ModelPrice(input=0.8, output=4.0, cache_read=0.08, cache_write=1.0),
+    "gpt-4o": ModelPrice(input=2.5, output=10.0, cache_read=1.25),
+    "gpt-4o-mini": ModelPrice(input=0.15, output=0.6, cache_read=0.075),
+}
+
+
+def model_price(model: str) -> ModelPrice | None:
+    """
+    Price of a model, matched exactly or by the longest name prefix.
+
+    Prefixes let dated releases (claude-sonnet-4-20250514) share an entry.
+    Overrides from settings take precedence over the built-in table.
+    """
+    prices = {
+        **MODEL_PRICES,
+        **{name: ModelPrice(**price) for name, price in settings.llm_pricing.items()},
+    }
+    if model in prices:
+        return prices[model]
+    matches = [name for name in prices if model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def usage_cost(usage: LLMUsage) -> float:
+    """Cost of one call in USD; zero for models without a known price."""
+    price = model_price(usage.model)
+    if price is None:
+        return 0.0
+    cache_read = price.input if price.cache_read is None else price.cache_read
+    cache_write = price.input if price.cache_write is None else price.cache_write
+    return (
+        usage.uncached_input_tokens * price.input
+        + usage.cache_read_tokens * cache_read
+        + usage.cache_write_tokens * cache_write
+        + usage.output_tokens * price.output
+    ) / 1_000_000
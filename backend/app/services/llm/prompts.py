@@ -1,5 +1,11 @@
 """System prompts for clinical note generation."""
 
+import json
+
+# Bump when ANALYSIS_SYSTEM_PROMPT, the analysis user prompt or the analysis
+# output format changes so stored analyses produced by the old one are not reused
+ANALYSIS_PROMPT_VERSION = "3"
+
 ANALYSIS_SYSTEM_PROMPT = """You are a dental clinical documentation assistant. Your role is to analyze transcripts of dental appointments and extract clinically relevant information.
 
 Extract the following from the transcript:
@@ -32,6 +38,178 @@ Guidelines:
 
 The template will contain placeholders like {{section_name}} or {{variable}}. Fill these with appropriate content based on the transcript analysis."""
 
+# One system prompt for both analysis and generation. Requests about a
+# transcript then begin with the same system prompt and transcript, which
+# providers can cache and reuse across the analysis and every note.
+CLINICAL_SYSTEM_PROMPT = (
+    "You are a dental clinical documentation assistant. Each request contains a "
+    "transcript of a dental appointment followed by a task: either analyzing the "
+    "transcript or generating a clinical note from it. Follow the instructions below "
+    "that match the task.\n"
+    "\n"
+    "# Analysis\n"
+    "\n"
+    f"{ANALYSIS_SYSTEM_PROMPT}\n"
+    "\n"
+    "# Note generation\n"
+    "\n"
+    f"{NOTE_GENERATION_SYSTEM_PROMPT}"
+)
+
+BATCH_NOTE_START = "=== NOTE {key} ==="
+BATCH_NOTE_END = "=== END NOTE {key} ==="
+
+
+def format_analysis_context(analysis) -> str:
+    """Render a pre-computed AnalysisResult for inclusion in a generation prompt."""
+    if not analysis:
+        return ""
+    return f"""
+Pre-analyzed information:
+- Chief Complaint: {analysis.chief_complaint or 'Not specified'}
+- Procedures: {', '.join(analysis.procedures) if analysis.procedures else 'None'}
+- Findings: {', '.join(analysis.findings) if analysis.findings else 'None'}
+- Recommendations: {', '.join(analysis.recommendations) if analysis.recommendations else 'None'}
+"""
+
+
+def build_transcript_block(transcript: str) -> str:
+    """Render the transcript that opens every transcript-based prompt."""
+    return f"""Transcript:
+---
+{transcript}
+---"""
+
+
+def format_template_fields(fields: dict[str, str] | None) -> str:
+    """Describe the template fields an analysis should also extract."""
+    if not fields:
+        return ""
+    lines = "\n".join(
+        f"- {name}: {description}" if description else f"- {name}"
+        for name, description in fields.items()
+    )
+    return (
+        '\nAlso extract these note template fields into the "variables" object, each as '
+        "concise text taken from the transcript, or null if the transcript does not cover "
+        f"it:\n{lines}\n"
+    )
+
+
+def build_analysis_instructions(
+    context: dict | None = None,
+    fields: dict[str, str] | None = None,
+) -> str:
+    """Build the analysis task that follows the transcript block."""
+    context_block = f"\nAdditional context: {json.dumps(context)}\n" if context else ""
+    return (
+        "Analyze the dental appointment transcript above and extract clinical information.\n"
+        f"{context_block}{format_template_fields(fields)}\n"
+        "Provide your analysis in the JSON format described for analysis. "
+        "Return ONLY valid JSON, no other text."
+    )
+
+
+def build_generation_instructions(template: str, analysis=None) -> str:
+    """Build the note generation task that follows the transcript block."""
+    return (
+        "Generate a clinical note from the transcript above using the following template.\n"
+        "\n"
+        f"Template:\n---\n{template}\n---\n"
+        f"{format_analysis_context(analysis)}\n"
+        "Generate the clinical note following the template structure. "
+        "Replace all placeholders with appropriate content from the transcript."
+    )
+
+
+def build_batch_generation_instructions(templates: dict[str, str], analysis=None) -> str:
+    """
+    Build the task for filling several templates from the transcript above.
+
+    Each note must be returned between BATCH_NOTE_START / BATCH_NOTE_END
+    markers carrying the template key.
+    """
+    template_blocks = "\n\n".join(
+        f"Template {key}:\n---\n{content}\n---" for key, content in templates.items()
+    )
+    output_format = "\n".join(
+        f"{BATCH_NOTE_START.format(key=key)}\n<note for template {key}>\n"
+        f"{BATCH_NOTE_END.format(key=key)}"
+        for key in templates
+    )
+    return (
+        "Generate one clinical note for EACH of the following templates from the "
+        "transcript above.\n"
+        f"{format_analysis_context(analysis)}\n"
+        f"{template_blocks}\n"
+        "\n"
+        "For each template, generate the clinical note following that template's structure. "
+        "Replace all placeholders with appropriate content from the transcript.\n"
+        "\n"
+        "Return every note wrapped in its markers, exactly in this format and with no "
+        f"other text:\n{output_format}"
+    )
+
+
+def build_narrative_instructions(variables: dict[str, str], analysis=None) -> str:
+    """
+    Build the task for writing only a note's narrative sections.
+
+    Used in structured fill mode, where the rest of the note is rendered
+    from extracted values. Sections are returned between the batch markers.
+    """
+    sections = "\n".join(
+        f"- {name}: {description}" if description else f"- {name}"
+        for name, description in variables.items()
+    )
+    output_format = "\n".join(
+        f"{BATCH_NOTE_START.format(key=name)}\n<text for {name}>\n"
+        f"{BATCH_NOTE_END.format(key=name)}"
+        for name in variables
+    )
+    return (
+        "Write the following narrative sections of a clinical note from the transcript "
+        "above, in professional clinical language.\n"
+        f"{format_analysis_context(analysis)}\n"
+        f"Sections:\n{sections}\n"
+        "\n"
+        "Return every section wrapped in its markers, exactly in this format and with no "
+        f"other text:\n{output_format}"
+    )
+
+
+def build_transcript_prompt(transcript: str, instructions: str) -> str:
+    """
+    Join the transcript block and a task into one user prompt.
+
+    The transcript always comes first, so every request about the same
+    transcript shares a prefix (after CLINICAL_SYSTEM_PROMPT) that the
+    provider can serve from its prompt cache.
+    """
+    return f"{build_transcript_block(transcript)}\n\n{instructions}"
+
+
+def build_analysis_prompt(
+    transcript: str,
+    context: dict | None = None,
+    fields: dict[str, str] | None = None,
+) -> str:
+    """Build the user prompt for analyzing a transcript."""
+    return build_transcript_prompt(transcript, build_analysis_instructions(context, fields))
+
+
+def build_generation_prompt(transcript: str, template: str, analysis=None) -> str:
+    """Build the user prompt for filling one template from a transcript."""
+    return build_transcript_prompt(transcript, build_generation_instructions(template, analysis))
+
+
+def build_batch_generation_prompt(transcript: str, templates: dict[str, str], analysis=None) -> str:
+    """Build one prompt that fills several templates from the same transcript."""
+    return build_transcript_prompt(
+        transcript, build_batch_generation_instructions(templates, analysis)
+    )
+
+
 SECTION_PROMPTS = {
     "subjective": """Document the subjective information from the transcript:
 - Chief complaint in patient's own words
@@ -58,3 +236,40 @@ SECTION_PROMPTS = {
 - Prescriptions if mentioned""",
 }
 
+
+
+def build_section_instructions(
+    sections: dict[str, str],
+    note: str,
+    analysis=None,
+) -> str:
+    """
+    Build the task for rewriting some sections of an existing note.
+
+    Args:
+        sections: Template text of each section to rewrite, keyed by section name
+        note: The current note, which the other sections are kept from
+        analysis: Optional pre-computed AnalysisResult
+    """
+    blocks = []
+    for name, template in sections.items():
+        guidance = f"{SECTION_PROMPTS[name]}\n" if name in SECTION_PROMPTS else ""
+        blocks.append(f"Section {name}:\n{guidance}Template:\n{template}")
+    section_blocks = "\n\n".join(blocks)
+    output_format = "\n".join(
+        f"{BATCH_NOTE_START.format(key=name)}\n<section {name} without its heading>\n"
+        f"{BATCH_NOTE_END.format(key=name)}"
+        for name in sections
+    )
+    return (
+        "Rewrite the following sections of the clinical note below from the transcript "
+        "above, in professional clinical language. The rest of the note is kept as it is, "
+        "so stay consistent with it.\n"
+        f"{format_analysis_context(analysis)}\n"
+        f"Current note:\n---\n{note}\n---\n"
+        "\n"
+        f"{section_blocks}\n"
+        "\n"
+        "Return every rewritten section wrapped in its markers, exactly in this format and "
+        f"with no other text:\n{output_format}"
+    )
@@ -0,0 +1,450 @@
+"""Rate limiting and adaptive concurrency for LLM and Whisper API calls."""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+import weakref
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
+
+from app.core.backoff import backoff_delay
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 429 Too Many Requests, 503 Service Unavailable, 529 Overloaded (Anthropic)
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+
+# Rough characters-per-token ratio used to estimate request size
+CHARS_PER_TOKEN = 4
+
+
+def _status_code(exc: BaseException) -> int | None:
+    """HTTP status of an SDK (status_code) or httpx (response) error, if any."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """Whether an error means the provider is rate limiting or overloaded."""
+    return _status_code(exc) in OVERLOAD_STATUS_CODES
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """The Retry-After delay an error's response asked for, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Estimate the prompt tokens of a request from its text."""
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN
+
+
+class TokenBucket:
+    """
+    In-process token bucket refilled continuously at rate_per_minute.
+
+    Shared by every caller in the process; use RedisTokenBucket to share a
+    budget across worker processes.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    async def try_acquire(self, amount: float = 1) -> float:
+        """
+        Take amount tokens if available.
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """Token bucket stored in Redis, shared by every worker process."""
+
+    # Refill and take atomically; Redis' own clock avoids host clock skew
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= amount then
+    tokens = tokens - amount
+else
+    wait = (amount - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+    def __init__(self, redis, key: str, rate_per_minute: float, capacity: float | None = None):
+        self.redis = redis
+        self.key = key
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._script = redis.register_script(self.SCRIPT)
+
+    async def try_acquire(self, amount: float = 1) -> float:
+        """Take amount tokens if available; returns seconds to wait otherwise."""
+        wait = await self._script(keys=[self.key], args=[self.rate, self.capacity, amount])
+        return float(wait)
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit: additive increase, multiplicative decrease.
+
+    Each successful call made while the limit was saturated raises it by
+    one; an overload error multiplies it by backoff. Decreases are applied
+    at most once per cooldown so one burst of 429s only backs off once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.clock = clock
+        self.in_flight = 0
+        self._last_decrease = -math.inf
+        self._condition: asyncio.Condition | None = None
+
+    @property
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        """Wait for a free slot under the current limit."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool = False) -> None:
+        """Free a slot and adjust the limit from the call's outcome."""
+        async with self._cond:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if overloaded:
+                now = self.clock()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif saturated:
+                # Only grow when the current limit is actually the bottleneck
+                self.limit = min(self.maximum, self.limit + 1)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    """
+    Gate for calls to one provider and model.
+
+    Calls wait for the requests-per-minute and tokens-per-minute buckets,
+    then for a slot under the adaptive concurrency limit. Overload errors
+    shrink the limit and are retried after the provider's Retry-After.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        requests: TokenBucket | RedisTokenBucket | None = None,
+        tokens: TokenBucket | RedisTokenBucket | None = None,
+        concurrency: AIMDLimiter | None = None,
+        max_retries: int = 3,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+        redis=None,
+    ):
+        self.key = key
+        self.requests = requests
+        self.tokens = tokens
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.redis = redis
+
+    async def _take(self, bucket, amount: float) -> None:
+        if bucket is None or amount <= 0:
+            return
+        # A request larger than the bucket could never be admitted
+        amount = min(amount, bucket.capacity)
+        while (wait := await bucket.try_acquire(amount)) > 0:
+            await self.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0) -> AsyncIterator[None]:
+        """Hold one rate-limited call slot for the duration of the block."""
+        await self._take(self.requests, 1)
+        await self._take(self.tokens, tokens)
+        if self.concurrency is None:
+            yield
+            return
+
+        await self.concurrency.acquire()
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = is_overload_error(e)
+            raise
+        finally:
+            await self.concurrency.release(overloaded)
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        tokens: int = 0,
+        **kwargs: Any,
+    ) -> T:
+        """Call func under the limiter, retrying overload errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.slot(tokens):
+                    return await func(*args, **kwargs)
+            except Exception as e:
+                if not is_overload_error(e) or attempt == self.max_retries:
+                    raise
+                delay = retry_after_seconds(e) or backoff_delay(attempt, base=1, cap=30)
+                metrics.increment("llm_rate_limited", limiter=self.key)
+                logger.warning(f"{self.key} overloaded ({_status_code(e)}), retrying in {delay}s")
+                await self.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        """Close the Redis connection used by shared buckets."""
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+_local_buckets: dict[str, TokenBucket] = {}
+_local_buckets_lock = threading.Lock()
+
+
+def _local_bucket(key: str, rate_per_minute: int) -> TokenBucket:
+    """Process-wide in-memory bucket for key."""
+    with _local_buckets_lock:
+        bucket = _local_buckets.get(key)
+        if bucket is None or bucket.rate != rate_per_minute / 60.0:
+            bucket = _local_buckets[key] = TokenBucket(rate_per_minute)
+        return bucket
+
+
+def build_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Build the limiter for a provider and model from settings.
+
+    Limits come from LLM_RATE_LIMITS["provider:model"] when present, else
+    LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE (0 disables a bucket).
+    """
+    key = f"{provider}:{model}"
+    limits = settings.llm_rate_limits.get(key, {})
+    rpm = limits.get("requests_per_minute", settings.llm_requests_per_minute)
+    tpm = limits.get("tokens_per_minute", settings.llm_tokens_per_minute)
+
+    redis = None
+    if settings.llm_rate_limit_backend == "redis":
+        from redis.asyncio import Redis
+
+        redis = Redis.from_url(settings.redis_url)
+
+    def bucket(kind: str, rate: int):
+        if not rate:
+            return None
+        if redis is not None:
+            return RedisTokenBucket(redis, f"ratelimit:{key}:{kind}", rate)
+        return _local_bucket(f"{key}:{kind}", rate)
+
+    return RateLimiter(
+        key,
+        requests=bucket("requests", rpm),
+        tokens=bucket("tokens", tpm),
+        concurrency=AIMDLimiter(
+            initial=settings.llm_concurrency_initial,
+            minimum=settings.llm_concurrency_min,
+            maximum=settings.llm_concurrency_max,
+        ),
+        max_retries=settings.llm_rate_limit_retries,
+        redis=redis,
+    )
+
+
+# event loop -> "provider:model" -> shared limiter
+_shared_limiters: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_shared_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Get the limiter for a provider and model shared on the current event loop.
+
+    Callers that are created per task (e.g. TranscriptionService) share one
+    limiter, so its concurrency window keeps what it learned from overload
+    errors and only one Redis client is opened. Limiters requested outside a
+    running loop are not shared.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return build_rate_limiter(provider, model)
+
+    key = f"{provider}:{model}"
+    with _shared_limiters_lock:
+        limiters = _shared_limiters.setdefault(loop, {})
+        if key not in limiters:
+            limiters[key] = build_rate_limiter(provider, model)
+        return limiters[key]
+
+
+async def aclose_rate_limiters() -> None:
+    """Close and forget the limiters shared on the current event loop."""
+    loop = asyncio.get_running_loop()
+    with _shared_limiters_lock:
+        limiters = _shared_limiters.pop(loop, {})
+    for key, limiter in limiters.items():
+        try:
+            await limiter.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close rate limiter {key}: {e}")
+
+
+class RateLimitedProvider(BaseLLMProvider):
+    """Wraps a provider so every API call goes through a RateLimiter."""
+
+    def __init__(self, provider: BaseLLMProvider, limiter: RateLimiter | None = None):
+        self.provider = provider
+        self.name = provider.name
+        self.model = provider.model
+        self.limiter = limiter or build_rate_limiter(provider.name, provider.model)
+
+    async def analyze_transcript(
+        self,
+        transcript: str,
+        context: dict | None = None,
+        fields: dict[str, str] | None = None,
+    ) -> AnalysisResult:
+        """Analyze a transcript under the rate limit."""
+        return await self.limiter.call(
+            self.provider.analyze_transcript,
+            transcript,
+            context,
+            fields,
+            tokens=estimate_tokens(transcript) + 2048,
+        )
+
+    async def generate_note(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> str:
+        """Generate a note under the rate limit."""
+        return await self.limiter.call(
+            self.provider.generate_note,
+            transcript,
+            template,
+            analysis,
+            tokens=estimate_tokens(transcript, template) + 4096,
+        )
+
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a note, holding a rate-limited slot until it finishes."""
+        async with self.limiter.slot(estimate_tokens(transcript, template) + 4096):
+            async for text in self.provider.generate_note_stream(transcript, template, analysis):
+                yield text
+
+    async def complete(
+        self,
+        prompt: str,
+        system_prompt: str | None = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Run a completion under the rate limit."""
+        return await self.limiter.call(
+            self.provider.complete,
+            prompt,
+            system_prompt,
+            max_tokens,
+            temperature,
+            tokens=estimate_tokens(prompt, system_prompt or "") + max_tokens,
+        )
+
+    async def complete_with_transcript(
+        self,
+        transcript: str,
+        instructions: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Run a transcript completion under the rate limit."""
+        return await self.limiter.call(
+            self.provider.complete_with_transcript,
+            transcript,
+            instructions,
+            max_tokens,
+            temperature,
+            tokens=estimate_tokens(transcript, instructions) + max_tokens,
+        )
+
+    async def aclose(self) -> None:
+        """Close the wrapped provider and the limiter's connections."""
+        await self.provider.aclose()
+        await self.limiter.aclose()
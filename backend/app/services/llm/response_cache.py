@@ -0,0 +1,359 @@
+"""Content-addressed cache of LLM responses for repeated identical requests."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import closing
+from pathlib import Path
+from typing import Protocol
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider
+from app.services.llm.prompts import (
+    CLINICAL_SYSTEM_PROMPT,
+    build_generation_prompt,
+    build_transcript_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+# Default on-disk cache for the CLI, next to its config file
+DEFAULT_SQLITE_PATH = Path.home() / ".notesmith" / "llm-cache.sqlite3"
+
+
+def response_cache_key(
+    provider: str,
+    model: str,
+    system_prompt: str | None,
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """SHA-256 of everything that determines an LLM response."""
+    request = json.dumps(
+        [provider, model, system_prompt or "", prompt, temperature, max_tokens],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(Protocol):
+    """Storage for cached responses, keyed by request hash."""
+
+    name: str
+
+    async def get(self, key: str) -> str | None: ...
+
+    async def set(self, key: str, value: str) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class MemoryBackend:
+    """Bounded in-process LRU, shared by every provider in the process."""
+
+    name = "memory"
+
+    def __init__(self, lru: LRUCache):
+        self.lru = lru
+
+    async def get(self, key: str) -> str | None:
+        return self.lru.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self.lru.set(key, value)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Responses in Redis with a TTL, shared by every worker process."""
+
+    name = "redis"
+
+    def __init__(self, redis, ttl_seconds: int, prefix: str = "llm-response:"):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    async def get(self, key: str) -> str | None:
+        value = await self.redis.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str) -> None:
+        await self.redis.set(self.prefix + key, value, ex=self.ttl_seconds)
+
+    async def aclose(self) -> None:
+        await self.redis.aclose()
+
+
+class SQLiteBackend:
+    """Responses in a local SQLite file with a TTL, for the CLI."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str | Path, ttl_seconds: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if not self._ready:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path, timeout=5)) as conn, conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS responses "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                    )
+                self._ready = True
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _get(self, key: str) -> str | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds),
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class ResponseCache:
+    """
+    Cache of LLM responses with optional encryption and hit-rate stats.
+
+    With a Fernet key, responses are encrypted before they reach the
+    backend. Backend failures are logged and treated as misses.
+    """
+
+    def __init__(self, backend: CacheBackend, encryption_key: str = ""):
+        self.backend = backend
+        self.fernet = None
+        if encryption_key:
+            from cryptography.fernet import Fernet
+
+            self.fernet = Fernet(encryption_key)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> str | None:
+        """Return the cached response for a request hash, if any."""
+        try:
+            value = await self.backend.get(key)
+            if value is not None and self.fernet is not None:
+                value = self.fernet.decrypt(value.encode()).decode()
+        except Exception as e:
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            metrics.increment("llm_response_cache_misses", backend=self.backend.name)
+        else:
+            self.hits += 1
+            metrics.increment("llm_response_cache_hits", backend=self.backend.name)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        """Store a response. Storage failures are logged, not raised."""
+        try:
+            if self.fernet is not None:
+                value = self.fernet.encrypt(value.encode()).decode()
+            await self.backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Failed to cache LLM response: {e}")
+
+    def stats(self) -> dict[str, float]:
+        """Return hit and miss counts and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def aclose(self) -> None:
+        """Close the backend's connections."""
+        await self.backend.aclose()
+
+
+_memory_lru: LRUCache | None = None
+_memory_lru_lock = threading.Lock()
+
+
+def _shared_memory_lru() -> LRUCache:
+    """The process-wide LRU behind every memory backend."""
+    global _memory_lru
+    with _memory_lru_lock:
+        if _memory_lru is None or _memory_lru.maxsize != settings.llm_response_cache_max_entries:
+            _memory_lru = LRUCache(settings.llm_response_cache_max_entries)
+        return _memory_lru
+
+
+def response_cache_allowed() -> bool:
+    """
+    Whether the response cache may run in this deployment.
+
+    Cached prompts and responses contain transcripts, so PHI-sensitive
+    deployments only cache when an encryption key is configured.
+    """
+    if not settings.llm_response_cache_enabled:
+        return False
+    if settings.phi_sensitive and not settings.llm_response_cache_encryption_key:
+        logger.warning(
+            "LLM response cache disabled: PHI_SENSITIVE deployments require "
+            "LLM_RESPONSE_CACHE_ENCRYPTION_KEY"
+        )
+        return False
+    return True
+
+
+def build_response_cache() -> ResponseCache:
+    """Build the response cache configured in settings."""
+    backend_name = settings.llm_response_cache_backend
+    if backend_name == "redis":
+        from redis.asyncio import Redis
+
+        backend = RedisBackend(
+            Redis.from_url(settings.redis_url), settings.llm_response_cache_ttl_seconds
+        )
+    elif backend_name == "sqlite":
+        backend = SQLiteBackend(
+            settings.llm_response_cache_path or DEFAULT_SQLITE_PATH,
+            settings.llm_response_cache_ttl_seconds,
+        )
+    else:
+        backend = MemoryBackend(_shared_memory_lru())
+    return ResponseCache(backend, settings.llm_response_cache_encryption_key)
+
+
+class CachedProvider(BaseLLMProvider):
+    """
+    Wraps a provider so identical completions and notes are served from cache.
+
+    Requests are keyed by provider, model, system prompt, prompt,
+    temperature and max tokens. Analyses are not cached here; the analysis
+    store already reuses them.
+    """
+
+    def __init__(self, provider: BaseLLMProvider, cache: ResponseCache | None = None):
+        self.provider = provider
+        self.name = provider.name
+        self.model = provider.model
+        self.cache = cache or build_response_cache()
+
+    async def _cached(self, key: str, call) -> str:
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = await call()
+        await self.cache.set(key, response)
+        return response
+
+    def _key(self, system_prompt, prompt, temperature, max_tokens) -> str:
+        return response_cache_key(
+            self.name, self.model, system_prompt, prompt, temperature, max_tokens
+        )
+
+    async def analyze_transcript(
+        self,
+        transcript: str,
+        context: dict | None = None,
+        fields: dict[str, str] | None = None,
+    ) -> AnalysisResult:
+        """Analyze a transcript (not cached here)."""
+        return await self.provider.analyze_transcript(transcript, context, fields)
+
+    async def generate_note(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> str:
+        """Generate a note, reusing the response to an identical request."""
+        key = self._key(
+            CLINICAL_SYSTEM_PROMPT,
+            build_generation_prompt(transcript, template, analysis),
+            0.3,
+            4096,
+        )
+        return await self._cached(
+            key, lambda: self.provider.generate_note(transcript, template, analysis)
+        )
+
+    async def generate_note_stream(
+        self,
+        transcript: str,
+        template: str,
+        analysis: AnalysisResult | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a note (not cached; the client is watching it being written)."""
+        async for text in self.provider.generate_note_stream(transcript, template, analysis):
+            yield text
+
+    async def complete_with_transcript(
+        self,
+        transcript: str,
+        instructions: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Complete a transcript task, reusing the response to an identical request."""
+        key = self._key(
+            CLINICAL_SYSTEM_PROMPT,
+            build_transcript_prompt(transcript, instructions),
+            temperature,
+            max_tokens,
+        )
+        return await self._cached(
+            key,
+            lambda: self.provider.complete_with_transcript(
+                transcript, instructions, max_tokens, temperature
+            ),
+        )
+
+    async def complete(
+        self,
+        prompt: str,
+        system_prompt: str | None = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.3,
+    ) -> str:
+        """Run a completion, reusing the response to an identical request."""
+        key = self._key(system_prompt, prompt, temperature, max_tokens)
+        return await self._cached(
+            key,
+            lambda: self.provider.complete(prompt, system_prompt, max_tokens, temperature),
+        )
+
+    async def aclose(self) -> None:
+        """Close the wrapped provider and the cache backend."""
+        await self.provider.aclose()
+        await self.cache.aclose()
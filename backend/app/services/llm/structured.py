@@ -0,0 +1,114 @@
+"""Structured (schema-constrained) transcript analysis output."""
+
+import json
+import logging
+from functools import cache
+
+from pydantic import ValidationError
+
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult, ClinicalEntity
+
+logger = logging.getLogger(__name__)
+
+# Tool Anthropic is forced to call with the analysis as its input
+ANALYSIS_TOOL_NAME = "record_analysis"
+
+# Filled in from the other fields rather than produced by the model
+DERIVED_FIELDS = {"entities"}
+
+# Only in the schema when template fields are requested
+TEMPLATE_FIELDS = "variables"
+
+
+class AnalysisParseError(ValueError):
+    """The model's analysis did not match the analysis schema."""
+
+
+def _strip_annotations(schema):
+    """Drop titles and defaults, which strict schema modes reject."""
+    if isinstance(schema, dict):
+        return {
+            key: _strip_annotations(value)
+            for key, value in schema.items()
+            if key not in ("title", "default")
+        }
+    if isinstance(schema, list):
+        return [_strip_annotations(item) for item in schema]
+    return schema
+
+
+@cache
+def analysis_schema(fields: tuple[str, ...] = ()) -> dict:
+    """
+    JSON schema of the analysis the model must return, derived from AnalysisResult.
+
+    Every property is required (nullable ones may be null) and no others
+    are allowed, as OpenAI's strict mode and Anthropic's strict tools need.
+    Template fields, when given, are required string-or-null properties
+    of a "variables" object.
+    """
+    properties = {
+        name: _strip_annotations(prop)
+        for name, prop in AnalysisResult.model_json_schema()["properties"].items()
+        if name not in DERIVED_FIELDS and name != TEMPLATE_FIELDS
+    }
+    if fields:
+        properties[TEMPLATE_FIELDS] = {
+            "type": "object",
+            "properties": {
+                name: {"anyOf": [{"type": "string"}, {"type": "null"}]} for name in fields
+            },
+            "required": list(fields),
+            "additionalProperties": False,
+        }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def _loads(text: str) -> dict:
+    """Decode JSON text, tolerating a surrounding markdown code block."""
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    return json.loads(text.strip())
+
+
+def parse_analysis(raw: dict | str | None, provider: str) -> AnalysisResult:
+    """
+    Build an AnalysisResult from a provider's structured output.
+
+    Counts every analysis in llm_analyses and every failure in
+    llm_analysis_parse_failures, labelled by provider.
+
+    Raises:
+        AnalysisParseError: If the output is not a valid analysis
+    """
+    metrics.increment("llm_analyses", provider=provider)
+    try:
+        data = _loads(raw) if isinstance(raw, str) else raw
+        if not isinstance(data, dict):
+            raise TypeError(f"expected a JSON object, got {type(data).__name__}")
+        analysis = AnalysisResult.model_validate(
+            {k: v for k, v in data.items() if k not in DERIVED_FIELDS}
+        )
+    except (ValueError, TypeError, ValidationError) as e:
+        metrics.increment("llm_analysis_parse_failures", provider=provider)
+        logger.error(f"Failed to parse {provider} analysis response: {e}")
+        raise AnalysisParseError(str(e)) from e
+
+    analysis.entities = [
+        ClinicalEntity(entity_type=entity_type, value=value)
+        for entity_type, values in (
+            ("procedure", analysis.procedures),
+            ("finding", analysis.findings),
+            ("recommendation", analysis.recommendations),
+        )
+        for value in values
+    ]
+    return analysis
@@ -0,0 +1,108 @@
+"""Token usage reported by LLM calls, including prompt cache reads and writes."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from app.core.metrics import metrics
+
+
+@dataclass
+class LLMUsage:
+    """
+    Tokens used by one LLM call.
+
+    input_tokens counts the whole prompt; cache_read_tokens and
+    cache_write_tokens are the parts of it served from or written to the
+    provider's prompt cache.
+    """
+
+    provider: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    latency_ms: float = 0.0
+    # "analysis", "generation" or "completion"
+    operation: str = "completion"
+
+    @property
+    def uncached_input_tokens(self) -> int:
+        """Prompt tokens billed at the normal input rate."""
+        return max(0, self.input_tokens - self.cache_read_tokens - self.cache_write_tokens)
+
+
+# Lists receiving usage recorded in the current context (see collect_usage)
+_collectors: ContextVar[tuple[list[LLMUsage], ...]] = ContextVar(
+    "llm_usage_collectors", default=()
+)
+
+
+def record_usage(usage: LLMUsage) -> None:
+    """Add a call's usage to the metrics and to any active collectors."""
+    labels = {"provider": usage.provider, "model": usage.model}
+    metrics.increment("llm_requests", **labels)
+    metrics.increment("llm_input_tokens", usage.input_tokens, **labels)
+    metrics.increment("llm_output_tokens", usage.output_tokens, **labels)
+    metrics.increment("llm_cache_read_tokens", usage.cache_read_tokens, **labels)
+    metrics.increment("llm_cache_write_tokens", usage.cache_write_tokens, **labels)
+    metrics.increment("llm_latency_ms", usage.latency_ms, **labels)
+    for collected in _collectors.get():
+        collected.append(usage)
+
+
+@contextmanager
+def collect_usage() -> Iterator[list[LLMUsage]]:
+    """
+    Collect the usage of every LLM call made within the block.
+
+    Tasks started inside the block inherit the collector, so concurrent
+    calls made through asyncio.gather are collected too.
+    """
+    collected: list[LLMUsage] = []
+    token = _collectors.set(_collectors.get() + (collected,))
+    try:
+        yield collected
+    finally:
+        _collectors.reset(token)
+
+
+def anthropic_usage(model: str, usage, **fields) -> LLMUsage:
+    """Normalize an Anthropic Usage; its input_tokens excludes cached tokens."""
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return LLMUsage(
+        provider="anthropic",
+        model=model,
+        input_tokens=usage.input_tokens + cache_read + cache_write,
+        output_tokens=usage.output_tokens,
+        cache_read_tokens=cache_read,
+        cache_write_tokens=cache_write,
+        **fields,
+    )
+
+
+def openai_usage(model: str, usage, **fields) -> LLMUsage:
+    """Normalize an OpenAI CompletionUsage; OpenAI does not bill cache writes."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return LLMUsage(
+        provider="openai",
+        model=model,
+        input_tokens=usage.prompt_tokens,
+        output_tokens=usage.completion_tokens,
+        cache_read_tokens=getattr(details, "cached_tokens", None) or 0,
+        **fields,
+    )
+
+
+def ollama_usage(model: str, response: dict, **fields) -> LLMUsage:
+    """Normalize the token counts of a final Ollama /api/generate response."""
+    return LLMUsage(
+        provider="ollama",
+        model=model,
+        input_tokens=response.get("prompt_eval_count") or 0,
+        output_tokens=response.get("eval_count") or 0,
+        **fields,
+    )
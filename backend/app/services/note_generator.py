@@ -1,25 +1,260 @@
 """Clinical note generation service."""
 
+import hashlib
+import json
 import logging
+from collections.abc import AsyncIterator
 
-from app.db.client import get_supabase_client
-from app.models.notes import NoteStatus
-from app.services.llm.base import LLMProviderFactory
+from app.core.config import settings
+from app.db.client import get_supabase_client, run_db
+from app.models.notes import AnalysisResult, NoteSection, NoteStatus
+from app.models.templates import TemplateVariable
+from app.models.transcripts import TranscriptSegment
+from app.services.analysis_store import AnalysisStore, analysis_key
+from app.services.llm.base import LLMProviderFactory, parse_batch_notes
+from app.services.llm.map_reduce import analyze_in_windows
+from app.services.llm.prompts import (
+    ANALYSIS_PROMPT_VERSION,
+    build_narrative_instructions,
+    build_section_instructions,
+)
+from app.services.llm.rate_limit import estimate_tokens
+from app.services.llm.structured import AnalysisParseError
+from app.services.llm.usage import LLMUsage, collect_usage
+from app.services.note_sections import join_sections, sections_to_list, split_sections
+from app.services.template_engine import get_template_engine
+from app.services.usage_accounting import record_note_usage
 
 logger = logging.getLogger(__name__)
 
+# Rendered in structured mode for a variable the transcript does not cover
+NOT_DOCUMENTED = "Not documented"
+
+
+def analysis_to_dict(analysis: AnalysisResult) -> dict:
+    """Serialize an analysis for the clinical_notes.analysis column."""
+    return {
+        "chief_complaint": analysis.chief_complaint,
+        "procedures": analysis.procedures,
+        "findings": analysis.findings,
+        "recommendations": analysis.recommendations,
+        "summary": analysis.summary,
+        "entities": [e.model_dump() for e in analysis.entities],
+        "variables": analysis.variables,
+    }
+
+
+def analysis_prompt_version(fields: dict[str, str] | None = None) -> str:
+    """
+    The prompt version an analysis is stored under.
+
+    Analyses extracting template fields differ per field set, so the fields
+    are folded into the version to keep them apart in the analysis store.
+    """
+    if not fields:
+        return ANALYSIS_PROMPT_VERSION
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+    return f"{ANALYSIS_PROMPT_VERSION}+{digest[:12]}"
+
+
+def _fill_plan(
+    templates: dict[str, str],
+    variables: dict[str, list[TemplateVariable]] | None,
+) -> tuple[dict[str, list[TemplateVariable]], dict[str, str], dict[str, str], dict[str, str]]:
+    """
+    Split templates' variables by how structured mode fills them.
+
+    Returns:
+        Tuple of (declared variables of each template that parses, content
+        of those that do not, narrative variables, variables to extract);
+        the last two map names to descriptions
+    """
+    engine = get_template_engine()
+    declared: dict[str, list[TemplateVariable]] = {}
+    unparsed: dict[str, str] = {}
+    for key, content in templates.items():
+        try:
+            declared[key] = engine.declare_variables(content, (variables or {}).get(key))
+        except ValueError:
+            logger.warning(f"Template {key} does not parse; generating it with the LLM")
+            unparsed[key] = content
+
+    # Variables the analysis already provides need no extraction
+    provided = engine.build_variables_from_analysis(AnalysisResult(), "")
+    definitions = [v for vs in declared.values() for v in vs if v.name not in provided]
+    narrative = {v.name: v.description for v in definitions if v.narrative}
+    fields = {v.name: v.description for v in definitions if v.name not in narrative}
+    return declared, unparsed, narrative, fields
+
+
+def extraction_fields(
+    templates: dict[str, str],
+    variables: dict[str, list[TemplateVariable]] | None = None,
+) -> dict[str, str]:
+    """Variables structured mode extracts in the analysis call for these templates."""
+    return _fill_plan(templates, variables)[3]
+
+
+def parse_segments(rows: list[dict] | None) -> list[TranscriptSegment] | None:
+    """Segments from a transcripts.segments value, or None when there are none."""
+    return [TranscriptSegment(**row) for row in rows] if rows else None
+
+
+def analyzed_in_windows(transcript: str) -> bool:
+    """Whether a transcript is long enough to be analyzed in windows."""
+    threshold = settings.analysis_map_reduce_threshold_tokens
+    return bool(threshold) and estimate_tokens(transcript) > threshold
+
+
+_analysis_store: AnalysisStore | None = None
+
+
+def get_analysis_store() -> AnalysisStore:
+    """Get the process-wide analysis store."""
+    global _analysis_store
+    if _analysis_store is None:
+        _analysis_store = AnalysisStore(
+            get_supabase_client() if settings.supabase_url else None
+        )
+    return _analysis_store
+
 
 class NoteGeneratorService:
     """Service for generating clinical notes from transcripts."""
 
-    def __init__(self, llm_provider: str | None = None):
+    def __init__(
+        self,
+        llm_provider: str | None = None,
+        analysis_store: AnalysisStore | None = None,
+        mode: str | None = None,
+    ):
         self.llm = LLMProviderFactory.get_provider(llm_provider)
+        self.analysis_store = analysis_store or get_analysis_store()
+        self.mode = mode or settings.note_generation_mode
+
+    @property
+    def structured(self) -> bool:
+        """Whether notes are rendered locally from extracted variables."""
+        return self.mode == "structured"
+
+    async def _analyze(
+        self,
+        transcript: str,
+        segments: list[TranscriptSegment] | None = None,
+        fields: dict[str, str] | None = None,
+    ) -> AnalysisResult:
+        """Analyze a transcript in one request, or in windows if it is long."""
+        if analyzed_in_windows(transcript):
+            return await analyze_in_windows(
+                self.llm, transcript, settings.analysis_window_tokens, segments, fields=fields
+            )
+        return await self.llm.analyze_transcript(transcript, fields=fields)
+
+    async def get_analysis(
+        self,
+        transcript: str,
+        segments: list[TranscriptSegment] | None = None,
+        fields: dict[str, str] | None = None,
+    ) -> AnalysisResult:
+        """
+        Analyze a transcript, reusing a stored analysis when available.
+
+        Analyses are keyed by transcript content, provider, model and prompt
+        version, so every note generated from one transcript shares a single
+        analysis call. A malformed analysis is not stored; an empty one is
+        returned instead.
+
+        Transcripts longer than ANALYSIS_MAP_REDUCE_THRESHOLD_TOKENS are split
+        into windows (between segments, when given) analyzed concurrently.
+
+        fields maps template variable names to descriptions; their values are
+        extracted in the same call and returned in analysis.variables.
+        """
+        prompt_version = analysis_prompt_version(fields)
+        key = analysis_key(transcript, self.llm.name, self.llm.model, prompt_version)
+        analysis = await run_db(self.analysis_store.get, key)
+        if analysis is None:
+            try:
+                analysis = await self._analyze(transcript, segments, fields)
+            except AnalysisParseError:
+                # Generate without analysis rather than failing the note, and
+                # leave nothing stored so the next note analyzes again
+                logger.warning("Transcript analysis was malformed; generating without it")
+                return AnalysisResult()
+            await run_db(
+                self.analysis_store.put,
+                key, analysis, self.llm.name, self.llm.model, prompt_version,
+            )
+        return analysis
+
+    async def fill_many(
+        self,
+        transcript: str,
+        templates: dict[str, str],
+        variables: dict[str, list[TemplateVariable]] | None = None,
+        fields: dict[str, str] | None = None,
+        segments: list[TranscriptSegment] | None = None,
+    ) -> tuple[dict[str, str], AnalysisResult]:
+        """
+        Fill templates from extracted variables, rendering them locally.
+
+        Every variable the templates use is extracted in the analysis call.
+        Variables marked narrative are then written in one completion for
+        all templates; there is no call when none are. Templates that do not
+        parse are generated by the LLM instead.
+
+        Args:
+            transcript: Full transcript text
+            templates: Template content keyed by an identifier (e.g. note id)
+            variables: Declared template variables, keyed like templates
+            fields: Variables the transcript was already analyzed for, when
+                it was analyzed for a wider set of templates (see
+                analyze_for_notes); reusing them hits the stored analysis
+            segments: Transcript segments, where long transcripts are split
+
+        Returns:
+            Tuple of (rendered notes keyed like templates, analysis)
+        """
+        engine = get_template_engine()
+        declared, unparsed, narrative, own_fields = _fill_plan(templates, variables)
+        fields = {**own_fields, **(fields or {})}
+
+        analysis = await self.get_analysis(transcript, segments, fields or None)
+
+        sections: dict[str, str] = {}
+        if narrative:
+            response = await self.llm.complete_with_transcript(
+                transcript,
+                build_narrative_instructions(narrative, analysis),
+                max_tokens=min(1024 * len(narrative), 8192),
+            )
+            sections = parse_batch_notes(response, list(narrative))
+            for name in narrative.keys() - sections.keys():
+                logger.warning(f"Narrative section {name} missing from the response")
+
+        extracted = {name: value for name, value in analysis.variables.items() if value}
+        analysis_values = engine.build_variables_from_analysis(analysis, transcript)
+        notes = {}
+        for key, template_variables in declared.items():
+            values = {v.name: v.default_value or NOT_DOCUMENTED for v in template_variables}
+            values.update(extracted)
+            values.update(analysis_values)
+            values.update(sections)
+            notes[key] = engine.render(templates[key], values)
+
+        if unparsed:
+            notes.update(await self.llm.generate_notes(transcript, unparsed, analysis))
+
+        return notes, analysis
 
     async def generate(
         self,
         transcript: str,
         template: str,
         analyze_first: bool = True,
+        variables: list[TemplateVariable] | None = None,
+        fields: dict[str, str] | None = None,
+        segments: list[TranscriptSegment] | None = None,
     ) -> tuple[str, dict]:
         """
         Generate a clinical note from transcript and template.
@@ -28,23 +263,26 @@ class NoteGeneratorService:
             transcript: Full transcript text
             template: Template content with placeholders
             analyze_first: Whether to analyze transcript before generation
+            variables: Declared template variables, used in structured mode
+            fields: Variables already extracted for the transcript, used in
+                structured mode (see fill_many)
+            segments: Transcript segments, where long transcripts are split
             
         Returns:
             Tuple of (generated_note, analysis_dict)
         """
+        if self.structured and analyze_first:
+            notes, analysis = await self.fill_many(
+                transcript, {"note": template}, {"note": variables or []}, fields, segments
+            )
+            return notes["note"], analysis_to_dict(analysis)
+
         analysis = None
         analysis_dict = {}
 
         if analyze_first:
-            analysis = await self.llm.analyze_transcript(transcript)
-            analysis_dict = {
-                "chief_complaint": analysis.chief_complaint,
-                "procedures": analysis.procedures,
-                "findings": analysis.findings,
-                "recommendations": analysis.recommendations,
-                "summary": analysis.summary,
-                "entities": [e.model_dump() for e in analysis.entities],
-            }
+            analysis = await self.get_analysis(transcript, segments)
+            analysis_dict = analysis_to_dict(analysis)
 
         generated_note = await self.llm.generate_note(
             transcript=transcript,
@@ -54,33 +292,286 @@ class NoteGeneratorService:
 
         return generated_note, analysis_dict
 
+    async def generate_stream(
+        self,
+        transcript: str,
+        template: str,
+        variables: list[TemplateVariable] | None = None,
+        segments: list[TranscriptSegment] | None = None,
+    ) -> tuple[AsyncIterator[str], dict]:
+        """
+        Start streaming a clinical note from transcript and template.
+
+        The transcript is analyzed (or the stored analysis reused) before the
+        stream starts, so the first fragment arrives as soon as the model
+        begins writing the note. In structured mode the note is rendered
+        before the stream starts and yielded whole.
+
+        Returns:
+            Tuple of (async iterator of note fragments, analysis_dict)
+        """
+        if self.structured:
+            note, analysis_dict = await self.generate(
+                transcript, template, variables=variables, segments=segments
+            )
+            return _single(note), analysis_dict
+
+        analysis = await self.get_analysis(transcript, segments)
+        stream = self.llm.generate_note_stream(
+            transcript=transcript,
+            template=template,
+            analysis=analysis,
+        )
+        return stream, analysis_to_dict(analysis)
+
+    async def generate_many(
+        self,
+        transcript: str,
+        templates: dict[str, str],
+        variables: dict[str, list[TemplateVariable]] | None = None,
+        fields: dict[str, str] | None = None,
+        segments: list[TranscriptSegment] | None = None,
+    ) -> tuple[dict[str, str], dict]:
+        """
+        Generate notes for several templates from one transcript.
+
+        The transcript is analyzed once and all templates are filled in a
+        single LLM request, so the transcript is only sent twice in total
+        rather than once per template. In structured mode the templates are
+        rendered locally instead (see fill_many).
+
+        Args:
+            transcript: Full transcript text
+            templates: Template content keyed by an identifier (e.g. note id)
+            variables: Declared template variables keyed like templates,
+                used in structured mode
+            fields: Variables already extracted for the transcript, used in
+                structured mode (see fill_many)
+            segments: Transcript segments, where long transcripts are split
+
+        Returns:
+            Tuple of (generated notes keyed like templates, analysis_dict)
+        """
+        if self.structured:
+            notes, analysis = await self.fill_many(
+                transcript, templates, variables, fields, segments
+            )
+            return notes, analysis_to_dict(analysis)
+
+        analysis = await self.get_analysis(transcript, segments)
+        notes = await self.llm.generate_notes(
+            transcript=transcript,
+            templates=templates,
+            analysis=analysis,
+        )
+        return notes, analysis_to_dict(analysis)
+
+    async def regenerate_sections(
+        self,
+        transcript: str,
+        template: str,
+        sections: list[NoteSection],
+        names: list[str],
+        segments: list[TranscriptSegment] | None = None,
+    ) -> tuple[list[NoteSection], dict]:
+        """
+        Regenerate some sections of a note, keeping the others as they are.
+
+        The stored analysis is reused (it is recomputed only if the transcript
+        changed) and only the named sections are written, in one request. A
+        section missing from the response keeps its current content.
+
+        Args:
+            transcript: Full transcript text
+            template: Template content the note was generated from
+            sections: The note's current sections
+            names: Names of the sections to regenerate
+            segments: Transcript segments, where long transcripts are split
+
+        Returns:
+            Tuple of (updated sections, analysis_dict)
+        """
+        analysis = await self.get_analysis(transcript, segments)
+        template_sections = {s.name: s for s in split_sections(template, template)}
+        targets = {
+            s.name: join_sections([template_sections[s.name]])
+            if s.name in template_sections else s.heading
+            for s in sections
+            if s.name in names
+        }
+
+        response = await self.llm.complete_with_transcript(
+            transcript,
+            build_section_instructions(targets, join_sections(sections), analysis),
+            max_tokens=min(1024 * len(targets), 8192),
+        )
+        rewritten = parse_batch_notes(response, list(targets))
+        for name in targets.keys() - rewritten.keys():
+            logger.warning(f"Section {name} missing from the response; keeping it")
+
+        updated = [
+            s.model_copy(update={"content": rewritten[s.name]}) if s.name in rewritten else s
+            for s in sections
+        ]
+        return updated, analysis_to_dict(analysis)
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    """Yield text as a one-fragment stream."""
+    yield text
+
+
+async def note_template_variables(
+    db,
+    note_ids: list[str],
+) -> dict[str, list[TemplateVariable]]:
+    """Get the declared variables of each note's template, keyed by note id."""
+    notes = await run_db(
+        db.table("clinical_notes").select("id, template_id").in_("id", note_ids).execute
+    )
+    template_ids = list({row["template_id"] for row in notes.data or [] if row.get("template_id")})
+    if not template_ids:
+        return {}
+    templates = await run_db(
+        db.table("templates").select("id, variables").in_("id", template_ids).execute
+    )
+    by_template = {
+        row["id"]: [TemplateVariable(**v) for v in row.get("variables") or []]
+        for row in templates.data or []
+    }
+    return {
+        row["id"]: by_template.get(row.get("template_id"), [])
+        for row in notes.data or []
+    }
+
+
+async def note_transcript_segments(
+    db,
+    note_id: str,
+    transcript_content: str,
+) -> list[TranscriptSegment] | None:
+    """
+    Segments of a note's transcript, for splitting it into analysis windows.
+
+    Only loaded when the transcript is long enough to be split.
+    """
+    if not analyzed_in_windows(transcript_content):
+        return None
+    note = await run_db(
+        db.table("clinical_notes").select("transcript_id").eq("id", note_id).execute
+    )
+    transcript_id = note.data[0].get("transcript_id") if note.data else None
+    if not transcript_id:
+        return None
+    transcript = await run_db(
+        db.table("transcripts").select("segments").eq("id", transcript_id).execute
+    )
+    return parse_segments(transcript.data[0].get("segments")) if transcript.data else None
+
+
+async def pending_note_ids(db, note_ids: list[str]) -> list[str]:
+    """
+    Filter out notes that already have generated content.
+
+    Makes note tasks idempotent: a retry after some notes were saved only
+    regenerates the rest. The analysis is reused from the analysis store.
+    """
+    result = await run_db(
+        db.table("clinical_notes").select("id, status").in_("id", note_ids).execute
+    )
+    generated = {
+        row["id"]
+        for row in result.data or []
+        if row.get("status", NoteStatus.DRAFT.value) != NoteStatus.DRAFT.value
+    }
+    return [note_id for note_id in note_ids if note_id not in generated]
+
+
+async def analyze_for_notes(
+    transcript_content: str,
+    notes: list[list[str]],
+    segments: list[TranscriptSegment] | None = None,
+) -> dict[str, str] | None:
+    """
+    Analyze a transcript ahead of generating its notes.
+
+    The note tasks then find the analysis stored, so its usage is recorded
+    here, split between the notes it serves. In structured mode the
+    variables of every note's template are extracted in this one call.
+
+    Args:
+        transcript_content: Transcript the notes are generated from
+        notes: [note_id, template_content] pairs
+        segments: The transcript's segments, where a long transcript is split
+
+    Returns:
+        The extracted fields in structured mode, for the note tasks to pass
+        on so they reuse this analysis; None otherwise
+    """
+    db = get_supabase_client()
+    service = NoteGeneratorService()
+    note_ids = [note_id for note_id, _ in notes]
+
+    fields = None
+    if service.structured:
+        variables = await note_template_variables(db, note_ids)
+        fields = extraction_fields(dict(notes), variables) or None
+
+    usage: list[LLMUsage] = []
+    try:
+        with collect_usage() as usage:
+            await service.get_analysis(transcript_content, segments, fields)
+    finally:
+        await run_db(record_note_usage, db, note_ids, usage)
+    return fields
+
 
 async def generate_clinical_note_task(
     note_id: str,
     transcript_content: str,
     template_content: str,
+    fields: dict[str, str] | None = None,
 ) -> None:
     """
     Background task to generate a clinical note.
     Updates the note record with generated content.
+
+    fields are the variables analyze_for_notes extracted, in structured mode.
     """
     db = get_supabase_client()
     service = NoteGeneratorService()
 
+    if not await pending_note_ids(db, [note_id]):
+        logger.info(f"Note already generated: {note_id}")
+        return
+
+    usage: list[LLMUsage] = []
     try:
+        variables = None
+        if service.structured:
+            variables = (await note_template_variables(db, [note_id])).get(note_id)
+        segments = await note_transcript_segments(db, note_id, transcript_content)
+
         # Generate note
-        generated_content, analysis = await service.generate(
-            transcript=transcript_content,
-            template=template_content,
-            analyze_first=True,
-        )
+        with collect_usage() as usage:
+            generated_content, analysis = await service.generate(
+                transcript=transcript_content,
+                template=template_content,
+                analyze_first=True,
+                variables=variables,
+                fields=fields,
+                segments=segments,
+            )
 
         # Update note record
-        db.table("clinical_notes").update({
-            "generated_content": generated_content,
-            "analysis": analysis,
-            "status": NoteStatus.GENERATED.value,
-        }).eq("id", note_id).execute()
+        await run_db(
+            db.table("clinical_notes").update({
+                "generated_content": generated_content,
+                "sections": sections_to_list(generated_content, template_content),
+                "analysis": analysis,
+                "status": NoteStatus.GENERATED.value,
+            }).eq("id", note_id).execute
+        )
 
         logger.info(f"Note generation completed for {note_id}")
 
@@ -88,10 +579,165 @@ async def generate_clinical_note_task(
         logger.error(f"Note generation failed for {note_id}: {e}")
 
         # Update status to draft with error
-        db.table("clinical_notes").update({
-            "status": NoteStatus.DRAFT.value,
-            "generated_content": f"Error generating note: {str(e)}",
-        }).eq("id", note_id).execute()
+        await run_db(
+            db.table("clinical_notes").update({
+                "status": NoteStatus.DRAFT.value,
+                "generated_content": f"Error generating note: {str(e)}",
+            }).eq("id", note_id).execute
+        )
+
+        raise
+
+    finally:
+        await run_db(record_note_usage, db, [note_id], usage)
+
+
+async def _collect_stream_usage(
+    stream: AsyncIterator[str],
+    usage: list[LLMUsage],
+) -> AsyncIterator[str]:
+    """
+    Iterate a stream, adding the usage recorded while producing it to usage.
+
+    The collector is entered per fragment rather than across yields, so it
+    never outlives the context it was entered in.
+    """
+    while True:
+        with collect_usage() as collected:
+            try:
+                text = await anext(stream)
+            except StopAsyncIteration:
+                return
+            finally:
+                usage.extend(collected)
+        yield text
+
+
+async def stream_clinical_note(
+    note_id: str,
+    transcript_content: str,
+    template_content: str,
+) -> AsyncIterator[str]:
+    """
+    Generate a clinical note, yielding fragments as they are produced.
+
+    The note record is updated with the full content once the stream ends,
+    exactly as generate_clinical_note_task would.
+    """
+    db = get_supabase_client()
+    service = NoteGeneratorService()
+    parts: list[str] = []
+    usage: list[LLMUsage] = []
+
+    try:
+        variables = None
+        if service.structured:
+            variables = (await note_template_variables(db, [note_id])).get(note_id)
+        segments = await note_transcript_segments(db, note_id, transcript_content)
+
+        with collect_usage() as usage:
+            stream, analysis = await service.generate_stream(
+                transcript=transcript_content,
+                template=template_content,
+                variables=variables,
+                segments=segments,
+            )
+        async for text in _collect_stream_usage(stream, usage):
+            parts.append(text)
+            yield text
+
+        await run_db(
+            db.table("clinical_notes").update({
+                "generated_content": "".join(parts),
+                "sections": sections_to_list("".join(parts), template_content),
+                "analysis": analysis,
+                "status": NoteStatus.GENERATED.value,
+            }).eq("id", note_id).execute
+        )
+
+        logger.info(f"Streamed note generation completed for {note_id}")
+
+    except Exception as e:
+        logger.error(f"Streamed note generation failed for {note_id}: {e}")
+
+        await run_db(
+            db.table("clinical_notes").update({
+                "status": NoteStatus.DRAFT.value,
+                "generated_content": f"Error generating note: {str(e)}",
+            }).eq("id", note_id).execute
+        )
+
+        raise
+
+    finally:
+        await run_db(record_note_usage, db, [note_id], usage)
+
+
+async def generate_clinical_notes_task(
+    notes: list[list[str]],
+    transcript_content: str,
+    fields: dict[str, str] | None = None,
+) -> None:
+    """
+    Background task to generate several clinical notes from one transcript.
+
+    Args:
+        notes: [note_id, template_content] pairs
+        transcript_content: Transcript all notes are generated from
+        fields: Variables analyze_for_notes extracted, in structured mode
+    """
+    db = get_supabase_client()
+    service = NoteGeneratorService()
+
+    pending = set(await pending_note_ids(db, [note_id for note_id, _ in notes]))
+    notes = [[note_id, template] for note_id, template in notes if note_id in pending]
+    if not notes:
+        return
+    note_ids = [note_id for note_id, _ in notes]
+    usage: list[LLMUsage] = []
+
+    templates = {note_id: template for note_id, template in notes}
+
+    try:
+        variables = None
+        if service.structured:
+            variables = await note_template_variables(db, note_ids)
+        # The notes share one transcript
+        segments = await note_transcript_segments(db, note_ids[0], transcript_content)
+
+        with collect_usage() as usage:
+            generated, analysis = await service.generate_many(
+                transcript=transcript_content,
+                templates=templates,
+                variables=variables,
+                fields=fields,
+                segments=segments,
+            )
+
+        for note_id in note_ids:
+            await run_db(
+                db.table("clinical_notes").update({
+                    "generated_content": generated[note_id],
+                    "sections": sections_to_list(generated[note_id], templates[note_id]),
+                    "analysis": analysis,
+                    "status": NoteStatus.GENERATED.value,
+                }).eq("id", note_id).execute
+            )
+
+        logger.info(f"Note generation completed for {len(note_ids)} notes")
+
+    except Exception as e:
+        logger.error(f"Note generation failed for {note_ids}: {e}")
+
+        await run_db(
+            db.table("clinical_notes").update({
+                "status": NoteStatus.DRAFT.value,
+                "generated_content": f"Error generating note: {str(e)}",
+            }).in_("id", note_ids).execute
+        )
 
         raise
 
+    finally:
+        # Shared calls (the analysis, the batched request) are split between the notes
+        await run_db(record_note_usage, db, note_ids, usage)
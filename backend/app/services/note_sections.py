@@ -0,0 +1,67 @@
+"""Splitting clinical notes into their template's sections."""
+
+import re
+
+from app.models.notes import NoteSection
+
+# Text before the first heading (title, date, provider)
+HEADER = "header"
+
+# A section heading: an upper-case line ending in a colon, e.g. "SUBJECTIVE:"
+HEADING_PATTERN = re.compile(r"^\s*([A-Z][A-Z0-9 /&()-]*):\s*$")
+
+
+def _normalize(line: str) -> str:
+    """Compare headings ignoring case and Markdown emphasis the model may add."""
+    return re.sub(r"[#*_\s]+", " ", line).strip().rstrip(":").strip().upper()
+
+
+def section_name(heading: str) -> str:
+    """The identifier of a heading, e.g. "Treatment Plan:" -> "treatment_plan"."""
+    return re.sub(r"[^a-z0-9]+", "_", _normalize(heading).lower()).strip("_")
+
+
+def template_headings(template_content: str) -> list[str]:
+    """Section headings of a template (SOAP, DAP, ...), in order."""
+    return [
+        line.strip()
+        for line in template_content.splitlines()
+        if "{" not in line and HEADING_PATTERN.match(line)
+    ]
+
+
+def split_sections(content: str, template_content: str) -> list[NoteSection]:
+    """
+    Split text at the template's headings.
+
+    Works on generated notes and on the template itself. Headings are
+    matched in template order; one the note leaves out is skipped and its
+    text stays in the preceding section.
+    """
+    wanted = [_normalize(heading) for heading in template_headings(template_content)]
+    sections = [NoteSection(name=HEADER, heading="", content="")]
+    lines: list[str] = []
+    for line in content.splitlines():
+        normalized = _normalize(line)
+        if normalized and normalized in wanted:
+            wanted = wanted[wanted.index(normalized) + 1:]
+            sections[-1].content = "\n".join(lines).strip()
+            sections.append(NoteSection(name=section_name(line), heading=line.strip(), content=""))
+            lines = []
+        else:
+            lines.append(line)
+    sections[-1].content = "\n".join(lines).strip()
+    return sections
+
+
+def join_sections(sections: list[NoteSection]) -> str:
+    """Reassemble a note from its sections."""
+    return "\n\n".join(
+        f"{section.heading}\n{section.content}" if section.heading else section.content
+        for section in sections
+    ).strip()
+
+
+def sections_to_list(content: str, template_content: str) -> list[dict]:
+    """Split a note for the clinical_notes.sections column."""
+    return [section.model_dump() for section in split_sections(content, template_content)]
@@ -0,0 +1,181 @@
+"""Streaming access to Supabase Storage."""
+
+import logging
+from base64 import b64encode
+from collections.abc import AsyncIterator
+from pathlib import Path
+from urllib.parse import quote
+
+import aiofiles
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Supabase's resumable (TUS) endpoint requires every part except the last
+# to be exactly 6 MB
+TUS_PART_SIZE = 6 * 1024 * 1024
+TUS_VERSION = "1.0.0"
+
+
+def object_url(bucket: str, storage_path: str) -> str:
+    """Build the Storage REST URL for an object, percent-encoding its path."""
+    base = settings.supabase_url.rstrip("/")
+    return f"{base}/storage/v1/object/{bucket}/{quote(storage_path, safe='/')}"
+
+
+def auth_headers() -> dict[str, str]:
+    """Headers authenticating as the service role."""
+    return {
+        "Authorization": f"Bearer {settings.supabase_service_role_key}",
+        "apikey": settings.supabase_service_role_key,
+    }
+
+
+async def download_to_file(
+    bucket: str,
+    storage_path: str,
+    dest: str | Path,
+    chunk_size: int | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> int:
+    """
+    Stream an object from storage straight to a local file.
+
+    Only one chunk of the object is held in memory at a time, so memory use
+    is bounded by chunk_size regardless of the object's size.
+
+    Returns:
+        Number of bytes written
+    """
+    chunk_size = chunk_size or settings.storage_download_chunk_kb * 1024
+    owns_client = client is None
+    client = client or httpx.AsyncClient(timeout=settings.storage_timeout_seconds)
+
+    written = 0
+    try:
+        async with client.stream(
+            "GET", object_url(bucket, storage_path), headers=auth_headers()
+        ) as response:
+            response.raise_for_status()
+            async with aiofiles.open(dest, "wb") as out:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await out.write(chunk)
+                    written += len(chunk)
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    logger.info(f"Downloaded {written} bytes from {bucket}/{storage_path}")
+    return written
+
+
+def _tus_metadata(**values: str) -> str:
+    """Encode TUS Upload-Metadata (comma separated `key base64(value)` pairs)."""
+    return ",".join(f"{k} {b64encode(v.encode()).decode()}" for k, v in values.items())
+
+
+async def _send_part(
+    client: httpx.AsyncClient,
+    location: str,
+    offset: int,
+    part: bytes,
+    attempts: int = 3,
+) -> int:
+    """PATCH one part, resuming from the server's offset if a request fails."""
+    headers = {
+        **auth_headers(),
+        "Tus-Resumable": TUS_VERSION,
+        "Content-Type": "application/offset+octet-stream",
+    }
+
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await client.patch(
+                location, content=part, headers={**headers, "Upload-Offset": str(offset)}
+            )
+            response.raise_for_status()
+            return int(response.headers.get("Upload-Offset", offset + len(part)))
+        except httpx.HTTPError as e:
+            if attempt == attempts:
+                raise
+            logger.warning(f"Upload part at offset {offset} failed ({e}), resuming")
+            head = await client.head(
+                location, headers={**auth_headers(), "Tus-Resumable": TUS_VERSION}
+            )
+            head.raise_for_status()
+            server_offset = int(head.headers["Upload-Offset"])
+            if server_offset >= offset + len(part):
+                return server_offset
+            part = part[server_offset - offset:]
+            offset = server_offset
+
+    return offset
+
+
+async def upload_stream(
+    bucket: str,
+    storage_path: str,
+    chunks: AsyncIterator[bytes],
+    total_size: int,
+    content_type: str,
+    part_size: int = TUS_PART_SIZE,
+    client: httpx.AsyncClient | None = None,
+) -> int:
+    """
+    Upload an object from an async stream of chunks using resumable uploads.
+
+    Chunks are regrouped into fixed-size parts, so at most one part is held
+    in memory. If the stream raises (for example because a size limit was
+    exceeded) the partial upload is cancelled and the error re-raised.
+
+    Returns:
+        Number of bytes uploaded
+    """
+    owns_client = client is None
+    client = client or httpx.AsyncClient(timeout=settings.storage_timeout_seconds)
+    base = f"{settings.supabase_url.rstrip('/')}/storage/v1/upload/resumable"
+
+    try:
+        response = await client.post(
+            base,
+            headers={
+                **auth_headers(),
+                "Tus-Resumable": TUS_VERSION,
+                "Upload-Length": str(total_size),
+                "Upload-Metadata": _tus_metadata(
+                    bucketName=bucket,
+                    objectName=storage_path,
+                    contentType=content_type,
+                ),
+            },
+        )
+        response.raise_for_status()
+        location = response.headers["Location"]
+
+        offset = 0
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    offset = await _send_part(client, location, offset, bytes(buffer[:part_size]))
+                    del buffer[:part_size]
+            if buffer or offset == 0:
+                offset = await _send_part(client, location, offset, bytes(buffer))
+        except BaseException:
+            # Best effort: free the partial upload on the server
+            try:
+                await client.delete(
+                    location, headers={**auth_headers(), "Tus-Resumable": TUS_VERSION}
+                )
+            except httpx.HTTPError:
+                pass
+            raise
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    logger.info(f"Uploaded {offset} bytes to {bucket}/{storage_path}")
+    return offset
@@ -1,17 +1,30 @@
 """Template engine for clinical note generation."""
 
-import re
+import hashlib
 from typing import Any
 
-from jinja2 import Environment, BaseLoader, TemplateSyntaxError
+from jinja2 import BaseLoader, Environment, Template, TemplateSyntaxError, meta, nodes
 
+from app.core.cache import LRUCache
+from app.core.config import settings
 from app.models.notes import AnalysisResult
+from app.models.templates import TemplateVariable
+
+
+def template_hash(template_content: str) -> str:
+    """SHA-256 of the template source."""
+    return hashlib.sha256(template_content.encode("utf-8")).hexdigest()
 
 
 class TemplateEngine:
-    """Engine for processing clinical note templates."""
+    """
+    Engine for processing clinical note templates.
+
+    Compiled templates are kept in a bounded LRU keyed by content hash, so
+    a template is lexed, parsed and compiled once rather than on every render.
+    """
 
-    def __init__(self):
+    def __init__(self, max_templates: int | None = None):
         self.env = Environment(
             loader=BaseLoader(),
             autoescape=False,  # Clinical notes don't need HTML escaping
@@ -19,6 +32,9 @@ class TemplateEngine:
         # Add custom filters
         self.env.filters["bullet_list"] = self._bullet_list
         self.env.filters["numbered_list"] = self._numbered_list
+        self.templates = LRUCache(max_templates or settings.template_cache_max_entries)
+        # Variable names per template hash
+        self.variables = LRUCache(max_templates or settings.template_cache_max_entries)
 
     @staticmethod
     def _bullet_list(items: list[str]) -> str:
@@ -34,11 +50,24 @@ class TemplateEngine:
             return "None documented"
         return "\n".join(f"{i+1}. {item}" for i, item in enumerate(items))
 
-    def render(
-        self,
-        template_content: str,
-        variables: dict[str, Any],
-    ) -> str:
+    def get_template(self, template_content: str) -> Template:
+        """
+        Get a compiled template, compiling it only on first use.
+
+        Raises:
+            ValueError: If the template has a syntax error
+        """
+        key = template_hash(template_content)
+        template = self.templates.get(key)
+        if template is None:
+            try:
+                template = self.env.from_string(template_content)
+            except TemplateSyntaxError as e:
+                raise ValueError(f"Template syntax error: {e}")
+            self.templates.set(key, template)
+        return template
+
+    def render(self, template_content: str, variables: dict[str, Any]) -> str:
         """
         Render a template with provided variables.
         
@@ -49,32 +78,53 @@ class TemplateEngine:
         Returns:
             Rendered template content
         """
-        try:
-            template = self.env.from_string(template_content)
-            return template.render(**variables)
-        except TemplateSyntaxError as e:
-            raise ValueError(f"Template syntax error: {e}")
+        template = self.get_template(template_content)
+        return template.render(**variables)
 
     def extract_variables(self, template_content: str) -> list[str]:
         """
-        Extract variable names from a template.
-        
-        Finds both {{ variable }} and {% ... variable ... %} patterns.
+        Extract the names a template reads from its render variables.
+
+        Uses Jinja's undeclared-variable analysis of the parsed template, so
+        attribute access, filter arguments, elif branches, nested loops and
+        set blocks are covered, while loop variables and names the template
+        assigns itself are not reported. Names are returned in order of
+        first use, and memoized per template hash.
+
+        Raises:
+            ValueError: If the template has a syntax error
         """
-        # Match {{ variable }} patterns
-        simple_vars = re.findall(r'\{\{\s*(\w+)', template_content)
-        
-        # Match {% for item in variable %} patterns
-        for_vars = re.findall(r'\{%\s*for\s+\w+\s+in\s+(\w+)', template_content)
-        
-        # Match {% if variable %} patterns
-        if_vars = re.findall(r'\{%\s*if\s+(\w+)', template_content)
-        
-        all_vars = set(simple_vars + for_vars + if_vars)
-        
-        # Remove built-in names
-        builtins = {'true', 'false', 'none', 'True', 'False', 'None'}
-        return list(all_vars - builtins)
+        key = template_hash(template_content)
+        names = self.variables.get(key)
+        if names is None:
+            try:
+                ast = self.env.parse(template_content)
+            except TemplateSyntaxError as e:
+                raise ValueError(f"Template syntax error: {e}")
+            undeclared = meta.find_undeclared_variables(ast)
+            # find_all walks the tree in source order
+            names = list(dict.fromkeys(
+                node.name for node in ast.find_all(nodes.Name) if node.name in undeclared
+            ))
+            self.variables.set(key, names)
+        return list(names)
+
+    def declare_variables(
+        self,
+        template_content: str,
+        declared: list[TemplateVariable] | None = None,
+    ) -> list[TemplateVariable]:
+        """
+        Variable definitions for a template, one per name it uses.
+
+        Definitions in declared are kept for names the template uses;
+        undeclared names get a bare definition.
+        """
+        by_name = {variable.name: variable for variable in declared or []}
+        return [
+            by_name.get(name) or TemplateVariable(name=name, description="")
+            for name in self.extract_variables(template_content)
+        ]
 
     def build_variables_from_analysis(
         self,
@@ -97,6 +147,17 @@ class TemplateEngine:
         }
 
 
+_template_engine: TemplateEngine | None = None
+
+
+def get_template_engine() -> TemplateEngine:
+    """Get the process-wide template engine, so compiled templates are shared."""
+    global _template_engine
+    if _template_engine is None:
+        _template_engine = TemplateEngine()
+    return _template_engine
+
+
 # Default templates
 DEFAULT_TEMPLATES = {
     "soap": {
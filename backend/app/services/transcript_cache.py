@@ -0,0 +1,140 @@
+"""Reuse of completed transcripts for re-uploaded audio."""
+
+import logging
+
+from supabase import Client
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.transcripts import TranscriptStatus
+
+logger = logging.getLogger(__name__)
+
+# Fields copied from a cached transcript into the new transcript record
+REUSED_FIELDS = ("content", "segments", "speaker_labels", "language", "word_count")
+
+
+def recording_practice(db: Client, recording_id: str) -> str | None:
+    """Practice a recording belongs to, through its appointment."""
+    recording = (
+        db.table("recordings").select("appointment_id").eq("id", recording_id).execute()
+    )
+    appointment_id = recording.data[0].get("appointment_id") if recording.data else None
+    if not appointment_id:
+        return None
+    appointment = (
+        db.table("appointments").select("practice_id").eq("id", appointment_id).execute()
+    )
+    return appointment.data[0].get("practice_id") if appointment.data else None
+
+
+def _practices_of(db: Client, recording_ids: list[str]) -> dict[str, str | None]:
+    """Map recording ids to practice ids with one query per table."""
+    recordings = (
+        db.table("recordings").select("id, appointment_id").in_("id", recording_ids).execute()
+    )
+    appointment_of = {row["id"]: row.get("appointment_id") for row in recordings.data or []}
+    appointment_ids = [a for a in set(appointment_of.values()) if a]
+    if not appointment_ids:
+        return {}
+    appointments = (
+        db.table("appointments").select("id, practice_id").in_("id", appointment_ids).execute()
+    )
+    practice_of = {row["id"]: row.get("practice_id") for row in appointments.data or []}
+    return {
+        recording_id: practice_of.get(appointment_id)
+        for recording_id, appointment_id in appointment_of.items()
+    }
+
+
+class TranscriptCache:
+    """
+    Cache of completed transcripts keyed by (practice, audio hash, language, model).
+
+    The database is the source of truth; an in-process LRU index maps keys
+    to transcript ids so repeat lookups skip the search query. The index is
+    bounded by `transcript_cache_max_entries`.
+
+    Lookups run with the service-role client, which bypasses RLS, so they
+    are scoped to the practice (recording -> appointment -> practice) of the
+    transcript being filled. Only transcripts that still carry their
+    audio_hash match: editing a transcript clears it, so corrected text is
+    never served as Whisper output for the same audio.
+    """
+
+    def __init__(self, max_entries: int | None = None):
+        self.index = LRUCache(max_entries or settings.transcript_cache_max_entries)
+
+    def lookup(
+        self,
+        db: Client,
+        practice_id: str,
+        audio_hash: str,
+        language: str,
+        model: str,
+    ) -> dict | None:
+        """Return a completed transcript of the practice for identical audio, if one exists."""
+        key = (practice_id, audio_hash, language, model)
+        transcript_id = self.index.get(key)
+
+        if transcript_id:
+            # Re-checks the key columns: another process may have edited
+            # the transcript (clearing audio_hash) since it was indexed
+            result = (
+                db.table("transcripts")
+                .select("*")
+                .eq("id", transcript_id)
+                .eq("audio_hash", audio_hash)
+                .eq("language", language)
+                .eq("model", model)
+                .eq("status", TranscriptStatus.COMPLETED.value)
+                .execute()
+            )
+            if result.data:
+                metrics.increment("transcript_cache_hits")
+                return result.data[0]
+            # The transcript was deleted, reset or edited; fall back to a search
+            self.index.pop(key)
+
+        candidates = (
+            db.table("transcripts")
+            .select("id, recording_id")
+            .eq("audio_hash", audio_hash)
+            .eq("language", language)
+            .eq("model", model)
+            .eq("status", TranscriptStatus.COMPLETED.value)
+            .execute()
+        )
+        practices = _practices_of(
+            db, [row["recording_id"] for row in candidates.data or [] if row.get("recording_id")]
+        )
+        match = next(
+            (
+                row for row in candidates.data or []
+                if practices.get(row.get("recording_id")) == practice_id
+            ),
+            None,
+        )
+
+        if match is None:
+            metrics.increment("transcript_cache_misses")
+            return None
+
+        result = db.table("transcripts").select("*").eq("id", match["id"]).execute()
+        if not result.data:
+            metrics.increment("transcript_cache_misses")
+            return None
+
+        self.index.set(key, match["id"])
+        metrics.increment("transcript_cache_hits")
+        return result.data[0]
+
+    def remember(
+        self, practice_id: str, audio_hash: str, language: str, model: str, transcript_id: str
+    ) -> None:
+        """Index a newly completed transcript."""
+        self.index.set((practice_id, audio_hash, language, model), transcript_id)
+
+
+transcript_cache = TranscriptCache()
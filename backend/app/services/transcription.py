@@ -1,23 +1,66 @@
 """Transcription service using OpenAI Whisper API."""
 
+import asyncio
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory, gettempdir
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from app.core.config import settings
-from app.db.client import get_supabase_client
+from app.db.client import get_supabase_client, run_db
 from app.models.transcripts import TranscriptSegment, TranscriptStatus
+from app.services.audio import (
+    WHISPER_MAX_FILE_BYTES,
+    audio_duration,
+    convert_to_wav,
+    is_chunkable_wav,
+    split_on_silence,
+)
+from app.services.checkpoints import JobCheckpoint, get_checkpoint_store
+from app.services.llm.rate_limit import get_rate_limiter
+from app.services.storage import download_to_file
+from app.services.transcript_cache import (
+    REUSED_FIELDS,
+    recording_practice,
+    transcript_cache,
+)
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache
+def get_transcription_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for blocking transcription work."""
+    return ThreadPoolExecutor(
+        max_workers=settings.transcription_executor_workers,
+        thread_name_prefix="transcription",
+    )
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the transcription executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_transcription_executor(), partial(func, *args, **kwargs)
+    )
+
+
 class TranscriptionService:
     """Service for audio transcription using OpenAI Whisper."""
 
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+    def __init__(self, client=None, concurrency: int | None = None):
+        if client is None and settings.openai_api_key:
+            client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.client = client
+        self.model = settings.transcription_model
+        self.concurrency = concurrency or settings.transcription_concurrency
+        self.limiter = (
+            get_rate_limiter("openai", self.model) if settings.llm_rate_limit_enabled else None
+        )
 
     async def transcribe_audio(
         self,
@@ -33,19 +76,24 @@ class TranscriptionService:
         if not self.client:
             raise ValueError("OpenAI API key not configured")
 
-        with open(audio_path, "rb") as audio_file:
-            # Use verbose_json to get timestamps
-            response = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language,
-                response_format="verbose_json",
-                timestamp_granularities=["segment"],
-            )
+        # Passing a Path lets the async client read the file without blocking
+        request = dict(
+            model=self.model,
+            file=Path(audio_path),
+            language=language,
+            response_format="verbose_json",
+            timestamp_granularities=["segment"],
+        )
+        if self.limiter:
+            response = await self.limiter.call(self.client.audio.transcriptions.create, **request)
+        else:
+            response = await self.client.audio.transcriptions.create(**request)
 
         segments = []
         if hasattr(response, "segments") and response.segments:
             for seg in response.segments:
+                if not isinstance(seg, dict):
+                    seg = seg.model_dump()
                 segments.append(
                     TranscriptSegment(
                         start_time=seg.get("start", 0),
@@ -61,89 +109,312 @@ class TranscriptionService:
             "language": response.language if hasattr(response, "language") else language,
         }
 
+    def needs_chunking(self, audio_path: str | Path) -> bool:
+        """Whether a recording is too long or too large for a single request."""
+        if not settings.transcription_chunking_enabled:
+            return False
+        if Path(audio_path).stat().st_size > WHISPER_MAX_FILE_BYTES:
+            return True
+        # Compressed recordings can be long but small; check every format's
+        # duration. Splitting is safe at any length, so unknown means split.
+        try:
+            duration = audio_duration(audio_path)
+        except RuntimeError as e:
+            # No ffprobe (e.g. local development): send it in a single request
+            logger.warning(f"Not splitting {audio_path}: {e}")
+            return False
+        return duration is None or duration > settings.transcription_chunk_seconds
+
+    async def transcribe(
+        self,
+        audio_path: str | Path,
+        language: str = "en",
+        checkpoint: JobCheckpoint | None = None,
+    ) -> dict:
+        """Transcribe a recording, splitting it into chunks when needed."""
+        if await run_blocking(self.needs_chunking, audio_path):
+            return await self.transcribe_chunked(audio_path, language, checkpoint=checkpoint)
+        return await self.transcribe_audio(audio_path, language)
+
+    async def transcribe_chunked(
+        self,
+        audio_path: str | Path,
+        language: str = "en",
+        max_chunk_seconds: float | None = None,
+        checkpoint: JobCheckpoint | None = None,
+    ) -> dict:
+        """
+        Split a long recording on silence and transcribe the chunks concurrently.
+
+        At most `self.concurrency` chunk requests are in flight at once.
+        Segment timestamps are shifted by each chunk's offset so the stitched
+        result lines up with the original recording.
+
+        With a checkpoint, each chunk's result is recorded as it completes and
+        chunks already transcribed by an earlier attempt are not sent again.
+        Splitting is deterministic, so chunk indexes match across attempts.
+        """
+        max_chunk_seconds = max_chunk_seconds or settings.transcription_chunk_seconds
+
+        with TemporaryDirectory(prefix="notesmith-chunks-") as work_dir:
+            # Chunks keep the source format, so anything but 16 kHz mono
+            # 16-bit PCM (including 44.1/48 kHz stereo WAV) is resampled first
+            wav_path = Path(audio_path)
+            if not await run_blocking(is_chunkable_wav, wav_path):
+                wav_path = await run_blocking(
+                    convert_to_wav, audio_path, Path(work_dir) / "source.wav"
+                )
+
+            chunks = await run_blocking(
+                split_on_silence,
+                wav_path,
+                work_dir,
+                max_chunk_seconds,
+                settings.transcription_min_silence_ms,
+                settings.transcription_silence_threshold_db,
+            )
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def transcribe_chunk(chunk):
+                stage = f"chunk:{max_chunk_seconds:g}:{chunk.index}"
+                if checkpoint and (saved := await run_blocking(checkpoint.get, stage)):
+                    return {
+                        **saved,
+                        "segments": [TranscriptSegment(**seg) for seg in saved["segments"]],
+                    }
+
+                async with semaphore:
+                    result = await self.transcribe_audio(chunk.path, language)
+
+                if checkpoint:
+                    await run_blocking(
+                        checkpoint.set,
+                        stage,
+                        {**result, "segments": [seg.model_dump() for seg in result["segments"]]},
+                    )
+                return result
+
+            # Let every chunk finish before raising so completed chunks are
+            # checkpointed and a retry only resends the failed ones
+            results = await asyncio.gather(
+                *(transcribe_chunk(c) for c in chunks), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+
+        segments = []
+        for chunk, result in zip(chunks, results):
+            for seg in result["segments"]:
+                segments.append(
+                    seg.model_copy(
+                        update={
+                            "start_time": seg.start_time + chunk.offset_seconds,
+                            "end_time": seg.end_time + chunk.offset_seconds,
+                        }
+                    )
+                )
+
+        return {
+            "text": " ".join(r["text"].strip() for r in results if r["text"].strip()),
+            "segments": segments,
+            "language": results[0]["language"] if results else language,
+        }
+
     async def transcribe_from_storage(
         self,
         storage_path: str,
         language: str = "en",
+        checkpoint: JobCheckpoint | None = None,
     ) -> dict:
         """
         Download audio from Supabase storage and transcribe it.
-        """
-        db = get_supabase_client()
 
-        # Download file to temporary location
-        file_data = db.storage.from_("recordings").download(storage_path)
+        The recording is streamed to a temp file (Whisper API needs a file)
+        rather than buffered in memory.
+
+        With a checkpoint, the download is kept (and recorded) until
+        discard_progress is called, so a retry does not download it again.
+        """
+        if checkpoint is not None:
+            audio_path = await self._download_checkpointed(storage_path, checkpoint)
+            return await self.transcribe(audio_path, language, checkpoint)
 
-        # Write to temp file (Whisper API needs a file)
         suffix = Path(storage_path).suffix
         with NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
-            tmp_file.write(file_data)
             tmp_path = tmp_file.name
 
         try:
-            result = await self.transcribe_audio(tmp_path, language)
+            await download_to_file("recordings", storage_path, tmp_path)
+            result = await self.transcribe(tmp_path, language)
             return result
         finally:
             # Clean up temp file
             Path(tmp_path).unlink(missing_ok=True)
 
+    async def _download_checkpointed(self, storage_path: str, checkpoint: JobCheckpoint) -> Path:
+        """Download a recording unless an earlier attempt already did."""
+        saved = await run_blocking(checkpoint.get, "audio")
+        if saved:
+            path = Path(saved["path"])
+            if path.exists() and path.stat().st_size == saved["size"]:
+                logger.info(f"Resuming {checkpoint.job} with previously downloaded audio")
+                return path
+
+        directory = Path(settings.checkpoint_dir or gettempdir()) / "notesmith-checkpoints"
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        name = hashlib.sha256(checkpoint.job.encode()).hexdigest()[:32]
+        path = directory / f"{name}{Path(storage_path).suffix}"
+
+        try:
+            size = await download_to_file("recordings", storage_path, path)
+        except BaseException:
+            # Not yet recorded in the checkpoint, so discard_progress would miss it
+            path.unlink(missing_ok=True)
+            raise
+        await run_blocking(checkpoint.set, "audio", {"path": str(path), "size": size})
+        return path
+
+
+def discard_progress(checkpoint: JobCheckpoint) -> None:
+    """Delete a job's kept audio and forget its checkpoints."""
+    saved = checkpoint.get("audio")
+    if saved:
+        Path(saved["path"]).unlink(missing_ok=True)
+    checkpoint.clear()
+
+
+def transcription_checkpoint(transcript_id: str) -> JobCheckpoint:
+    """Checkpoint for transcribing one transcript."""
+    return JobCheckpoint(get_checkpoint_store(), f"transcript:{transcript_id}")
+
 
-async def process_transcription_task(transcript_id: str, recording_id: str) -> None:
+async def process_transcription_task(
+    transcript_id: str,
+    recording_id: str,
+    language: str = "en",
+    keep_progress: bool = False,
+) -> None:
     """
     Background task to process transcription.
     Updates transcript record with results.
+
+    If identical audio has already been transcribed with the same language
+    and model, that transcript is copied instead of calling Whisper again.
+
+    Progress (downloaded audio, transcribed chunks) is checkpointed, so a
+    retry after a failure resumes rather than starting over. It is kept
+    after a failure only when keep_progress is set, i.e. when the caller
+    will retry; otherwise the downloaded recording is deleted.
+
+    Database calls go through the database executor because the Supabase
+    client is synchronous.
     """
     db = get_supabase_client()
     service = TranscriptionService()
+    checkpoint = transcription_checkpoint(transcript_id)
+
+    # Idempotent: a retry after the transcript was saved has nothing to do
+    existing = await run_db(
+        db.table("transcripts").select("status").eq("id", transcript_id).single().execute
+    )
+    if existing.data and existing.data["status"] == TranscriptStatus.COMPLETED.value:
+        logger.info(f"Transcript already completed: {transcript_id}")
+        return
 
     try:
         # Update status to processing
-        db.table("transcripts").update(
-            {"status": TranscriptStatus.PROCESSING.value}
-        ).eq("id", transcript_id).execute()
+        await run_db(
+            db.table("transcripts").update(
+                {"status": TranscriptStatus.PROCESSING.value}
+            ).eq("id", transcript_id).execute
+        )
 
         # Get recording info
-        recording = (
+        recording = await run_db(
             db.table("recordings")
-            .select("storage_path")
+            .select("storage_path, content_hash")
             .eq("id", recording_id)
             .single()
-            .execute()
+            .execute
         )
 
         if not recording.data:
             raise ValueError(f"Recording {recording_id} not found")
 
-        # Perform transcription
-        result = await service.transcribe_from_storage(recording.data["storage_path"])
+        audio_hash = recording.data.get("content_hash")
+        # Transcripts are only reused within the practice that owns them
+        practice_id = None
+        if audio_hash and settings.transcript_cache_enabled:
+            practice_id = await run_db(recording_practice, db, recording_id)
+        cached = None
+        if practice_id:
+            cached = await run_db(
+                transcript_cache.lookup, db, practice_id, audio_hash, language, service.model
+            )
+
+        if cached and cached["id"] != transcript_id:
+            logger.info(f"Reusing transcript {cached['id']} for {transcript_id}")
+            update = {field: cached.get(field) for field in REUSED_FIELDS}
+        else:
+            # Perform transcription
+            result = await service.transcribe_from_storage(
+                recording.data["storage_path"], language, checkpoint
+            )
+            update = {
+                "content": result["text"],
+                "segments": [s.model_dump() for s in result["segments"]],
+                # Whisper is told the language, so store the requested ISO
+                # code; it is part of the cache key
+                "language": language,
+                "word_count": len(result["text"].split()),
+            }
 
         # Update transcript with results
-        db.table("transcripts").update({
-            "content": result["text"],
-            "segments": [s.model_dump() for s in result["segments"]],
-            "language": result["language"],
-            "word_count": len(result["text"].split()),
-            "status": TranscriptStatus.COMPLETED.value,
-        }).eq("id", transcript_id).execute()
+        await run_db(
+            db.table("transcripts").update({
+                **update,
+                "model": service.model,
+                "audio_hash": audio_hash,
+                "status": TranscriptStatus.COMPLETED.value,
+            }).eq("id", transcript_id).execute
+        )
+
+        if practice_id:
+            transcript_cache.remember(
+                practice_id, audio_hash, language, service.model, transcript_id
+            )
 
         # Update recording status
-        db.table("recordings").update({
-            "status": "transcribed"
-        }).eq("id", recording_id).execute()
+        await run_db(
+            db.table("recordings").update({
+                "status": "transcribed"
+            }).eq("id", recording_id).execute
+        )
 
+        await run_blocking(discard_progress, checkpoint)
         logger.info(f"Transcription completed for {transcript_id}")
 
     except Exception as e:
         logger.error(f"Transcription failed for {transcript_id}: {e}")
 
-        # Update status to failed
-        db.table("transcripts").update({
-            "status": TranscriptStatus.FAILED.value,
-        }).eq("id", transcript_id).execute()
+        try:
+            # Update status to failed
+            await run_db(
+                db.table("transcripts").update({
+                    "status": TranscriptStatus.FAILED.value,
+                }).eq("id", transcript_id).execute
+            )
 
-        db.table("recordings").update({
-            "status": "failed"
-        }).eq("id", recording_id).execute()
+            await run_db(
+                db.table("recordings").update({
+                    "status": "failed"
+                }).eq("id", recording_id).execute
+            )
+        finally:
+            if not keep_progress:
+                # No retry will resume from the kept audio and chunks
+                await run_blocking(discard_progress, checkpoint)
 
         raise
-
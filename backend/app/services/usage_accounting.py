@@ -0,0 +1,194 @@
+"""Per-note, per-appointment and per-practice accounting of LLM usage."""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from supabase import Client
+
+from app.models.usage import UsageRollup, UsageTotals
+from app.services.llm.pricing import usage_cost
+from app.services.llm.usage import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+# Columns summed by rollups
+USAGE_COLUMNS = (
+    "note_id, template_id, appointment_id, model, operation, input_tokens, "
+    "output_tokens, cache_read_tokens, cache_write_tokens, latency_ms, cost_usd"
+)
+
+# Rows fetched per request when rolling up a practice
+PAGE_SIZE = 1000
+
+
+def _ids_by(db: Client, table: str, column: str, ids) -> dict[str, str | None]:
+    """Map each row id in ids to the row's value of column."""
+    ids = [i for i in set(ids) if i]
+    if not ids:
+        return {}
+    result = db.table(table).select(f"id, {column}").in_("id", ids).execute()
+    return {row["id"]: row.get(column) for row in result.data or []}
+
+
+def note_attribution(db: Client, note_ids: list[str]) -> dict[str, dict]:
+    """
+    Template, appointment and practice of each note.
+
+    Follows note -> transcript -> recording -> appointment with one query
+    per table, however many notes there are.
+    """
+    result = (
+        db.table("clinical_notes")
+        .select("id, template_id, transcript_id")
+        .in_("id", note_ids)
+        .execute()
+    )
+    notes = {row["id"]: row for row in result.data or []}
+    recordings = _ids_by(
+        db, "transcripts", "recording_id", (n.get("transcript_id") for n in notes.values())
+    )
+    appointments = _ids_by(db, "recordings", "appointment_id", recordings.values())
+    practices = _ids_by(db, "appointments", "practice_id", appointments.values())
+
+    attribution = {}
+    for note_id in note_ids:
+        note = notes.get(note_id, {})
+        appointment_id = appointments.get(recordings.get(note.get("transcript_id")))
+        attribution[note_id] = {
+            "template_id": note.get("template_id"),
+            "appointment_id": appointment_id,
+            "practice_id": practices.get(appointment_id),
+        }
+    return attribution
+
+
+def split_usage(usage: LLMUsage, parts: int) -> list[LLMUsage]:
+    """
+    Divide a call's tokens between the notes it served.
+
+    Token counts are split into whole shares that add up to the original;
+    latency is not split, since every note waited for the whole call.
+    """
+    fields = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+    shares = [
+        LLMUsage(
+            provider=usage.provider,
+            model=usage.model,
+            latency_ms=usage.latency_ms,
+            operation=usage.operation,
+        )
+        for _ in range(parts)
+    ]
+    for field in fields:
+        whole, remainder = divmod(getattr(usage, field), parts)
+        for i, share in enumerate(shares):
+            setattr(share, field, whole + (1 if i < remainder else 0))
+    return shares
+
+
+def usage_rows(usage: list[LLMUsage], attribution: dict[str, dict]) -> list[dict]:
+    """llm_usage rows for calls made on behalf of the given notes."""
+    rows = []
+    for call in usage:
+        for note_id, share in zip(attribution, split_usage(call, len(attribution))):
+            rows.append({
+                "note_id": note_id,
+                **attribution[note_id],
+                "provider": share.provider,
+                "model": share.model,
+                "operation": share.operation,
+                "input_tokens": share.input_tokens,
+                "output_tokens": share.output_tokens,
+                "cache_read_tokens": share.cache_read_tokens,
+                "cache_write_tokens": share.cache_write_tokens,
+                "latency_ms": round(share.latency_ms, 1),
+                "cost_usd": round(usage_cost(share), 6),
+            })
+    return rows
+
+
+def record_note_usage(db: Client, note_ids: list[str], usage: list[LLMUsage]) -> None:
+    """
+    Store the usage of calls made to generate the given notes.
+
+    Calls shared by several notes (the transcript analysis, a batched
+    generation) are split evenly between them. Failures are logged, not
+    raised, so accounting never fails a note.
+    """
+    if not usage or not note_ids:
+        return
+    try:
+        rows = usage_rows(usage, note_attribution(db, note_ids))
+        db.table("llm_usage").insert(rows).execute()
+    except Exception as e:
+        logger.warning(f"Failed to record LLM usage for {note_ids}: {e}")
+
+
+def _totals(rows: list[dict]) -> UsageTotals:
+    """Sum a group of llm_usage rows."""
+    return UsageTotals(
+        requests=len(rows),
+        input_tokens=sum(row["input_tokens"] for row in rows),
+        output_tokens=sum(row["output_tokens"] for row in rows),
+        cache_read_tokens=sum(row["cache_read_tokens"] for row in rows),
+        cache_write_tokens=sum(row["cache_write_tokens"] for row in rows),
+        cost_usd=round(sum(float(row["cost_usd"]) for row in rows), 6),
+        avg_latency_ms=(
+            round(sum(row["latency_ms"] for row in rows) / len(rows), 1) if rows else 0.0
+        ),
+    )
+
+
+def _grouped(rows: list[dict], column: str) -> dict[str, UsageTotals]:
+    """Totals per distinct value of column."""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[str(row.get(column))].append(row)
+    return {key: _totals(group) for key, group in groups.items()}
+
+
+def rollup(rows: list[dict]) -> UsageRollup:
+    """
+    Totals and per-template, per-model and per-operation breakdowns.
+
+    A batched call counts as one request per note it served.
+    """
+    return UsageRollup(
+        totals=_totals(rows),
+        by_template=_grouped(rows, "template_id"),
+        by_model=_grouped(rows, "model"),
+        by_operation=_grouped(rows, "operation"),
+    )
+
+
+def fetch_usage(
+    db: Client,
+    filters: dict[str, str],
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[dict]:
+    """
+    All llm_usage rows matching the column filters, a page at a time.
+
+    since and until bound created_at (inclusive).
+    """
+    rows: list[dict] = []
+    while True:
+        query = db.table("llm_usage").select(USAGE_COLUMNS)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        if since:
+            query = query.gte("created_at", since.isoformat())
+        if until:
+            query = query.lte("created_at", until.isoformat())
+        page = (
+            query.order("created_at")
+            .range(len(rows), len(rows) + PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
@@ -22,3 +22,10 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
 )
 
+if settings.worker_mode == "async":
+    # Tasks spend nearly all their time awaiting network I/O on the shared
+    # worker loop, so a thread per in-flight task is enough to feed it
+    celery_app.conf.update(
+        worker_pool="threads",
+        worker_concurrency=settings.worker_async_concurrency,
+    )
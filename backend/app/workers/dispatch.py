@@ -0,0 +1,285 @@
+"""
+Job dispatch from the API to a worker backend.
+
+API routes hand transcription, note generation and appointment processing
+to a JobBackend instead of running them in the web process. The Celery
+backend queues them for workers; the in-process backend runs them on the
+web process's event loop for development. Both refuse new jobs once
+job_queue_max_depth jobs are waiting, so a saturated deployment answers
+429 instead of piling up work it cannot finish.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Awaitable, Callable
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Job names, mapped to Celery tasks and coroutines by each backend
+TRANSCRIBE_RECORDING = "transcribe_recording"
+GENERATE_NOTE = "generate_note"
+PROCESS_APPOINTMENT = "process_appointment"
+
+
+class DispatchError(Exception):
+    """Raised when a job cannot be queued."""
+
+
+class QueueFullError(DispatchError):
+    """Raised when job_queue_max_depth jobs are already waiting."""
+
+    def __init__(self, depth: int, limit: int):
+        super().__init__(f"Job queue is full ({depth} waiting, limit {limit})")
+        self.depth = depth
+        self.limit = limit
+
+
+class BackendUnavailableError(DispatchError):
+    """Raised when the job backend (e.g. the Celery broker) cannot be reached."""
+
+
+class JobBackend(ABC):
+    """Queue for jobs the API hands off, with queue-depth backpressure."""
+
+    name: str
+
+    def __init__(self, max_depth: int = 0):
+        self.max_depth = max_depth
+
+    def ensure_capacity(self, job: str = "") -> None:
+        """
+        Refuse work while the queue is saturated.
+
+        Routes call this before creating the records a job will fill, so a
+        refused request leaves nothing behind. Probing a broker blocks, so
+        routes run it in the threadpool and then submit with check=False.
+
+        Raises:
+            QueueFullError: When max_depth jobs are waiting (0 disables the limit)
+            BackendUnavailableError: When the queue cannot be inspected
+        """
+        if not self.max_depth:
+            return
+        depth = self.depth()
+        if depth >= self.max_depth:
+            metrics.increment("jobs_rejected", job=job, backend=self.name)
+            raise QueueFullError(depth, self.max_depth)
+
+    def submit(self, job: str, check: bool = True, **kwargs) -> str:
+        """
+        Queue a job.
+
+        Args:
+            job: One of the job names above
+            check: Whether to check capacity first; False when the caller
+                already called ensure_capacity
+            kwargs: Arguments of the job's task
+
+        Returns:
+            Job id
+        """
+        if check:
+            self.ensure_capacity(job)
+        job_id = self._submit(job, kwargs)
+        metrics.increment("jobs_submitted", job=job, backend=self.name)
+        return job_id
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Number of jobs waiting to start."""
+        pass
+
+    @abstractmethod
+    def _submit(self, job: str, kwargs: dict) -> str:
+        pass
+
+
+class CeleryBackend(JobBackend):
+    """Queues jobs for Celery workers."""
+
+    name = "celery"
+
+    @staticmethod
+    def _tasks() -> dict:
+        from app.workers import tasks
+
+        return {
+            TRANSCRIBE_RECORDING: tasks.transcribe_recording_task,
+            GENERATE_NOTE: tasks.generate_note_task,
+            PROCESS_APPOINTMENT: tasks.process_appointment_task,
+        }
+
+    def depth(self) -> int:
+        """Messages waiting in the default queue on the broker."""
+        from kombu.exceptions import OperationalError
+
+        from app.workers.celery_app import celery_app
+
+        with celery_app.connection_for_write() as connection:
+            try:
+                # Declared as Celery declares it; returns the message count
+                declared = connection.default_channel.queue_declare(
+                    queue=celery_app.conf.task_default_queue, durable=True, auto_delete=False
+                )
+            except (
+                OperationalError, *connection.connection_errors, *connection.channel_errors
+            ) as e:
+                raise BackendUnavailableError(f"Job broker unavailable: {e}") from e
+        return declared.message_count
+
+    def _submit(self, job: str, kwargs: dict) -> str:
+        from kombu.exceptions import OperationalError
+
+        try:
+            return self._tasks()[job].apply_async(kwargs=kwargs).id
+        except OperationalError as e:
+            raise BackendUnavailableError(f"Job broker unavailable: {e}") from e
+
+
+async def process_appointment(appointment_id: str, user_id: str) -> None:
+    """
+    Process an appointment without Celery, as build_appointment_workflow does.
+
+    Recordings are handled concurrently: each is transcribed if needed, then
+    its transcript analyzed once and its notes generated.
+    """
+    from app.db.client import get_supabase_client, run_db
+    from app.services.note_generator import (
+        analyze_for_notes,
+        generate_clinical_note_task,
+        generate_clinical_notes_task,
+        parse_segments,
+    )
+    from app.services.transcription import process_transcription_task
+    from app.workers.tasks import (
+        appointment_failed_task,
+        complete_appointment_task,
+        plan_appointment,
+    )
+
+    db = get_supabase_client()
+
+    async def process_recording(job: dict) -> None:
+        if job["needs_transcription"]:
+            await process_transcription_task(job["transcript_id"], job["recording_id"])
+        if not job["notes"]:
+            return
+        transcript = await run_db(
+            db.table("transcripts")
+            .select("content, segments")
+            .eq("id", job["transcript_id"])
+            .single()
+            .execute
+        )
+        content = transcript.data["content"]
+        fields = await analyze_for_notes(
+            content, job["notes"], parse_segments(transcript.data.get("segments"))
+        )
+
+        if settings.llm_batch_generation:
+            size = max(1, settings.llm_batch_max_templates)
+            batches = [job["notes"][i:i + size] for i in range(0, len(job["notes"]), size)]
+            await asyncio.gather(
+                *(generate_clinical_notes_task(batch, content, fields) for batch in batches)
+            )
+        else:
+            await asyncio.gather(*(
+                generate_clinical_note_task(note_id, content, template, fields)
+                for note_id, template in job["notes"]
+            ))
+
+    try:
+        jobs = await run_db(plan_appointment, db, appointment_id)
+        await asyncio.gather(*(process_recording(job) for job in jobs))
+    except Exception as exc:
+        await run_db(appointment_failed_task, None, exc, None, appointment_id)
+        raise
+
+    await run_db(complete_appointment_task, appointment_id, user_id, len(jobs))
+
+
+class InProcessBackend(JobBackend):
+    """
+    Runs jobs as tasks on the web process's event loop, for development.
+
+    At most `concurrency` jobs run at once and the rest wait in order. Jobs
+    are lost when the process stops, so production deployments use Celery.
+    submit() must be called from the event loop (i.e. from a route).
+    """
+
+    name = "inprocess"
+
+    def __init__(self, max_depth: int = 0, concurrency: int = 4):
+        super().__init__(max_depth)
+        self.concurrency = max(1, concurrency)
+        self.pending: deque[tuple[str, str, dict]] = deque()
+        self.running: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _jobs() -> dict[str, Callable[..., Awaitable]]:
+        from app.services.note_generator import generate_clinical_note_task
+        from app.services.transcription import process_transcription_task
+
+        return {
+            TRANSCRIBE_RECORDING: process_transcription_task,
+            GENERATE_NOTE: generate_clinical_note_task,
+            PROCESS_APPOINTMENT: process_appointment,
+        }
+
+    def depth(self) -> int:
+        """Jobs waiting for a free slot."""
+        return len(self.pending)
+
+    def _submit(self, job: str, kwargs: dict) -> str:
+        job_id = str(uuid4())
+        self.pending.append((job_id, job, kwargs))
+        self._start_next()
+        return job_id
+
+    def _start_next(self) -> None:
+        while self.pending and len(self.running) < self.concurrency:
+            job_id, job, kwargs = self.pending.popleft()
+            task = asyncio.get_running_loop().create_task(self._run(job_id, job, kwargs))
+            self.running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self.running.discard(task)
+        self._start_next()
+
+    async def _run(self, job_id: str, job: str, kwargs: dict) -> None:
+        try:
+            await self._jobs()[job](**kwargs)
+        except Exception as e:
+            # The job has already recorded the failure on its records
+            logger.error(f"Job {job} failed: {job_id}: {e}")
+
+    async def join(self) -> None:
+        """Wait until every submitted job has finished."""
+        while self.running:
+            await asyncio.gather(*self.running)
+            # Awaiting finished tasks does not yield; let their callbacks
+            # remove them and start the jobs waiting behind them
+            await asyncio.sleep(0)
+
+
+_job_backend: JobBackend | None = None
+
+
+def get_job_backend() -> JobBackend:
+    """Get the process-wide job backend selected by JOB_BACKEND."""
+    global _job_backend
+    if _job_backend is None:
+        if settings.job_backend == "inprocess":
+            _job_backend = InProcessBackend(
+                settings.job_queue_max_depth, settings.job_inprocess_concurrency
+            )
+        else:
+            _job_backend = CeleryBackend(settings.job_queue_max_depth)
+    return _job_backend
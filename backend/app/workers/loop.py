@@ -0,0 +1,132 @@
+"""Long-lived asyncio event loop for Celery worker processes."""
+
+import asyncio
+import logging
+import os
+import threading
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerLoop:
+    """
+    An event loop running on a background thread for the life of a process.
+
+    Tasks submit coroutines with run() instead of creating a loop each, so
+    anything bound to the loop (HTTP connection pools, shared LLM providers)
+    survives from one task to the next. Submitting from several threads is
+    safe; the coroutines run concurrently on the one loop, at most
+    max_in_flight at a time when a limit is given.
+    """
+
+    def __init__(self, max_in_flight: int | None = None):
+        self.max_in_flight = max_in_flight
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether the loop is running in this process."""
+        return (
+            self._loop is not None
+            and self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def start(self) -> None:
+        """Start the loop thread if it is not already running in this process."""
+        with self._lock:
+            if self.running:
+                return
+
+            # A loop inherited across fork has no thread behind it; start afresh
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight) if self.max_in_flight else None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=run, name="worker-loop", daemon=True)
+            self._thread.start()
+            started.wait()
+            logger.info(f"Worker event loop started in process {self._pid}")
+
+    async def _limited(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await a coroutine while holding one of the in-flight slots."""
+        async with self._semaphore:
+            return await coro
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float | None = None) -> T:
+        """Run a coroutine on the worker loop and block until it finishes."""
+        if not self.running:
+            self.start()
+        if self._semaphore is not None:
+            coro = self._limited(coro)
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Timed out or interrupted (e.g. a soft time limit): stop the coroutine too
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Close shared providers and rate limiters, then stop and close the loop."""
+        from app.services.llm.base import LLMProviderFactory
+        from app.services.llm.rate_limit import aclose_rate_limiters
+
+        with self._lock:
+            if not self.running:
+                return
+            loop, thread = self._loop, self._thread
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    LLMProviderFactory.aclose(), loop
+                ).result(timeout)
+            except Exception as e:
+                logger.warning(f"Failed to close LLM providers: {e}")
+            try:
+                asyncio.run_coroutine_threadsafe(aclose_rate_limiters(), loop).result(timeout)
+            except Exception as e:
+                logger.warning(f"Failed to close rate limiters: {e}")
+
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+            self._loop = self._thread = self._pid = self._semaphore = None
+            logger.info("Worker event loop stopped")
+
+
+worker_loop = WorkerLoop(
+    max_in_flight=settings.worker_async_concurrency if settings.worker_mode == "async" else None
+)
+
+
+@worker_process_init.connect
+def start_worker_loop(**kwargs) -> None:
+    """Start the loop when a prefork child process boots."""
+    worker_loop.start()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def stop_worker_loop(**kwargs) -> None:
+    """Release the loop's connections when the child process (or a threads-pool worker) exits."""
+    worker_loop.stop()
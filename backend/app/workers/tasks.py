@@ -1,20 +1,31 @@
 """Celery tasks for background processing."""
 
-import asyncio
 import logging
 
+from celery import chain, chord, group
+
+from app.core.backoff import backoff_delay
 from app.workers.celery_app import celery_app
+from app.workers.loop import worker_loop
 
 logger = logging.getLogger(__name__)
 
 
 def run_async(coro):
-    """Run async function in sync context."""
-    loop = asyncio.new_event_loop()
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+    """
+    Run async function in sync context.
+
+    Coroutines run on the process-wide worker loop, so clients bound to it
+    are reused across tasks.
+    """
+    return worker_loop.run(coro)
+
+
+def retry_countdown(task, base: float) -> float:
+    """Jittered exponential countdown for a task's next retry."""
+    from app.core.config import settings
+
+    return backoff_delay(task.request.retries, base, settings.task_retry_max_seconds)
 
 
 @celery_app.task(bind=True, max_retries=3)
@@ -25,11 +36,18 @@ def transcribe_recording_task(self, transcript_id: str, recording_id: str):
     from app.services.transcription import process_transcription_task
 
     try:
-        run_async(process_transcription_task(transcript_id, recording_id))
+        run_async(
+            process_transcription_task(
+                transcript_id,
+                recording_id,
+                # A retry resumes from the downloaded audio and finished chunks
+                keep_progress=self.request.retries < self.max_retries,
+            )
+        )
         logger.info(f"Transcription completed: {transcript_id}")
     except Exception as exc:
         logger.error(f"Transcription failed: {exc}")
-        raise self.retry(exc=exc, countdown=60)  # Retry after 60 seconds
+        raise self.retry(exc=exc, countdown=retry_countdown(self, base=30))
 
 
 @celery_app.task(bind=True, max_retries=3)
@@ -38,6 +56,7 @@ def generate_note_task(
     note_id: str,
     transcript_content: str,
     template_content: str,
+    fields: dict[str, str] | None = None,
 ):
     """
     Celery task for generating clinical notes.
@@ -46,199 +65,338 @@ def generate_note_task(
 
     try:
         run_async(
-            generate_clinical_note_task(note_id, transcript_content, template_content)
+            generate_clinical_note_task(note_id, transcript_content, template_content, fields)
         )
         logger.info(f"Note generation completed: {note_id}")
     except Exception as exc:
         logger.error(f"Note generation failed: {exc}")
-        raise self.retry(exc=exc, countdown=30)
+        raise self.retry(exc=exc, countdown=retry_countdown(self, base=15))
 
 
-@celery_app.task(bind=True, max_retries=2)
-def process_appointment_task(self, appointment_id: str, user_id: str):
+@celery_app.task(bind=True, max_retries=3)
+def generate_notes_batch_task(
+    self,
+    transcript_content: str,
+    notes: list[list[str]],
+    fields: dict[str, str] | None = None,
+):
     """
-    Celery task for processing an entire appointment with AI.
+    Celery task for generating several clinical notes in one LLM request.
+    """
+    from app.services.note_generator import generate_clinical_notes_task
 
-    This task:
-    1. Gets all recordings for the appointment
-    2. Transcribes any recordings that haven't been transcribed yet
-    3. For each transcript and each assigned template, generates a clinical note
-    4. Updates appointment status to COMPLETED when done
+    try:
+        run_async(generate_clinical_notes_task(notes, transcript_content, fields))
+        logger.info(f"Batched note generation completed: {len(notes)} notes")
+    except Exception as exc:
+        logger.error(f"Batched note generation failed: {exc}")
+        raise self.retry(exc=exc, countdown=retry_countdown(self, base=15))
+
+
+def note_generation_signatures(
+    transcript_content: str,
+    notes: list[list[str]],
+    fields: dict[str, str] | None = None,
+) -> list:
+    """
+    Build the generation tasks for one transcript's notes.
+
+    With llm_batch_generation enabled, notes are grouped into batches of at
+    most llm_batch_max_templates and each batch is filled by one request;
+    otherwise every note gets its own generate_note_task. fields (structured
+    mode) are passed on so every task reuses the transcript's analysis.
+    """
+    from app.core.config import settings
+
+    if not settings.llm_batch_generation or len(notes) == 1:
+        return [
+            generate_note_task.si(note_id, transcript_content, template_content, fields)
+            for note_id, template_content in notes
+        ]
+
+    size = max(1, settings.llm_batch_max_templates)
+    return [
+        generate_notes_batch_task.si(transcript_content, notes[i:i + size], fields)
+        for i in range(0, len(notes), size)
+    ]
+
+
+@celery_app.task(bind=True, max_retries=3)
+def generate_transcript_notes_task(self, transcript_id: str, notes: list[list[str]]):
+    """
+    Fan out note generation for one transcript once it is available.
 
     Args:
-        appointment_id: UUID of the appointment to process
-        user_id: UUID of the user who initiated the processing
+        transcript_id: Transcript the notes are generated from
+        notes: [note_id, template_content] pairs created up front by
+            plan_appointment
+
+    The transcript is analyzed once here and the analysis stored, so every
+    note generation reuses it instead of re-analyzing the transcript.
+
+    Replaces itself with a group of generation tasks (see
+    note_generation_signatures). When used inside a chord the chord waits
+    for the replacement group.
     """
-    from app.db.client import get_db_client
+    from app.db.client import get_supabase_client
+    from app.services.note_generator import analyze_for_notes, parse_segments
+
+    if not notes:
+        return []
+
+    db = get_supabase_client()
+    transcript_result = (
+        db.table("transcripts")
+        .select("id, content, segments, status")
+        .eq("id", transcript_id)
+        .single()
+        .execute()
+    )
+    transcript = transcript_result.data
+    if not transcript or transcript["status"] != "completed":
+        raise ValueError(f"Transcript not completed: {transcript_id}")
+
+    segments = parse_segments(transcript.get("segments"))
+    fields = run_async(analyze_for_notes(transcript["content"], notes, segments))
+
+    logger.info(f"Queuing {len(notes)} notes for transcript: {transcript_id}")
+    raise self.replace(group(note_generation_signatures(transcript["content"], notes, fields)))
+
+
+@celery_app.task
+def complete_appointment_task(appointment_id: str, user_id: str, recordings_processed: int):
+    """Mark an appointment completed once all of its notes are generated."""
     from app.core.logging import audit_logger
+    from app.db.client import get_supabase_client
     from app.models.appointments import AppointmentStatus
 
-    try:
-        db = get_db_client()
-        logger.info(f"Starting appointment processing: {appointment_id}")
+    db = get_supabase_client()
+    db.table("appointments").update(
+        {"status": AppointmentStatus.COMPLETED.value}
+    ).eq("id", appointment_id).execute()
+
+    audit_logger.log_access(
+        user_id=user_id,
+        action="process_completed",
+        resource_type="appointment",
+        resource_id=appointment_id,
+        details={"recordings_processed": recordings_processed},
+    )
+    logger.info(f"Appointment processing completed: {appointment_id}")
+
+
+@celery_app.task
+def appointment_failed_task(request, exc, traceback, appointment_id: str):
+    """Error callback for the appointment workflow."""
+    from app.db.client import get_supabase_client
+    from app.models.appointments import AppointmentStatus
 
-        # Get appointment details
-        appointment_result = (
-            db.table("appointments")
-            .select("*, template_ids")
-            .eq("id", appointment_id)
-            .single()
-            .execute()
-        )
+    logger.error(f"Appointment processing failed: {appointment_id}: {exc}")
+    db = get_supabase_client()
+    db.table("appointments").update(
+        {"status": AppointmentStatus.SCHEDULED.value, "notes": f"Processing failed: {str(exc)}"}
+    ).eq("id", appointment_id).execute()
 
-        if not appointment_result.data:
-            raise ValueError(f"Appointment not found: {appointment_id}")
 
-        appointment = appointment_result.data
-        template_ids = appointment.get("template_ids", [])
+def plan_appointment(db, appointment_id: str) -> list[dict]:
+    """
+    Create the transcript and note records an appointment needs.
 
-        if not template_ids:
-            raise ValueError(f"No templates assigned to appointment: {appointment_id}")
+    Uses a constant number of round-trips regardless of how many recordings
+    and templates the appointment has: existing transcripts and notes are
+    fetched in one query each, and missing rows are created with one bulk
+    insert each.
 
-        # Get all recordings for this appointment
-        recordings_result = (
-            db.table("recordings")
-            .select("*")
-            .eq("appointment_id", appointment_id)
-            .eq("status", "uploaded")
+    Returns:
+        One job per recording: transcript_id, recording_id,
+        needs_transcription and notes ([note_id, template_content] pairs
+        still to generate, including drafts an earlier run left unfinished)
+    """
+    # Get appointment details
+    appointment_result = (
+        db.table("appointments")
+        .select("*, template_ids")
+        .eq("id", appointment_id)
+        .single()
+        .execute()
+    )
+
+    if not appointment_result.data:
+        raise ValueError(f"Appointment not found: {appointment_id}")
+
+    template_ids = [str(t) for t in appointment_result.data.get("template_ids") or []]
+    if not template_ids:
+        raise ValueError(f"No templates assigned to appointment: {appointment_id}")
+
+    # Get all recordings for this appointment
+    recordings_result = (
+        db.table("recordings")
+        .select("*")
+        .eq("appointment_id", appointment_id)
+        .eq("status", "uploaded")
+        .execute()
+    )
+
+    if not recordings_result.data:
+        raise ValueError(f"No uploaded recordings found for appointment: {appointment_id}")
+
+    recording_ids = [r["id"] for r in recordings_result.data]
+    logger.info(f"Found {len(recording_ids)} recordings to process")
+
+    # One lookup for every recording's transcript, one insert for the missing ones
+    transcripts_result = (
+        db.table("transcripts")
+        .select("id, recording_id, status")
+        .in_("recording_id", recording_ids)
+        .execute()
+    )
+    transcripts = {t["recording_id"]: t for t in transcripts_result.data or []}
+
+    missing = [rid for rid in recording_ids if rid not in transcripts]
+    if missing:
+        created = (
+            db.table("transcripts")
+            .insert([{"recording_id": rid, "status": "pending"} for rid in missing])
             .execute()
         )
+        transcripts.update({t["recording_id"]: t for t in created.data})
+        logger.info(f"Created {len(created.data)} transcripts")
+
+    templates_result = (
+        db.table("templates")
+        .select("id, content")
+        .in_("id", template_ids)
+        .execute()
+    )
+
+    if not templates_result.data:
+        raise ValueError(f"No templates found for IDs: {template_ids}")
+
+    templates = {t["id"]: t["content"] for t in templates_result.data}
+    transcript_ids = [transcripts[rid]["id"] for rid in recording_ids]
+
+    # One lookup for existing notes, one insert for every missing pair
+    existing_result = (
+        db.table("clinical_notes")
+        .select("id, transcript_id, template_id, status")
+        .in_("transcript_id", transcript_ids)
+        .execute()
+    )
+    existing = {(n["transcript_id"], n["template_id"]) for n in existing_result.data or []}
+    notes_by_transcript: dict[str, list[list[str]]] = {tid: [] for tid in transcript_ids}
+    # A retry regenerates every draft an earlier run left, whether empty or
+    # holding its error, as pending_note_ids treats drafts as not generated
+    for note in existing_result.data or []:
+        if note["status"] == "draft" and note["template_id"] in templates:
+            notes_by_transcript[note["transcript_id"]].append(
+                [note["id"], templates[note["template_id"]]]
+            )
 
-        if not recordings_result.data:
-            raise ValueError(f"No uploaded recordings found for appointment: {appointment_id}")
+    new_notes = [
+        {
+            "transcript_id": transcript_id,
+            "template_id": template_id,
+            "generated_content": "",
+            "status": "draft",
+        }
+        for transcript_id in transcript_ids
+        for template_id in templates
+        if (transcript_id, template_id) not in existing
+    ]
+    if new_notes:
+        created = db.table("clinical_notes").insert(new_notes).execute()
+        for note in created.data:
+            notes_by_transcript[note["transcript_id"]].append(
+                [note["id"], templates[note["template_id"]]]
+            )
+        logger.info(f"Created {len(created.data)} note records")
+
+    return [
+        {
+            "transcript_id": transcripts[rid]["id"],
+            "recording_id": rid,
+            "needs_transcription": transcripts[rid]["status"] != "completed",
+            "notes": notes_by_transcript[transcripts[rid]["id"]],
+        }
+        for rid in recording_ids
+    ]
 
-        recordings = recordings_result.data
-        logger.info(f"Found {len(recordings)} recordings to process")
 
-        # Process each recording
-        for recording in recordings:
-            recording_id = recording["id"]
+def build_appointment_workflow(
+    appointment_id: str,
+    user_id: str,
+    jobs: list[dict],
+):
+    """
+    Build the Celery workflow for an appointment from plan_appointment jobs.
 
-            # Check if transcript already exists
-            transcript_result = (
-                db.table("transcripts")
-                .select("*")
-                .eq("recording_id", recording_id)
-                .execute()
+    Each recording gets its own chain (transcribe -> generate notes), so note
+    generation starts as soon as that recording's transcript lands. A chord
+    marks the appointment completed when every chain has finished.
+    """
+    per_recording = []
+    for job in jobs:
+        generate = generate_transcript_notes_task.si(job["transcript_id"], job["notes"])
+        if job["needs_transcription"]:
+            per_recording.append(
+                chain(
+                    transcribe_recording_task.si(job["transcript_id"], job["recording_id"]),
+                    generate,
+                )
             )
+        else:
+            per_recording.append(generate)
 
-            if transcript_result.data and len(transcript_result.data) > 0:
-                # Transcript exists
-                transcript = transcript_result.data[0]
-                logger.info(f"Using existing transcript: {transcript['id']}")
-            else:
-                # Create and transcribe
-                transcript_data = {
-                    "recording_id": recording_id,
-                    "status": "pending",
-                }
-                transcript_create_result = (
-                    db.table("transcripts").insert(transcript_data).execute()
-                )
-                transcript = transcript_create_result.data[0]
-                logger.info(f"Created transcript: {transcript['id']}")
+    workflow = chord(
+        per_recording,
+        complete_appointment_task.si(appointment_id, user_id, len(jobs)),
+    )
+    return workflow.on_error(appointment_failed_task.s(appointment_id))
 
-                # Queue transcription task and wait for it
-                transcribe_recording_task.apply_async(
-                    args=[transcript["id"], recording_id],
-                    countdown=1,
-                )
-                logger.info(f"Queued transcription task for: {transcript['id']}")
 
-        # Get all completed transcripts
-        transcripts_result = (
-            db.table("transcripts")
-            .select("*")
-            .in_("recording_id", [r["id"] for r in recordings])
-            .eq("status", "completed")
-            .execute()
-        )
+@celery_app.task(bind=True, max_retries=2)
+def process_appointment_task(self, appointment_id: str, user_id: str):
+    """
+    Celery task for processing an entire appointment with AI.
 
-        if not transcripts_result.data:
-            logger.warning("No completed transcripts yet, will need to retry")
-            raise self.retry(countdown=60)
+    This task:
+    1. Creates transcript records for recordings that haven't been transcribed
+       yet and note records for each transcript x assigned template
+    2. Launches a workflow that, per recording, transcribes and then generates
+       that recording's notes
+    3. The workflow marks the appointment COMPLETED when every note is done
 
-        # Get template data
-        templates_result = (
-            db.table("templates")
-            .select("*")
-            .in_("id", template_ids)
-            .execute()
-        )
+    Args:
+        appointment_id: UUID of the appointment to process
+        user_id: UUID of the user who initiated the processing
+    """
+    from app.db.client import get_supabase_client
+    from app.models.appointments import AppointmentStatus
 
-        if not templates_result.data:
-            raise ValueError(f"No templates found for IDs: {template_ids}")
-
-        templates = templates_result.data
-        logger.info(f"Found {len(templates)} templates to use")
-
-        # Generate notes for each transcript x template combination
-        notes_created = 0
-        for transcript in transcripts_result.data:
-            for template in templates:
-                # Check if note already exists
-                existing_note = (
-                    db.table("clinical_notes")
-                    .select("id")
-                    .eq("transcript_id", transcript["id"])
-                    .eq("template_id", template["id"])
-                    .execute()
-                )
+    try:
+        db = get_supabase_client()
+        logger.info(f"Starting appointment processing: {appointment_id}")
 
-                if existing_note.data:
-                    logger.info(f"Note already exists, skipping")
-                    continue
-
-                # Create note record
-                note_data = {
-                    "transcript_id": transcript["id"],
-                    "template_id": template["id"],
-                    "generated_content": "",
-                    "status": "draft",
-                }
-                note_result = db.table("clinical_notes").insert(note_data).execute()
-                note = note_result.data[0]
-
-                # Queue note generation task
-                generate_note_task.apply_async(
-                    args=[note["id"], transcript["content"], template["content"]],
-                    countdown=1,
-                )
-                notes_created += 1
-                logger.info(f"Queued note generation for: {note['id']}")
-
-        # Update appointment status to COMPLETED
-        db.table("appointments").update(
-            {"status": AppointmentStatus.COMPLETED.value}
-        ).eq("id", appointment_id).execute()
-
-        audit_logger.log_access(
-            user_id=user_id,
-            action="process_completed",
-            resource_type="appointment",
-            resource_id=appointment_id,
-            details={
-                "recordings_processed": len(recordings),
-                "transcripts_created": len(transcripts_result.data),
-                "notes_queued": notes_created,
-            },
-        )
+        jobs = plan_appointment(db, appointment_id)
+        result = build_appointment_workflow(appointment_id, user_id, jobs).apply_async()
 
-        logger.info(f"Appointment processing completed: {appointment_id}")
+        logger.info(f"Queued appointment workflow: {appointment_id}")
         return {
             "success": True,
             "appointment_id": appointment_id,
-            "notes_queued": notes_created,
+            "workflow_id": result.id,
+            "recordings_queued": len(jobs),
+            "notes_queued": sum(len(job["notes"]) for job in jobs),
         }
 
     except Exception as exc:
         logger.error(f"Appointment processing failed: {exc}")
         # Update appointment status to indicate error
         try:
-            db = get_db_client()
+            db = get_supabase_client()
             db.table("appointments").update(
                 {"status": AppointmentStatus.SCHEDULED.value, "notes": f"Processing failed: {str(exc)}"}
             ).eq("id", appointment_id).execute()
-        except:
+        except Exception:
             pass
-        raise self.retry(exc=exc, countdown=120)
+        raise self.retry(exc=exc, countdown=retry_countdown(self, base=60))
@@ -0,0 +1 @@
+"""Benchmarks for NoteSmith backend performance work."""
@@ -0,0 +1,147 @@
+"""
+Benchmark end-to-end appointment processing through the Celery workflow.
+
+Runs a real worker against Celery's in-memory broker with stubbed
+transcription and note generation, and reports the time from queueing
+process_appointment_task until the appointment is marked completed. The
+previous implementation retried with a 60 second countdown whenever
+transcripts were not ready, so it could never finish in under a minute.
+
+Usage:
+    python -m benchmarks.bench_appointment_pipeline [--recordings 4] [--templates 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import time
+from unittest import mock
+
+from celery.contrib.testing.worker import start_worker
+
+from app.models.notes import AnalysisResult
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.workers import tasks
+from app.workers.celery_app import celery_app
+from tests.fakes import FakeSupabase
+
+LLM_CALLS = []
+
+
+class BenchProvider(BaseLLMProvider):
+    """LLM provider that sleeps instead of calling an API."""
+
+    name = "bench"
+    model = "bench-1"
+    seconds = 0.3
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        LLM_CALLS.append("analyze")
+        await asyncio.sleep(self.seconds)
+        return AnalysisResult(summary="summary")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        LLM_CALLS.append("generate")
+        await asyncio.sleep(self.seconds)
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        LLM_CALLS.append("complete")
+        await asyncio.sleep(self.seconds)
+        # Answer batched generation prompts with one section per template
+        keys = re.findall(r"^=== NOTE (\S+) ===$", prompt, re.MULTILINE)
+        return "\n".join(f"=== NOTE {k} ===\nnote\n=== END NOTE {k} ===" for k in keys)
+
+
+def seed(db: FakeSupabase, recordings: int, templates: int) -> str:
+    templates_result = db.table("templates").insert(
+        [{"content": f"Template {i}: {{{{ summary }}}}"} for i in range(templates)]
+    ).execute()
+    template_ids = [template["id"] for template in templates_result.data]
+    appointment = db.table("appointments").insert(
+        {"template_ids": template_ids, "status": "in_progress"}
+    ).execute().data[0]
+    for i in range(recordings):
+        db.table("recordings").insert(
+            {"appointment_id": appointment["id"], "status": "uploaded", "storage_path": f"r{i}.wav"}
+        ).execute()
+    return appointment["id"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recordings", type=int, default=4)
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--transcribe-seconds", type=float, default=0.5)
+    parser.add_argument("--llm-seconds", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    db = FakeSupabase()
+    appointment_id = seed(db, args.recordings, args.templates)
+
+    async def fake_transcribe(transcript_id, recording_id):
+        await asyncio.sleep(args.transcribe_seconds)
+        db.table("transcripts").update(
+            {"status": "completed", "content": "transcript"}
+        ).eq("id", transcript_id).execute()
+
+    BenchProvider.seconds = args.llm_seconds
+    LLMProviderFactory.register("bench", BenchProvider)
+
+    celery_app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        task_always_eager=False,
+        broker_transport_options={"polling_interval": 0.01},
+        # The memory backend polls chord completion (Redis counts natively)
+        result_chord_retry_interval=0.05,
+    )
+    logging.disable(logging.INFO)
+
+    with (
+        mock.patch("app.db.client.get_supabase_client", return_value=db),
+        mock.patch("app.services.transcription.process_transcription_task", fake_transcribe),
+        mock.patch.object(note_generator, "get_supabase_client", return_value=db),
+        mock.patch.object(note_generator, "_analysis_store", AnalysisStore(db)),
+        mock.patch.object(note_generator.settings, "default_llm_provider", "bench"),
+        start_worker(
+            celery_app,
+            pool="threads",
+            concurrency=args.concurrency,
+            perform_ping_check=False,
+            shutdown_timeout=30,
+        ),
+    ):
+        start = time.perf_counter()
+        tasks.process_appointment_task.delay(appointment_id, "bench-user")
+
+        while True:
+            appointment = (
+                db.table("appointments").select("*").eq("id", appointment_id).single().execute()
+            )
+            if appointment.data["status"] == "completed":
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+    notes = db.tables.get("clinical_notes", [])
+    # transcribe -> analyze -> generate
+    critical_path = args.transcribe_seconds + 2 * args.llm_seconds
+    print(
+        f"recordings={args.recordings} templates={args.templates} notes={len(notes)} "
+        f"end_to_end={elapsed:.2f}s critical_path={critical_path:.2f}s "
+        f"(previous implementation: >= 60s retry wait)"
+    )
+    print(
+        f"llm_calls={len(LLM_CALLS)} "
+        f"(analyze={LLM_CALLS.count('analyze')} generate={LLM_CALLS.count('generate')} "
+        f"complete={LLM_CALLS.count('complete')})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark /health latency while transcriptions run on the same event loop.
+
+Compares a Whisper client that blocks the loop (the old synchronous
+`OpenAI` client) against the async client used by TranscriptionService.
+
+Usage:
+    python -m benchmarks.bench_event_loop [--transcriptions 8] [--whisper-seconds 0.5]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+from app.main import app
+from app.services.transcription import TranscriptionService
+
+
+def _response(file):
+    return SimpleNamespace(text=Path(file).stem, segments=[], language="en")
+
+
+class BlockingWhisper:
+    """Simulates the synchronous OpenAI client called from async code."""
+
+    def __init__(self, seconds: float):
+        async def create(model, file, language, **kwargs):
+            time.sleep(seconds)
+            return _response(file)
+
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=create))
+
+
+class AsyncWhisper:
+    """Simulates the AsyncOpenAI client."""
+
+    def __init__(self, seconds: float):
+        async def create(model, file, language, **kwargs):
+            await asyncio.sleep(seconds)
+            return _response(file)
+
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=create))
+
+
+async def measure(client, audio_path: Path, transcriptions: int) -> list[float]:
+    """
+    Return /health latencies (ms) sampled every 10ms while transcriptions run.
+
+    Latency is measured from when the request was due, so time spent waiting
+    for a blocked event loop is included.
+    """
+    service = TranscriptionService(client=client)
+    latencies = []
+    interval = 0.01
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as http:
+        jobs = asyncio.gather(
+            *(service.transcribe_audio(audio_path) for _ in range(transcriptions))
+        )
+        due = time.perf_counter()
+        while not jobs.done():
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await http.get("/health")
+            latencies.append((time.perf_counter() - due) * 1000)
+            due += interval
+        await jobs
+
+    return latencies
+
+
+def summarize(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[round(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<12} samples={len(latencies):<4} "
+        f"p50={statistics.median(latencies):8.1f}ms "
+        f"p95={p95:8.1f}ms max={latencies[-1]:8.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transcriptions", type=int, default=8)
+    parser.add_argument("--whisper-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = Path(tmp) / "clip.wav"
+        with wave.open(str(audio_path), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(b"\x00\x00" * 8000)
+
+        for name, client in (
+            ("blocking", BlockingWhisper(args.whisper_seconds)),
+            ("async", AsyncWhisper(args.whisper_seconds)),
+        ):
+            latencies = asyncio.run(measure(client, audio_path, args.transcriptions))
+            summarize(name, latencies)
+
+
+if __name__ == "__main__":
+    main()
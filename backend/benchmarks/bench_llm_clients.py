@@ -0,0 +1,181 @@
+"""
+Benchmark per-note LLM latency with fresh versus shared provider clients.
+
+A local HTTPS server stands in for the LLM API. It answers Ollama-style
+/api/generate requests and adds a simulated network round-trip to each
+request and to each new connection (TCP + TLS handshake), so the cost of
+cold connection pools shows up as it would against a remote API.
+
+"fresh" reproduces the previous behaviour: every note builds a new provider
+on a new event loop. "shared" runs notes on one loop through
+LLMProviderFactory, reusing the provider and its keep-alive connections.
+
+Usage:
+    python -m benchmarks.bench_llm_clients [--notes 20] [--rtt-ms 20]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.services.llm.base import LLMProviderFactory
+from app.services.llm.ollama_provider import OllamaProvider
+
+
+def write_self_signed_cert(directory: Path) -> tuple[Path, Path]:
+    """Create a localhost certificate and key for the stub server."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "cert.pem", directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_path, key_path
+
+
+def start_server(cert: Path, key: Path, rtt: float) -> tuple[ThreadingHTTPServer, dict]:
+    """Start the stub LLM server; returns the server and its connection counter."""
+    stats = {"connections": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            stats["connections"] += 1
+            # TCP handshake + TLS 1.3 handshake
+            time.sleep(2 * rtt)
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(rtt)
+            body = json.dumps({"response": "note", "done": True}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+class BenchOllama(OllamaProvider):
+    """Ollama provider pointed at the stub server."""
+
+    base_url = ""
+
+    def __init__(self):
+        super().__init__(base_url=self.base_url)
+
+
+async def generate(provider) -> float:
+    """Generate one note and return its latency in ms."""
+    start = time.perf_counter()
+    await provider.generate_note("Patient reports a toothache.", "SOAP")
+    return (time.perf_counter() - start) * 1000
+
+
+def run_fresh(notes: int) -> list[float]:
+    """One new loop and provider per note, as run_async did before."""
+    latencies = []
+    for _ in range(notes):
+        async def one():
+            provider = BenchOllama()
+            try:
+                return await generate(provider)
+            finally:
+                await provider.aclose()
+
+        latencies.append(asyncio.run(one()))
+    return latencies
+
+
+def run_shared(notes: int) -> list[float]:
+    """All notes on one loop through the shared provider registry."""
+    async def all_notes():
+        try:
+            return [
+                await generate(LLMProviderFactory.get_provider("bench-ollama"))
+                for _ in range(notes)
+            ]
+        finally:
+            await LLMProviderFactory.aclose()
+
+    return asyncio.run(all_notes())
+
+
+def report(label: str, latencies: list[float], connections: int) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[round(0.95 * (len(ordered) - 1))]
+    print(
+        f"{label:>6}: mean={statistics.mean(latencies):6.1f}ms p95={p95:6.1f}ms "
+        f"connections={connections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = write_self_signed_cert(Path(tmp))
+        server, stats = start_server(cert, key, args.rtt_ms / 1000)
+        BenchOllama.base_url = f"https://localhost:{server.server_address[1]}"
+        # httpx trusts SSL_CERT_FILE, so the stub's self-signed cert verifies
+        os.environ["SSL_CERT_FILE"] = str(cert)
+        LLMProviderFactory.register("bench-ollama", BenchOllama)
+
+        try:
+            print(f"notes={args.notes} rtt={args.rtt_ms:.0f}ms")
+            for label, runner in (("fresh", run_fresh), ("shared", run_shared)):
+                before = stats["connections"]
+                latencies = runner(args.notes)
+                report(label, latencies, stats["connections"] - before)
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark note generation in "llm" and "structured" modes.
+
+"llm" analyzes the transcript, then has the model write every note in a
+batched completion. "structured" extracts the templates' variables in the
+analysis call and renders the notes locally, so only variables marked
+narrative cost a completion. The provider sleeps instead of calling an
+API: analysis takes --analysis-seconds and each note or narrative section
+in a completion adds --output-seconds, standing in for decode time.
+
+Usage:
+    python -m benchmarks.bench_structured_fill [--templates 3] [--narrative 1]
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+from app.models.notes import AnalysisResult
+from app.models.templates import TemplateVariable
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.note_generator import NoteGeneratorService
+
+TEMPLATE = """Date: {{ date }}
+Tooth: {{ tooth }}
+Anesthetic: {{ anesthetic }}
+Chief complaint: {{ chief_complaint }}
+{{ procedures | bullet_list }}
+"""
+
+
+class BenchProvider(BaseLLMProvider):
+    """LLM provider that sleeps instead of calling an API."""
+
+    name = "bench"
+    model = "bench-1"
+    analysis_seconds = 0.5
+    output_seconds = 2.0
+    calls = 0
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        BenchProvider.calls += 1
+        await asyncio.sleep(self.analysis_seconds)
+        return AnalysisResult(
+            chief_complaint="Toothache",
+            procedures=["Composite filling #19"],
+            variables={name: "value" for name in fields or {}},
+        )
+
+    async def generate_note(self, transcript, template, analysis=None):
+        BenchProvider.calls += 1
+        await asyncio.sleep(self.output_seconds)
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        BenchProvider.calls += 1
+        keys = re.findall(r"^=== NOTE (\S+) ===$", prompt, re.MULTILINE)
+        await asyncio.sleep(self.output_seconds * len(keys))
+        return "\n".join(f"=== NOTE {k} ===\ntext\n=== END NOTE {k} ===" for k in keys)
+
+
+def build_templates(count: int, narrative: int) -> tuple[dict, dict]:
+    sections = "".join(f"{{{{ narrative_{i} }}}}\n" for i in range(narrative))
+    content = TEMPLATE + sections
+    templates = {f"t{i}": content for i in range(count)}
+    variables = {
+        key: [
+            TemplateVariable(name=f"narrative_{i}", description="Narrative", narrative=True)
+            for i in range(narrative)
+        ]
+        for key in templates
+    }
+    return templates, variables
+
+
+async def run(mode: str, templates: dict, variables: dict) -> None:
+    service = NoteGeneratorService("bench", analysis_store=AnalysisStore(None), mode=mode)
+    BenchProvider.calls = 0
+    start = time.perf_counter()
+    await service.generate_many("Transcript", templates, variables)
+    elapsed = time.perf_counter() - start
+    print(f"{mode:>10}: {elapsed:6.2f}s llm_calls={BenchProvider.calls}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--narrative", type=int, default=1)
+    parser.add_argument("--analysis-seconds", type=float, default=0.5)
+    parser.add_argument("--output-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    BenchProvider.analysis_seconds = args.analysis_seconds
+    BenchProvider.output_seconds = args.output_seconds
+    LLMProviderFactory.register("bench", BenchProvider)
+
+    templates, variables = build_templates(args.templates, args.narrative)
+    print(f"templates={args.templates} narrative variables per template={args.narrative}")
+    for mode in ("llm", "structured"):
+        asyncio.run(run(mode, templates, variables))
+
+
+if __name__ == "__main__":
+    main()
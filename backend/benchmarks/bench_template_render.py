@@ -0,0 +1,57 @@
+"""
+Benchmark note template rendering with and without the compiled-template cache.
+
+"uncached" reproduces the previous behaviour: every render calls
+env.from_string, re-lexing, parsing and compiling the template. "cached"
+renders through TemplateEngine, which compiles each template once.
+
+Usage:
+    python -m benchmarks.bench_template_render [--renders 5000]
+"""
+
+import argparse
+import time
+
+from app.services.template_engine import DEFAULT_TEMPLATES, TemplateEngine
+
+VARIABLES = {
+    "date": "2026-01-01",
+    "provider": "Dr. Smith",
+    "patient_ref": "12345",
+    "chief_complaint": "Tooth pain",
+    "subjective_notes": "Patient reports pain when chewing.",
+    "findings": ["Caries on #19", "Gingival inflammation"],
+    "assessment": "Dental caries",
+    "procedures": ["Examination", "Composite filling #19"],
+    "recommendations": ["Floss daily", "Return in 6 months"],
+    "follow_up": "2 weeks",
+    "summary": "Routine exam with one filling.",
+}
+
+TEMPLATES = [template["content"] for template in DEFAULT_TEMPLATES.values()]
+
+
+def measure(label: str, renders: int, render) -> None:
+    start = time.perf_counter()
+    for i in range(renders):
+        render(TEMPLATES[i % len(TEMPLATES)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: {renders / elapsed:10.0f} renders/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--renders", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = TemplateEngine()
+    measure(
+        "uncached",
+        args.renders,
+        lambda content: engine.env.from_string(content).render(**VARIABLES),
+    )
+    measure("cached", args.renders, lambda content: engine.render(content, VARIABLES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark template variable extraction on large custom templates.
+
+"regex" is the previous implementation: three regular expressions that
+miss attribute access, filter arguments, elif, nested loops and set
+blocks. "ast" parses the template and runs Jinja's undeclared-variable
+analysis on every call. "ast memoized" is TemplateEngine.extract_variables,
+which reuses the result per template hash, as reads of one template do.
+
+Usage:
+    python -m benchmarks.bench_template_variables [--sections 200] [--iterations 200]
+"""
+
+import argparse
+import re
+import time
+
+from app.services.template_engine import TemplateEngine
+
+SECTION = """
+SECTION {i}
+{{% set heading_{i} = section_{i}_title | upper %}}{{{{ heading_{i} }}}}
+{{% if section_{i}_urgent %}}Urgent{{% elif section_{i}_routine %}}Routine{{% endif %}}
+{{% for visit in section_{i}_visits %}}
+  {{% for tooth in visit.teeth %}}{{{{ tooth.number }}}} {{{{ charting_system }}}}{{% endfor %}}
+{{% endfor %}}
+{{{{ section_{i}_findings | default(fallback_findings) | bullet_list }}}}
+Provider: {{{{ provider.name }}}}
+"""
+
+
+def large_template(sections: int) -> str:
+    return "".join(SECTION.format(i=i) for i in range(sections))
+
+
+def regex_variables(template_content: str) -> list[str]:
+    """The regex-based extraction this benchmark compares against."""
+    simple_vars = re.findall(r"\{\{\s*(\w+)", template_content)
+    for_vars = re.findall(r"\{%\s*for\s+\w+\s+in\s+(\w+)", template_content)
+    if_vars = re.findall(r"\{%\s*if\s+(\w+)", template_content)
+    builtins = {"true", "false", "none", "True", "False", "None"}
+    return list(set(simple_vars + for_vars + if_vars) - builtins)
+
+
+def measure(label: str, iterations: int, size_kb: float, extract) -> list[str]:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        names = extract()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:>14}: {iterations / elapsed:9.1f} templates/s "
+        f"{iterations * size_kb / elapsed:9.0f} KB/s variables={len(names)}"
+    )
+    return names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    template = large_template(args.sections)
+    size_kb = len(template.encode()) / 1024
+    print(f"template: {args.sections} sections, {size_kb:.0f} KB")
+
+    engine = TemplateEngine()
+
+    def parse_every_time():
+        engine.variables.clear()
+        return engine.extract_variables(template)
+
+    measure("regex", args.iterations, size_kb, lambda: regex_variables(template))
+    measure("ast", args.iterations, size_kb, parse_every_time)
+    measure(
+        "ast memoized", args.iterations, size_kb, lambda: engine.extract_variables(template)
+    )
+
+
+if __name__ == "__main__":
+    main()
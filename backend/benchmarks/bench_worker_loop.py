@@ -0,0 +1,94 @@
+"""
+Benchmark sequential note tasks with a per-task versus a persistent event loop.
+
+Runs N generate_note_task calls one after another against the local HTTPS
+LLM stub from bench_llm_clients. "per-task" recreates the event loop for
+every task, as run_async used to, so each task opens a new connection;
+"worker" runs every task on the process-wide WorkerLoop and reuses them.
+
+Usage:
+    python -m benchmarks.bench_worker_loop [--notes 30] [--rtt-ms 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import LLMProviderFactory
+from app.workers import tasks
+from app.workers.loop import worker_loop
+from benchmarks.bench_llm_clients import BenchOllama, start_server, write_self_signed_cert
+from tests.fakes import FakeSupabase
+
+
+def run_async_per_task(coro):
+    """The previous run_async: a fresh loop for every task."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(LLMProviderFactory.aclose())
+        loop.close()
+
+
+def run_notes(db: FakeSupabase, notes: int, label: str) -> float:
+    """Run generate_note_task sequentially; returns elapsed seconds."""
+    note_ids = [
+        db.table("clinical_notes").insert({"status": "draft"}).execute().data[0]["id"]
+        for _ in range(notes)
+    ]
+    start = time.perf_counter()
+    for i, note_id in enumerate(note_ids):
+        # Distinct transcripts so every task makes an analysis and a generation call
+        tasks.generate_note_task.apply(args=(note_id, f"{label} transcript {i}", "SOAP")).get()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=30)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = write_self_signed_cert(Path(tmp))
+        server, stats = start_server(cert, key, args.rtt_ms / 1000)
+        BenchOllama.base_url = f"https://localhost:{server.server_address[1]}"
+        os.environ["SSL_CERT_FILE"] = str(cert)
+        LLMProviderFactory.register("bench-ollama", BenchOllama)
+
+        db = FakeSupabase()
+        print(f"notes={args.notes} rtt={args.rtt_ms:.0f}ms")
+        try:
+            with (
+                mock.patch.object(note_generator, "get_supabase_client", return_value=db),
+                mock.patch.object(note_generator, "_analysis_store", AnalysisStore()),
+                mock.patch.object(note_generator.settings, "default_llm_provider", "bench-ollama"),
+            ):
+                for label, runner in (("per-task", run_async_per_task), ("worker", None)):
+                    before = stats["connections"]
+                    if runner:
+                        with mock.patch.object(tasks, "run_async", runner):
+                            elapsed = run_notes(db, args.notes, label)
+                    else:
+                        elapsed = run_notes(db, args.notes, label)
+                    print(
+                        f"{label:>8}: {args.notes / elapsed:5.1f} notes/s "
+                        f"({elapsed * 1000 / args.notes:5.1f}ms per note) "
+                        f"connections={stats['connections'] - before}"
+                    )
+        finally:
+            worker_loop.stop()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark note throughput for the prefork and async worker modes.
+
+Runs a real worker against Celery's in-memory broker with an LLM provider
+that sleeps instead of calling an API. "prefork" is modelled as 8 task
+slots (one per process on an 8-process box); "async" uses the threads pool
+with WORKER_ASYNC_CONCURRENCY slots feeding the shared worker loop.
+
+Usage:
+    python -m benchmarks.bench_worker_modes [--notes 256] [--llm-seconds 0.3]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from unittest import mock
+
+from celery.contrib.testing.worker import start_worker
+
+from app.core.config import settings
+from app.models.notes import AnalysisResult
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.workers import tasks
+from app.workers.celery_app import celery_app
+from app.workers.loop import worker_loop
+from tests.fakes import FakeSupabase
+
+
+class SleepProvider(BaseLLMProvider):
+    """LLM provider that sleeps instead of calling an API, tracking concurrency."""
+
+    name = "bench-sleep"
+    model = "bench-1"
+    seconds = 0.3
+    in_flight = 0
+    peak = 0
+
+    async def _call(self):
+        SleepProvider.in_flight += 1
+        SleepProvider.peak = max(SleepProvider.peak, SleepProvider.in_flight)
+        await asyncio.sleep(self.seconds)
+        SleepProvider.in_flight -= 1
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        await self._call()
+        return AnalysisResult(summary="summary")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        await self._call()
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        await self._call()
+        return "completion"
+
+
+def run_mode(db: FakeSupabase, label: str, slots: int, notes: int) -> tuple[float, int]:
+    """Queue `notes` note tasks on a worker with `slots` slots; returns (seconds, peak)."""
+    note_ids = [
+        db.table("clinical_notes").insert({"status": "draft"}).execute().data[0]["id"]
+        for _ in range(notes)
+    ]
+    SleepProvider.peak = 0
+    worker_loop.max_in_flight = slots
+    worker_loop.stop()
+
+    with start_worker(
+        celery_app,
+        pool="threads",
+        concurrency=slots,
+        perform_ping_check=False,
+        shutdown_timeout=60,
+    ):
+        start = time.perf_counter()
+        results = [
+            tasks.generate_note_task.delay(note_id, f"{label} transcript {i}", "SOAP")
+            for i, note_id in enumerate(note_ids)
+        ]
+        for result in results:
+            result.get(timeout=300)
+        elapsed = time.perf_counter() - start
+
+    return elapsed, SleepProvider.peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=256)
+    parser.add_argument("--llm-seconds", type=float, default=0.3)
+    parser.add_argument("--processes", type=int, default=8)
+    args = parser.parse_args()
+
+    SleepProvider.seconds = args.llm_seconds
+    LLMProviderFactory.register("bench-sleep", SleepProvider)
+    celery_app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        broker_transport_options={"polling_interval": 0.01},
+        # The in-memory transport only re-polls about once a second after the
+        # prefetch window fills (Redis wakes immediately), so widen the window
+        worker_prefetch_multiplier=4,
+    )
+    logging.disable(logging.ERROR)
+
+    db = FakeSupabase()
+    modes = (("prefork", args.processes), ("async", settings.worker_async_concurrency))
+    print(f"notes={args.notes} llm_seconds={args.llm_seconds}")
+    with (
+        mock.patch.object(note_generator, "get_supabase_client", return_value=db),
+        mock.patch.object(note_generator, "_analysis_store", AnalysisStore()),
+        mock.patch.object(note_generator.settings, "default_llm_provider", "bench-sleep"),
+    ):
+        try:
+            for label, slots in modes:
+                elapsed, peak = run_mode(db, label, slots, args.notes)
+                print(
+                    f"{label:>8}: slots={slots:3d} {args.notes / elapsed:6.1f} notes/s "
+                    f"peak_llm_in_flight={peak}"
+                )
+        finally:
+            worker_loop.stop()
+
+
+if __name__ == "__main__":
+    main()
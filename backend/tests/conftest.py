@@ -4,6 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
+from tests.fakes import FakeSupabase
 
 
 @pytest.fixture
@@ -12,9 +13,14 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture
+def fake_db():
+    """In-memory database client."""
+    return FakeSupabase()
+
+
 @pytest.fixture
 def auth_headers():
     """Create mock authentication headers for testing."""
     # In real tests, you'd generate a valid test token
     return {"Authorization": "Bearer test-token"}
-
@@ -0,0 +1,140 @@
+"""
+In-memory stand-ins shared by the tests and benchmarks.
+
+Kept out of conftest.py so benchmarks can use them without importing pytest
+fixtures.
+"""
+
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+
+class FakeQuery:
+    """Minimal stand-in for the Supabase/PostgREST query builder."""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.filters = []
+        self.is_single = False
+        self.bounds = None
+
+    def select(self, *columns):
+        self.operation = "select"
+        return self
+
+    def insert(self, data):
+        self.operation = "insert"
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict: str = "id"):
+        self.operation = "upsert"
+        self.payload = data if isinstance(data, list) else [data]
+        self.conflict_column = on_conflict
+        return self
+
+    def update(self, data):
+        self.operation = "update"
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def is_(self, column, value):
+        expected = None if value == "null" else value
+        self.filters.append(lambda row: row.get(column) is expected)
+        return self
+
+    def single(self):
+        self.is_single = True
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end + 1)
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def _matches(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        return [row for row in rows if all(f(row) for f in self.filters)]
+
+    def execute(self):
+        self.db.executed += 1
+        rows = self.db.tables.setdefault(self.table, [])
+
+        if self.operation == "insert":
+            data = []
+            for item in self.payload:
+                row = {
+                    "id": str(uuid4()),
+                    "created_at": datetime.now(UTC).isoformat(),
+                    **item,
+                }
+                rows.append(row)
+                data.append(dict(row))
+        elif self.operation == "upsert":
+            data = []
+            for item in self.payload:
+                key = item.get(self.conflict_column)
+                row = next((r for r in rows if r.get(self.conflict_column) == key), None)
+                if row is None:
+                    row = {"id": str(uuid4()), **item}
+                    rows.append(row)
+                else:
+                    row.update(item)
+                data.append(dict(row))
+        elif self.operation == "update":
+            data = []
+            for row in self._matches():
+                row.update(self.payload)
+                data.append(dict(row))
+        elif self.operation == "delete":
+            data = self._matches()
+            self.db.tables[self.table] = [r for r in rows if r not in data]
+        else:
+            data = [dict(row) for row in self._matches()]
+            if self.bounds:
+                data = data[slice(*self.bounds)]
+
+        if self.is_single:
+            data = data[0] if data else None
+        return SimpleNamespace(data=data)
+
+
+class FakeSupabase:
+    """In-memory Supabase client that counts round-trips."""
+
+    def __init__(self, tables: dict[str, list[dict]] | None = None):
+        self.tables = tables or {}
+        self.executed = 0
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
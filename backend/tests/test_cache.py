@@ -0,0 +1,38 @@
+"""Tests for caching utilities."""
+
+import pytest
+
+from app.core.cache import LRUCache
+
+
+class TestLRUCache:
+    """Tests for the bounded LRU cache."""
+
+    def test_get_and_set(self):
+        """Test values round-trip and hits/misses are counted."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry is evicted when full."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_invalid_size(self):
+        """Test a cache must hold at least one entry."""
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
@@ -0,0 +1,60 @@
+"""Tests for job checkpoints and retry backoff."""
+
+import pytest
+from redis import RedisError
+
+from app.core.backoff import backoff_delay
+from app.services.checkpoints import CheckpointStore, JobCheckpoint
+
+
+class BrokenRedis:
+    """Redis client whose every call fails."""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise RedisError("connection refused")
+
+        return fail
+
+
+class TestCheckpointStore:
+    """Tests for stage markers."""
+
+    def test_set_get_clear(self):
+        """Test stages round-trip as JSON and are forgotten on clear."""
+        checkpoint = JobCheckpoint(CheckpointStore(), "transcript:1")
+        checkpoint.set("audio", {"path": "/tmp/a.wav", "size": 10})
+
+        assert checkpoint.get("audio") == {"path": "/tmp/a.wav", "size": 10}
+        assert checkpoint.get("chunk:600:0") is None
+        checkpoint.clear()
+        assert checkpoint.get("audio") is None
+
+    def test_jobs_are_isolated(self):
+        """Test one job's stages are not visible to another."""
+        store = CheckpointStore()
+        store.set("transcript:1", "audio", 1)
+
+        assert store.get("transcript:2", "audio") is None
+
+    def test_redis_failure_falls_back_to_memory(self):
+        """Test checkpoints keep working in memory when Redis is down."""
+        store = CheckpointStore(redis=BrokenRedis())
+        store.set("transcript:1", "audio", {"size": 1})
+
+        assert store.get("transcript:1", "audio") == {"size": 1}
+
+
+class TestBackoff:
+    """Tests for jittered exponential backoff."""
+
+    @pytest.mark.parametrize("attempt", range(6))
+    def test_delay_bounds(self, attempt):
+        """Test each delay lies in the upper half of the capped exponential."""
+        delay = min(100, 5 * 2 ** attempt)
+        for _ in range(50):
+            assert delay / 2 <= backoff_delay(attempt, base=5, cap=100) <= delay
+
+    def test_delays_are_spread(self):
+        """Test simultaneous retries do not all pick the same delay."""
+        assert len({backoff_delay(3, base=10, cap=600) for _ in range(20)}) > 1
@@ -0,0 +1,287 @@
+"""Tests for dispatching API jobs to a worker backend."""
+
+import asyncio
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+
+from app.api.deps import get_current_active_user, get_db
+from app.main import app
+from app.models.notes import AnalysisResult
+from app.models.users import User, UserRole
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.workers.celery_app import celery_app
+from app.workers.dispatch import (
+    GENERATE_NOTE,
+    BackendUnavailableError,
+    CeleryBackend,
+    InProcessBackend,
+    JobBackend,
+    QueueFullError,
+    get_job_backend,
+    process_appointment,
+)
+
+
+class RecordingBackend(JobBackend):
+    """Backend that records submitted jobs instead of running them."""
+
+    name = "recording"
+
+    def __init__(self, max_depth=0, waiting=0, error=None):
+        super().__init__(max_depth)
+        self.waiting = waiting
+        self.error = error
+        self.jobs: list[tuple[str, dict]] = []
+        self.probes = 0
+
+    def depth(self):
+        self.probes += 1
+        return self.waiting
+
+    def _submit(self, job, kwargs):
+        if self.error:
+            raise self.error
+        self.jobs.append((job, kwargs))
+        return f"job-{len(self.jobs)}"
+
+
+class TestInProcessBackend:
+    """Tests for running jobs on the web process's loop."""
+
+    async def test_concurrency_limited_and_jobs_run_in_order(self, monkeypatch):
+        """Test at most `concurrency` jobs run while the rest wait their turn."""
+        started, active, peak = [], [0], [0]
+
+        async def job(n):
+            started.append(n)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+
+        monkeypatch.setattr(InProcessBackend, "_jobs", staticmethod(lambda: {"job": job}))
+        backend = InProcessBackend(concurrency=2)
+
+        for n in range(5):
+            backend.submit("job", n=n)
+        assert backend.depth() == 3
+
+        await backend.join()
+        assert started == [0, 1, 2, 3, 4]
+        assert peak[0] == 2
+        assert backend.depth() == 0
+
+    async def test_refuses_jobs_beyond_max_depth(self, monkeypatch):
+        """Test a full queue raises instead of growing."""
+        monkeypatch.setattr(
+            InProcessBackend, "_jobs", staticmethod(lambda: {"job": asyncio.sleep})
+        )
+        backend = InProcessBackend(max_depth=1, concurrency=1)
+
+        backend.submit("job", delay=0)
+        backend.submit("job", delay=0)
+        with pytest.raises(QueueFullError):
+            backend.submit("job", delay=0)
+
+        await backend.join()
+
+    async def test_failed_job_does_not_stop_the_queue(self, monkeypatch):
+        """Test a failing job is logged and the next one still runs."""
+        ran = []
+
+        async def job(fail):
+            if fail:
+                raise RuntimeError("provider unavailable")
+            ran.append(fail)
+
+        monkeypatch.setattr(InProcessBackend, "_jobs", staticmethod(lambda: {"job": job}))
+        backend = InProcessBackend(concurrency=1)
+
+        backend.submit("job", fail=True)
+        backend.submit("job", fail=False)
+        await backend.join()
+
+        assert ran == [False]
+
+
+class NoteProvider(BaseLLMProvider):
+    """Provider that fills every template with a fixed note."""
+
+    name = "fake-dispatch"
+    model = "fake-1"
+    failing = False
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        return AnalysisResult(chief_complaint="Toothache")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        if NoteProvider.failing:
+            raise RuntimeError("provider unavailable")
+        return f"note for {template}"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        return ""
+
+
+@pytest.fixture
+def appointment_env(fake_db, monkeypatch):
+    """Fake transcription and LLM provider for running appointments in-process."""
+    from app.services import transcription
+
+    async def transcribe(transcript_id, recording_id):
+        fake_db.table("transcripts").update(
+            {"status": "completed", "content": f"transcript of {recording_id}"}
+        ).eq("id", transcript_id).execute()
+
+    LLMProviderFactory.register("fake-dispatch", NoteProvider)
+    monkeypatch.setattr("app.db.client.get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(transcription, "process_transcription_task", transcribe)
+    monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+    monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-dispatch")
+    monkeypatch.setattr(note_generator.settings, "llm_rate_limit_enabled", False)
+    monkeypatch.setattr(note_generator.settings, "llm_batch_generation", False)
+    monkeypatch.setattr(NoteProvider, "failing", False)
+    template_id = fake_db.table("templates").insert({"content": "SOAP"}).execute().data[0]["id"]
+    appointment_id = fake_db.table("appointments").insert(
+        {"template_ids": [template_id], "status": "in_progress"}
+    ).execute().data[0]["id"]
+    for _ in range(2):
+        fake_db.table("recordings").insert(
+            {"appointment_id": appointment_id, "status": "uploaded"}
+        ).execute()
+    return appointment_id
+
+
+async def test_inprocess_appointment_processed_end_to_end(fake_db, appointment_env):
+    """Test the in-process appointment job transcribes, generates and completes."""
+    await process_appointment(appointment_env, "user-1")
+
+    notes = fake_db.tables["clinical_notes"]
+    assert [note["generated_content"] for note in notes] == ["note for SOAP"] * 2
+    assert fake_db.tables["appointments"][0]["status"] == "completed"
+
+
+async def test_retried_appointment_regenerates_errored_notes(fake_db, appointment_env):
+    """Test notes saved as errored drafts are generated when the appointment is retried."""
+    del fake_db.tables["recordings"][1:]
+    NoteProvider.failing = True
+    with pytest.raises(RuntimeError):
+        await process_appointment(appointment_env, "user-1")
+    notes = fake_db.tables["clinical_notes"]
+    assert len(notes) == 1
+    assert notes[0]["generated_content"].startswith("Error generating note")
+
+    NoteProvider.failing = False
+    await process_appointment(appointment_env, "user-1")
+
+    assert [note["generated_content"] for note in notes] == ["note for SOAP"]
+    assert notes[0]["status"] == "generated"
+
+
+def test_celery_depth_counts_waiting_messages(monkeypatch):
+    """Test the Celery backend reads the default queue's length from the broker."""
+    monkeypatch.setattr(celery_app.conf, "broker_url", "memory://")
+    backend = CeleryBackend(max_depth=2)
+
+    with celery_app.connection_for_write() as connection:
+        queue = connection.SimpleQueue(celery_app.conf.task_default_queue)
+        try:
+            queue.put({"task": "waiting"})
+            assert backend.depth() == 1
+            backend.ensure_capacity()
+
+            queue.put({"task": "waiting"})
+            with pytest.raises(QueueFullError):
+                backend.ensure_capacity()
+        finally:
+            queue.clear()
+            queue.close()
+
+
+def test_backend_selected_by_settings(monkeypatch):
+    """Test JOB_BACKEND picks the in-process backend for development."""
+    from app.workers import dispatch
+
+    monkeypatch.setattr(dispatch, "_job_backend", None)
+    monkeypatch.setattr(dispatch.settings, "job_backend", "inprocess")
+
+    assert isinstance(get_job_backend(), InProcessBackend)
+
+
+@pytest.fixture
+def jobs_client(client, fake_db):
+    """Test client whose jobs go to a RecordingBackend."""
+    user = User(
+        id=uuid4(),
+        email="dentist@example.com",
+        full_name="Test Dentist",
+        role=UserRole.DENTIST,
+        created_at=datetime.now(UTC),
+    )
+    client.backend = RecordingBackend()
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+    app.dependency_overrides[get_job_backend] = lambda: client.backend
+
+    transcript = fake_db.table("transcripts").insert(
+        {"recording_id": str(uuid4()), "content": "Patient has a toothache.", "status": "completed"}
+    ).execute().data[0]
+    template = fake_db.table("templates").insert({"content": "SOAP"}).execute().data[0]
+    client.note_request = {"transcript_id": transcript["id"], "template_id": template["id"]}
+    client.recording_id = fake_db.table("recordings").insert(
+        {"status": "uploaded"}
+    ).execute().data[0]["id"]
+    yield client
+    app.dependency_overrides.clear()
+
+
+class TestDispatchFromAPI:
+    """Tests for routes handing work to the job backend."""
+
+    def test_note_generation_dispatched(self, jobs_client, fake_db):
+        """Test the note job is queued rather than run in the web process."""
+        response = jobs_client.post("/api/v1/notes/generate", json=jobs_client.note_request)
+
+        assert response.status_code == 202
+        ((job, kwargs),) = jobs_client.backend.jobs
+        assert job == GENERATE_NOTE
+        assert kwargs["note_id"] == response.json()["id"]
+        assert kwargs["transcript_content"] == "Patient has a toothache."
+        assert fake_db.tables["clinical_notes"][0]["status"] == "draft"
+
+    def test_queue_depth_probed_once(self, jobs_client):
+        """Test the route's capacity check is not repeated on submit."""
+        jobs_client.backend = RecordingBackend(max_depth=10)
+
+        response = jobs_client.post("/api/v1/notes/generate", json=jobs_client.note_request)
+
+        assert response.status_code == 202
+        assert jobs_client.backend.probes == 1
+
+    def test_full_queue_returns_429(self, jobs_client, fake_db):
+        """Test a saturated queue refuses the request before creating the note."""
+        jobs_client.backend = RecordingBackend(max_depth=10, waiting=10)
+
+        response = jobs_client.post("/api/v1/notes/generate", json=jobs_client.note_request)
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "30"
+        assert not fake_db.tables.get("clinical_notes")
+
+    def test_unavailable_backend_returns_503(self, jobs_client, fake_db):
+        """Test a failed dispatch removes the pending transcript so a retry requeues it."""
+        jobs_client.backend = RecordingBackend(
+            error=BackendUnavailableError("Job broker unavailable")
+        )
+
+        response = jobs_client.post(f"/api/v1/transcripts/generate/{jobs_client.recording_id}")
+
+        assert response.status_code == 503
+        assert all(
+            t["recording_id"] != jobs_client.recording_id for t in fake_db.tables["transcripts"]
+        )
@@ -18,3 +18,12 @@ def test_root_endpoint(client):
     assert "message" in data
     assert data["message"] == "NoteSmith API"
 
+
+def test_metrics_endpoint(client):
+    """Test metrics endpoint returns counters."""
+    from app.core.metrics import metrics
+
+    metrics.increment("transcript_cache_hits")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["transcript_cache_hits"] >= 1
@@ -0,0 +1,210 @@
+"""Tests for map-reduce analysis of long transcripts."""
+
+import asyncio
+
+import pytest
+
+from app.models.notes import AnalysisResult, ClinicalEntity
+from app.models.transcripts import TranscriptSegment
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.llm.map_reduce import analyze_in_windows, merge_analyses, split_transcript
+from app.services.llm.structured import AnalysisParseError, parse_analysis
+from app.services.note_generator import NoteGeneratorService
+
+
+def segment(text: str, speaker: str | None = None) -> TranscriptSegment:
+    return TranscriptSegment(start_time=0.0, end_time=1.0, text=text, speaker=speaker)
+
+
+class WindowProvider(BaseLLMProvider):
+    """Provider that reports each window's first word as a finding."""
+
+    name = "windows"
+    model = "windows-1"
+
+    def __init__(self, delay: float = 0.0, malformed: set[int] = frozenset()):
+        self.delay = delay
+        self.malformed = malformed
+        self.contexts: list[dict | None] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        self.contexts.append(context)
+        part = len(self.contexts)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if part in self.malformed:
+            return parse_analysis("not json", self.name)
+        return parse_analysis(
+            {
+                "chief_complaint": "Toothache" if "pain" in transcript else None,
+                "procedures": ["Exam"],
+                "findings": [transcript.split()[0]],
+                "recommendations": [],
+                "summary": f"Part {part}.",
+            },
+            self.name,
+        )
+
+    async def generate_note(self, transcript, template, analysis=None):
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        return prompt
+
+
+class TestSplitTranscript:
+    """Tests for cutting transcripts into token-budgeted windows."""
+
+    def test_windows_break_between_segments(self):
+        """Test windows keep segments whole and carry speaker labels."""
+        segments = [segment("a" * 30, "Dentist"), segment("b" * 30, "Patient"), segment("c" * 30)]
+
+        windows = split_transcript("", window_tokens=20, segments=segments)
+
+        assert windows == [
+            f"Dentist: {'a' * 30}\nPatient: {'b' * 30}",
+            "c" * 30,
+        ]
+
+    def test_without_segments_breaks_between_sentences(self):
+        """Test plain text is cut at sentence ends within the budget."""
+        transcript = "First sentence here. Second one follows! Third is a question? Fourth."
+
+        windows = split_transcript(transcript, window_tokens=10)
+
+        assert windows == [
+            "First sentence here. Second one follows!",
+            "Third is a question? Fourth.",
+        ]
+
+    def test_oversized_piece_is_cut(self):
+        """Test a segment longer than a window is split hard."""
+        windows = split_transcript("", window_tokens=5, segments=[segment("x" * 45)])
+
+        assert [len(w) for w in windows] == [20, 20, 5]
+
+
+class TestMergeAnalyses:
+    """Tests for combining window analyses."""
+
+    def test_deduplicates_items_and_entities(self):
+        """Test repeated findings across windows appear once."""
+        first = AnalysisResult(
+            chief_complaint="Toothache",
+            findings=["Caries on #19"],
+            entities=[ClinicalEntity(entity_type="finding", value="Caries on #19", confidence=0.6)],
+            summary="Exam.",
+        )
+        second = AnalysisResult(
+            chief_complaint="Sensitivity",
+            findings=["caries on  #19.", "Gingivitis"],
+            entities=[
+                ClinicalEntity(entity_type="finding", value="caries on #19", confidence=0.9),
+                ClinicalEntity(entity_type="finding", value="Gingivitis"),
+            ],
+            summary="Cleaning.",
+        )
+
+        merged = merge_analyses([first, second])
+
+        assert merged.chief_complaint == "Toothache"
+        assert merged.findings == ["Caries on #19", "Gingivitis"]
+        assert [(e.value, e.confidence) for e in merged.entities] == [
+            ("caries on #19", 0.9),
+            ("Gingivitis", None),
+        ]
+        assert merged.summary == "Exam. Cleaning."
+
+    def test_template_variables_joined_in_order(self):
+        """Test a variable found in several windows keeps each distinct value."""
+        merged = merge_analyses([
+            AnalysisResult(variables={"tooth": "#19", "anesthetic": None}),
+            AnalysisResult(variables={"tooth": "#30", "anesthetic": None}),
+            AnalysisResult(variables={"tooth": "#19", "anesthetic": "Lidocaine"}),
+        ])
+
+        assert merged.variables == {"tooth": "#19 #30", "anesthetic": "Lidocaine"}
+
+
+class TestAnalyzeInWindows:
+    """Tests for the concurrent map step."""
+
+    # Six sentences of about five tokens each, one window apiece
+    TRANSCRIPT = " ".join(
+        f"Word{i} reports pain." if i == 2 else f"Word{i} is fine." for i in range(6)
+    )
+
+    async def test_windows_analyzed_concurrently_and_merged(self):
+        """Test every window is analyzed at once and results merged."""
+        provider = WindowProvider(delay=0.05)
+
+        analysis = await analyze_in_windows(provider, self.TRANSCRIPT, window_tokens=5)
+
+        assert provider.max_in_flight == 6
+        assert provider.contexts[0] == {"transcript_part": "1 of 6"}
+        assert analysis.chief_complaint == "Toothache"
+        assert analysis.procedures == ["Exam"]
+        assert analysis.findings == [f"Word{i}" for i in range(6)]
+
+    async def test_malformed_windows_are_skipped(self):
+        """Test one bad window does not lose the others."""
+        analysis = await analyze_in_windows(
+            WindowProvider(malformed={2}), self.TRANSCRIPT, window_tokens=5
+        )
+
+        assert len(analysis.findings) == 5
+
+    async def test_all_windows_malformed_raises(self):
+        """Test a transcript with no usable window raises a parse error."""
+        with pytest.raises(AnalysisParseError):
+            await analyze_in_windows(
+                WindowProvider(malformed=set(range(1, 7))), self.TRANSCRIPT, window_tokens=5
+            )
+
+
+async def test_service_switches_mode_on_threshold(fake_db, monkeypatch):
+    """Test only transcripts over the threshold are analyzed in windows."""
+    from app.services import note_generator
+
+    monkeypatch.setattr(note_generator.settings, "analysis_map_reduce_threshold_tokens", 10)
+    monkeypatch.setattr(note_generator.settings, "analysis_window_tokens", 5)
+    monkeypatch.setattr(note_generator.settings, "llm_rate_limit_enabled", False)
+    LLMProviderFactory.register("windows", WindowProvider)
+    service = NoteGeneratorService("windows", analysis_store=AnalysisStore(fake_db))
+
+    await service.get_analysis("Short visit.")
+    assert len(service.llm.contexts) == 1
+
+    await service.get_analysis(TestAnalyzeInWindows.TRANSCRIPT)
+    assert len(service.llm.contexts) == 7
+
+
+async def test_note_task_splits_on_stored_segments(fake_db, monkeypatch):
+    """Test note generation windows a long transcript between its stored segments."""
+    from app.services import note_generator
+
+    monkeypatch.setattr(note_generator.settings, "analysis_map_reduce_threshold_tokens", 10)
+    monkeypatch.setattr(note_generator.settings, "analysis_window_tokens", 10)
+    monkeypatch.setattr(note_generator.settings, "llm_rate_limit_enabled", False)
+    monkeypatch.setattr(note_generator.settings, "default_llm_provider", "windows")
+    monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+    LLMProviderFactory.register("windows", WindowProvider)
+    texts = ["alpha " * 6, "beta " * 6, "gamma " * 6]
+    transcript_id = fake_db.table("transcripts").insert({
+        "content": " ".join(texts),
+        "segments": [segment(text.strip()).model_dump() for text in texts],
+    }).execute().data[0]["id"]
+    note_id = fake_db.table("clinical_notes").insert(
+        {"transcript_id": transcript_id, "status": "draft"}
+    ).execute().data[0]["id"]
+
+    await note_generator.generate_clinical_note_task(note_id, " ".join(texts), "SOAP")
+
+    (note,) = fake_db.tables["clinical_notes"]
+    assert note["analysis"]["findings"] == ["alpha", "beta", "gamma"]
@@ -76,6 +76,7 @@ class TestTemplateVariable:
             "description": "desc",
             "required": True,
             "default_value": None,
+            "narrative": False,
         }
 
 
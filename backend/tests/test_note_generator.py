@@ -0,0 +1,377 @@
+"""Tests for note generation service."""
+
+import asyncio
+import re
+
+import pytest
+
+from app.models.notes import AnalysisResult
+from app.models.templates import TemplateVariable
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory, parse_batch_notes
+from app.services.note_generator import NoteGeneratorService
+
+
+class FakeProvider(BaseLLMProvider):
+    """Provider that records calls instead of contacting an LLM."""
+
+    name = "fake"
+    model = "fake-1"
+    calls: list[str] = []
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        self.calls.append("analyze")
+        return AnalysisResult(chief_complaint="Toothache", procedures=["Filling"])
+
+    async def generate_note(self, transcript, template, analysis=None):
+        self.calls.append("generate")
+        return f"{template}: {analysis.chief_complaint if analysis else 'n/a'}"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        self.calls.append("complete")
+        return prompt
+
+
+@pytest.fixture
+def fake_provider():
+    """Register the fake provider and reset its call log."""
+    LLMProviderFactory.register("fake", FakeProvider)
+    FakeProvider.calls = []
+    return FakeProvider
+
+
+class TestAnalysisReuse:
+    """Tests for sharing one analysis across templates."""
+
+    async def test_analysis_computed_once_per_transcript(self, fake_provider, fake_db):
+        """Test three templates on one transcript make one analysis call."""
+        service = NoteGeneratorService("fake", analysis_store=AnalysisStore(fake_db))
+
+        for template in ("SOAP", "DAP", "Narrative"):
+            note, analysis = await service.generate("Patient has a toothache.", template)
+            assert analysis["chief_complaint"] == "Toothache"
+
+        assert fake_provider.calls.count("analyze") == 1
+        assert fake_provider.calls.count("generate") == 3
+
+    async def test_analysis_persisted_across_processes(self, fake_provider, fake_db):
+        """Test a fresh store (another worker) reuses the persisted analysis."""
+        await NoteGeneratorService("fake", analysis_store=AnalysisStore(fake_db)).get_analysis("T")
+        await NoteGeneratorService("fake", analysis_store=AnalysisStore(fake_db)).get_analysis("T")
+
+        assert fake_provider.calls == ["analyze"]
+        row = fake_db.tables["transcript_analyses"][0]
+        assert row["provider"] == "fake"
+        assert row["model"] == "fake-1"
+
+    async def test_different_transcripts_analyzed_separately(self, fake_provider, fake_db):
+        """Test the key depends on transcript content."""
+        service = NoteGeneratorService("fake", analysis_store=AnalysisStore(fake_db))
+        await service.get_analysis("first")
+        await service.get_analysis("second")
+
+        assert fake_provider.calls == ["analyze", "analyze"]
+
+
+class BatchProvider(FakeProvider):
+    """Fake provider whose complete() answers batched prompts with section markers."""
+
+    name = "fake-batch"
+    prompts: list[str] = []
+    drop: set[str] = set()
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        self.calls.append("complete")
+        self.prompts.append(prompt)
+        keys = re.findall(r"^=== NOTE (\S+) ===$", prompt, re.MULTILINE)
+        return "\n".join(
+            f"=== NOTE {key} ===\nnote {key}\n=== END NOTE {key} ==="
+            for key in keys
+            if key not in self.drop
+        )
+
+
+@pytest.fixture
+def batch_provider():
+    """Register the batching fake provider and reset its state."""
+    LLMProviderFactory.register("fake-batch", BatchProvider)
+    BatchProvider.calls = []
+    BatchProvider.prompts = []
+    BatchProvider.drop = set()
+    return BatchProvider
+
+
+class TestBatchedGeneration:
+    """Tests for filling several templates in one request."""
+
+    TRANSCRIPT = "Patient reports a toothache on the lower left molar. " * 50
+    TEMPLATES = {"soap": "SOAP {{subjective}}", "dap": "DAP {{data}}", "narr": "Narrative"}
+
+    async def test_one_call_for_all_templates(self, batch_provider, fake_db):
+        """Test three templates are generated with one completion call."""
+        service = NoteGeneratorService("fake-batch", analysis_store=AnalysisStore(fake_db))
+        notes, analysis = await service.generate_many(self.TRANSCRIPT, self.TEMPLATES)
+
+        assert notes == {"soap": "note soap", "dap": "note dap", "narr": "note narr"}
+        assert analysis["chief_complaint"] == "Toothache"
+        assert batch_provider.calls == ["analyze", "complete"]
+
+    async def test_transcript_sent_once(self, batch_provider, fake_db):
+        """Test the batched prompt carries the transcript a single time."""
+        service = NoteGeneratorService("fake-batch", analysis_store=AnalysisStore(fake_db))
+        await service.generate_many(self.TRANSCRIPT, self.TEMPLATES)
+
+        (prompt,) = batch_provider.prompts
+        assert prompt.count(self.TRANSCRIPT) == 1
+        assert len(prompt) < len(self.TRANSCRIPT) * 2
+
+    async def test_missing_section_falls_back(self, batch_provider, fake_db):
+        """Test a note missing from the response is generated on its own."""
+        batch_provider.drop = {"dap"}
+        service = NoteGeneratorService("fake-batch", analysis_store=AnalysisStore(fake_db))
+        notes, _ = await service.generate_many(self.TRANSCRIPT, self.TEMPLATES)
+
+        assert notes["soap"] == "note soap"
+        assert notes["dap"] == "DAP {{data}}: Toothache"
+        assert batch_provider.calls == ["analyze", "complete", "generate"]
+
+
+def test_parse_batch_notes_ignores_empty_sections():
+    """Test empty or absent sections are left out of the parsed result."""
+    text = "=== NOTE a ===\nline 1\nline 2\n=== END NOTE a ===\n=== NOTE b ===\n=== END NOTE b ==="
+    assert parse_batch_notes(text, ["a", "b", "c"]) == {"a": "line 1\nline 2"}
+
+
+class ClosingProvider(FakeProvider):
+    """Fake provider that records when it is closed."""
+
+    name = "fake-closing"
+    closed = 0
+
+    async def aclose(self):
+        ClosingProvider.closed += 1
+
+
+class TestProviderRegistry:
+    """Tests for sharing provider instances per event loop."""
+
+    @pytest.fixture(autouse=True)
+    def registered(self):
+        LLMProviderFactory.register("fake-closing", ClosingProvider)
+        ClosingProvider.closed = 0
+
+    async def test_shared_within_loop(self):
+        """Test services on one loop share a provider and its connections."""
+        first = NoteGeneratorService("fake-closing", analysis_store=AnalysisStore())
+        second = NoteGeneratorService("fake-closing", analysis_store=AnalysisStore())
+        assert first.llm is second.llm
+        await LLMProviderFactory.aclose()
+
+    def test_separate_per_loop(self):
+        """Test each event loop gets its own instance."""
+
+        async def get():
+            provider = LLMProviderFactory.get_provider("fake-closing")
+            await LLMProviderFactory.aclose()
+            return provider
+
+        assert asyncio.run(get()) is not asyncio.run(get())
+        assert ClosingProvider.closed == 2
+
+    async def test_aclose_releases_instances(self):
+        """Test shutdown closes providers and later calls build new ones."""
+        provider = LLMProviderFactory.get_provider("fake-closing")
+        await LLMProviderFactory.aclose()
+
+        assert ClosingProvider.closed == 1
+        assert LLMProviderFactory.get_provider("fake-closing") is not provider
+        await LLMProviderFactory.aclose()
+
+    def test_not_shared_outside_loop(self):
+        """Test providers created without a running loop are not cached."""
+        assert LLMProviderFactory.get_provider("fake-closing") is not (
+            LLMProviderFactory.get_provider("fake-closing")
+        )
+
+
+class TestIdempotentNotes:
+    """Tests for retrying note generation."""
+
+    async def test_generated_notes_skipped_on_retry(self, batch_provider, fake_db, monkeypatch):
+        """Test a retried batch only regenerates notes that were not saved."""
+        from app.services import note_generator
+
+        monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+        monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+        monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-batch")
+        done, pending_a, pending_b = (
+            fake_db.table("clinical_notes").insert({"status": status}).execute().data[0]["id"]
+            for status in ("generated", "draft", "draft")
+        )
+
+        await note_generator.generate_clinical_notes_task(
+            [[done, "SOAP"], [pending_a, "DAP"], [pending_b, "Narrative"]], "Transcript"
+        )
+
+        (prompt,) = batch_provider.prompts
+        assert f"=== NOTE {done} ===" not in prompt
+        assert f"=== NOTE {pending_a} ===" in prompt
+        notes = {n["id"]: n for n in fake_db.tables["clinical_notes"]}
+        assert "generated_content" not in notes[done]
+        assert notes[pending_b]["generated_content"] == f"note {pending_b}"
+
+
+class ExtractingProvider(BatchProvider):
+    """Fake provider that extracts requested template fields during analysis."""
+
+    name = "fake-extracting"
+    fields: list[dict] = []
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        self.calls.append("analyze")
+        self.fields.append(fields)
+        values = {"tooth": "#19", "anesthetic": None}
+        return AnalysisResult(
+            chief_complaint="Toothache",
+            variables={name: values.get(name) for name in fields or {}},
+        )
+
+
+@pytest.fixture
+def extracting_provider():
+    """Register the extracting fake provider and reset its state."""
+    LLMProviderFactory.register("fake-extracting", ExtractingProvider)
+    ExtractingProvider.calls = []
+    ExtractingProvider.prompts = []
+    ExtractingProvider.fields = []
+    ExtractingProvider.drop = set()
+    return ExtractingProvider
+
+
+class TestStructuredFill:
+    """Tests for rendering notes locally from extracted variables."""
+
+    TEMPLATES = {
+        "exam": "{{ chief_complaint }} on {{ tooth }}; anesthetic: {{ anesthetic }}",
+        "referral": "Refer for {{ tooth }}.",
+    }
+
+    def service(self, fake_db):
+        return NoteGeneratorService(
+            "fake-extracting", analysis_store=AnalysisStore(fake_db), mode="structured"
+        )
+
+    async def test_rendered_with_analysis_call_only(self, extracting_provider, fake_db):
+        """Test templates without narrative variables need no generation call."""
+        notes, analysis = await self.service(fake_db).generate_many(
+            "Transcript", self.TEMPLATES
+        )
+
+        assert notes == {
+            "exam": "Toothache on #19; anesthetic: Not documented",
+            "referral": "Refer for #19.",
+        }
+        assert extracting_provider.calls == ["analyze"]
+        assert extracting_provider.fields == [{"tooth": "", "anesthetic": ""}]
+        assert analysis["variables"]["tooth"] == "#19"
+
+    async def test_declared_defaults_and_descriptions_used(self, extracting_provider, fake_db):
+        """Test descriptions are sent for extraction and defaults fill missing values."""
+        variables = [
+            TemplateVariable(
+                name="anesthetic", description="Anesthetic given", default_value="None"
+            )
+        ]
+
+        note, _ = await self.service(fake_db).generate(
+            "Transcript", self.TEMPLATES["exam"], variables=variables
+        )
+
+        assert note == "Toothache on #19; anesthetic: None"
+        assert extracting_provider.fields == [{"tooth": "", "anesthetic": "Anesthetic given"}]
+
+    async def test_only_narrative_variables_written_by_llm(self, extracting_provider, fake_db):
+        """Test narrative variables are written in one call and are not extracted."""
+        template = "{{ tooth }}\n{{ history }}"
+        variables = [TemplateVariable(name="history", description="HPI", narrative=True)]
+
+        note, _ = await self.service(fake_db).generate(
+            "Transcript", template, variables=variables
+        )
+
+        assert note == "#19\nnote history"
+        assert extracting_provider.calls == ["analyze", "complete"]
+        assert extracting_provider.fields == [{"tooth": ""}]
+        (prompt,) = extracting_provider.prompts
+        assert "- history: HPI" in prompt
+
+    async def test_unparseable_template_generated_by_llm(self, extracting_provider, fake_db):
+        """Test a template that does not parse falls back to LLM generation."""
+        notes, _ = await self.service(fake_db).generate_many(
+            "Transcript", {"ok": "{{ tooth }}", "broken": "{% if x %}"}
+        )
+
+        assert notes["ok"] == "#19"
+        assert notes["broken"] == "{% if x %}: Toothache"
+        assert extracting_provider.calls == ["analyze", "generate"]
+
+    async def test_analyses_with_different_fields_stored_apart(
+        self, extracting_provider, fake_db
+    ):
+        """Test a plain analysis is not reused for one extracting template fields."""
+        service = self.service(fake_db)
+        await service.get_analysis("Transcript")
+        await service.get_analysis("Transcript", fields={"tooth": ""})
+        await service.get_analysis("Transcript", fields={"tooth": ""})
+
+        assert extracting_provider.calls == ["analyze", "analyze"]
+
+    async def test_task_uses_stored_template_variables(
+        self, extracting_provider, fake_db, monkeypatch
+    ):
+        """Test the note task reads the template's declared variables."""
+        from app.services import note_generator
+
+        monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+        monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+        monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-extracting")
+        monkeypatch.setattr(note_generator.settings, "note_generation_mode", "structured")
+        template_id = fake_db.table("templates").insert({
+            "variables": [{"name": "history", "description": "HPI", "narrative": True}],
+        }).execute().data[0]["id"]
+        note_id = fake_db.table("clinical_notes").insert({
+            "template_id": template_id, "status": "draft",
+        }).execute().data[0]["id"]
+
+        await note_generator.generate_clinical_note_task(note_id, "Transcript", "{{ history }}")
+
+        (note,) = fake_db.tables["clinical_notes"]
+        assert note["generated_content"] == "note history"
+        assert extracting_provider.calls == ["analyze", "complete"]
+
+    async def test_pre_analysis_reused_by_every_note_task(
+        self, extracting_provider, fake_db, monkeypatch
+    ):
+        """Test per-note tasks reuse the analysis extracting all of the transcript's fields."""
+        from app.services import note_generator
+
+        monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+        monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+        monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-extracting")
+        monkeypatch.setattr(note_generator.settings, "note_generation_mode", "structured")
+        created = fake_db.table("clinical_notes").insert(
+            [{"status": "draft"} for _ in self.TEMPLATES]
+        ).execute().data
+        notes = [[note["id"], t] for note, t in zip(created, self.TEMPLATES.values())]
+
+        fields = await note_generator.analyze_for_notes("Transcript", notes)
+        for note_id, template in notes:
+            await note_generator.generate_clinical_note_task(
+                note_id, "Transcript", template, fields
+            )
+
+        assert extracting_provider.calls == ["analyze"]
+        assert [n["generated_content"] for n in fake_db.tables["clinical_notes"]] == [
+            "Toothache on #19; anesthetic: Not documented",
+            "Refer for #19.",
+        ]
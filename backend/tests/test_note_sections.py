@@ -0,0 +1,242 @@
+"""Tests for note sections and section-level regeneration."""
+
+import re
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+
+from app.api.deps import get_current_active_user, get_db
+from app.main import app
+from app.models.notes import AnalysisResult
+from app.models.users import User, UserRole
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.note_sections import (
+    join_sections,
+    sections_to_list,
+    split_sections,
+    template_headings,
+)
+
+TEMPLATE = """DENTAL NOTE
+Date: {{ date }}
+
+SUBJECTIVE:
+{{ chief_complaint }}
+
+OBJECTIVE:
+{{ findings | bullet_list }}
+
+PLAN:
+Follow-up: {{ follow_up }}
+"""
+
+NOTE = """DENTAL NOTE
+Date: 2026-01-01
+
+**Subjective:**
+Pain in the lower left molar.
+
+OBJECTIVE:
+- Caries on #19
+
+PLAN:
+Follow-up: 2 weeks"""
+
+
+class SectionProvider(BaseLLMProvider):
+    """Provider that answers section prompts with one rewritten section each."""
+
+    name = "fake-sections"
+    model = "fake-1"
+    calls: list[str] = []
+    prompts: list[str] = []
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        self.calls.append("analyze")
+        return AnalysisResult(chief_complaint="Toothache")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        self.calls.append("generate")
+        return NOTE
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        self.calls.append("complete")
+        self.prompts.append(prompt)
+        keys = re.findall(r"^=== NOTE (\S+) ===$", prompt, re.MULTILINE)
+        return "\n".join(f"=== NOTE {k} ===\nnew {k}\n=== END NOTE {k} ===" for k in keys)
+
+
+class TestSplitSections:
+    """Tests for splitting notes at their template's headings."""
+
+    def test_template_headings(self):
+        """Test only upper-case heading lines are sections."""
+        assert template_headings(TEMPLATE) == ["SUBJECTIVE:", "OBJECTIVE:", "PLAN:"]
+
+    def test_note_split_at_headings(self):
+        """Test headings match despite case and emphasis, with a header section first."""
+        sections = split_sections(NOTE, TEMPLATE)
+
+        assert [s.name for s in sections] == ["header", "subjective", "objective", "plan"]
+        assert sections[0].content == "DENTAL NOTE\nDate: 2026-01-01"
+        assert sections[1].heading == "**Subjective:**"
+        assert sections[2].content == "- Caries on #19"
+
+    def test_join_round_trips(self):
+        """Test joining the sections restores the note."""
+        assert join_sections(split_sections(NOTE, TEMPLATE)) == NOTE
+
+    def test_missing_heading_skipped(self):
+        """Test a heading the note leaves out keeps its text in the previous section."""
+        sections = split_sections("SUBJECTIVE:\nPain\nPLAN:\nRecall", TEMPLATE)
+
+        assert [s.name for s in sections] == ["header", "subjective", "plan"]
+
+
+@pytest.fixture
+def sections_client(client, fake_db, monkeypatch):
+    """Test client with a generated note for a transcript and template."""
+    user = User(
+        id=uuid4(),
+        email="dentist@example.com",
+        full_name="Test Dentist",
+        role=UserRole.DENTIST,
+        created_at=datetime.now(UTC),
+    )
+    LLMProviderFactory.register("fake-sections", SectionProvider)
+    SectionProvider.calls = []
+    SectionProvider.prompts = []
+    monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-sections")
+    monkeypatch.setattr(note_generator.settings, "llm_rate_limit_enabled", False)
+    monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    transcript = fake_db.table("transcripts").insert(
+        {"recording_id": str(uuid4()), "content": "Patient has a toothache.", "status": "completed"}
+    ).execute().data[0]
+    template = fake_db.table("templates").insert({"content": TEMPLATE}).execute().data[0]
+    client.note_id = fake_db.table("clinical_notes").insert({
+        "transcript_id": transcript["id"],
+        "template_id": template["id"],
+        "generated_content": "",
+        "status": "draft",
+        "created_at": datetime.now(UTC).isoformat(),
+    }).execute().data[0]["id"]
+    yield client
+    app.dependency_overrides.clear()
+
+
+class TestRegenerateSections:
+    """Tests for the section regeneration endpoint."""
+
+    async def test_sections_stored_on_generation(self, sections_client, fake_db):
+        """Test generated notes are stored with their section boundaries."""
+        await note_generator.generate_clinical_note_task(
+            sections_client.note_id, "Patient has a toothache.", TEMPLATE
+        )
+
+        (note,) = fake_db.tables["clinical_notes"]
+        assert [s["name"] for s in note["sections"]] == [
+            "header", "subjective", "objective", "plan"
+        ]
+
+    async def test_only_requested_sections_rewritten(self, sections_client, fake_db):
+        """Test other sections are kept and the stored analysis is reused."""
+        await note_generator.generate_clinical_note_task(
+            sections_client.note_id, "Patient has a toothache.", TEMPLATE
+        )
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["plan"]},
+        )
+
+        assert response.status_code == 200
+        note = response.json()
+        assert note["generated_content"] == NOTE.replace("Follow-up: 2 weeks", "new plan")
+        assert SectionProvider.calls == ["analyze", "generate", "complete"]
+        (prompt,) = SectionProvider.prompts
+        assert "=== NOTE plan ===" in prompt
+        assert "=== NOTE subjective ===" not in prompt
+        assert "Document the treatment plan" in prompt
+
+    def test_note_without_stored_sections_split_on_demand(self, sections_client, fake_db):
+        """Test notes generated before sections were stored can still be regenerated."""
+        fake_db.tables["clinical_notes"][0].update(
+            {"generated_content": NOTE, "status": "generated"}
+        )
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["subjective"]},
+        )
+
+        assert response.status_code == 200
+        assert "**Subjective:**\nnew subjective" in response.json()["generated_content"]
+
+    def test_edited_note_regenerated_from_final_content(self, sections_client, fake_db):
+        """Test the clinician's edits to other sections are kept and the result exported."""
+        edited = NOTE.replace("Caries on #19", "Caries on #19, mesial")
+        generated_sections = sections_to_list(NOTE, TEMPLATE)
+        fake_db.tables["clinical_notes"][0].update({
+            "generated_content": NOTE,
+            "sections": generated_sections,
+            "final_content": edited,
+            "status": "reviewed",
+        })
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["plan"]},
+        )
+
+        assert response.status_code == 200
+        note = response.json()
+        assert note["final_content"] == edited.replace("Follow-up: 2 weeks", "new plan")
+        assert note["generated_content"] == NOTE
+        assert note["status"] == "reviewed"
+        # Stored sections describe the generated content, which is unchanged
+        assert fake_db.tables["clinical_notes"][0]["sections"] == generated_sections
+
+    def test_incomplete_transcript_rejected(self, sections_client, fake_db):
+        """Test a transcript still being (re)transcribed is a client error."""
+        fake_db.tables["clinical_notes"][0]["generated_content"] = NOTE
+        fake_db.tables["transcripts"][0]["status"] = "processing"
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["plan"]},
+        )
+
+        assert response.status_code == 400
+        assert SectionProvider.calls == []
+
+    def test_unknown_section_rejected(self, sections_client, fake_db):
+        """Test naming a section the note does not have is a client error."""
+        fake_db.tables["clinical_notes"][0]["generated_content"] = NOTE
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["assessment"]},
+        )
+
+        assert response.status_code == 400
+        assert SectionProvider.calls == []
+
+    def test_finalized_note_not_regenerated(self, sections_client, fake_db):
+        """Test finalized notes are left alone."""
+        fake_db.tables["clinical_notes"][0].update(
+            {"generated_content": NOTE, "status": "finalized"}
+        )
+
+        response = sections_client.post(
+            f"/api/v1/notes/{sections_client.note_id}/regenerate",
+            json={"sections": ["plan"]},
+        )
+
+        assert response.status_code == 409
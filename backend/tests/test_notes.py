@@ -0,0 +1,150 @@
+"""Tests for clinical note endpoints."""
+
+import json
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from app.api.deps import get_current_active_user, get_db
+from app.main import app
+from app.models.notes import AnalysisResult
+from app.models.users import User, UserRole
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.llm.ollama_provider import OllamaProvider
+
+
+class StreamingProvider(BaseLLMProvider):
+    """Provider that streams a fixed note in fragments."""
+
+    name = "fake-stream"
+    model = "fake-1"
+    fragments = ["Subjective: ", "toothache.", "\nPlan: ", "filling."]
+    fail = False
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        return AnalysisResult(chief_complaint="Toothache")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        return "".join(self.fragments)
+
+    async def generate_note_stream(self, transcript, template, analysis=None):
+        for fragment in self.fragments:
+            if self.fail:
+                raise RuntimeError("provider unavailable")
+            yield fragment
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        return ""
+
+
+def parse_sse(body: str) -> list[tuple[str, dict]]:
+    """Split an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def notes_client(client, fake_db, monkeypatch):
+    """Test client with auth, database and LLM provider overridden."""
+    user = User(
+        id=uuid4(),
+        email="dentist@example.com",
+        full_name="Test Dentist",
+        role=UserRole.DENTIST,
+        created_at=datetime.now(UTC),
+    )
+    LLMProviderFactory.register("fake-stream", StreamingProvider)
+    StreamingProvider.fail = False
+    monkeypatch.setattr(note_generator.settings, "default_llm_provider", "fake-stream")
+    monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    transcript = fake_db.table("transcripts").insert(
+        {"recording_id": str(uuid4()), "content": "Patient has a toothache.", "status": "completed"}
+    ).execute().data[0]
+    template = fake_db.table("templates").insert({"content": "SOAP"}).execute().data[0]
+    client.note_request = {"transcript_id": transcript["id"], "template_id": template["id"]}
+    yield client
+    app.dependency_overrides.clear()
+
+
+class TestStreamNote:
+    """Tests for the SSE generation endpoint."""
+
+    def test_tokens_relayed_and_note_saved(self, notes_client, fake_db):
+        """Test fragments arrive as token events and the full note is persisted."""
+        response = notes_client.post(
+            "/api/v1/notes/generate/stream", json=notes_client.note_request
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(response.text)
+        assert events[0][0] == "note"
+        assert [data["text"] for event, data in events if event == "token"] == (
+            StreamingProvider.fragments
+        )
+        assert events[-1] == ("done", {"id": events[0][1]["id"], "status": "generated"})
+
+        (note,) = fake_db.tables["clinical_notes"]
+        assert note["generated_content"] == "Subjective: toothache.\nPlan: filling."
+        assert note["status"] == "generated"
+        assert note["analysis"]["chief_complaint"] == "Toothache"
+
+    def test_failure_sends_error_event(self, notes_client, fake_db):
+        """Test a provider error is reported in-stream and the note left as draft."""
+        StreamingProvider.fail = True
+        response = notes_client.post(
+            "/api/v1/notes/generate/stream", json=notes_client.note_request
+        )
+
+        events = parse_sse(response.text)
+        assert events[-1] == ("error", {"detail": "provider unavailable"})
+        assert fake_db.tables["clinical_notes"][0]["status"] == "draft"
+
+    def test_incomplete_transcript_rejected(self, notes_client, fake_db):
+        """Test validation runs before the stream starts."""
+        fake_db.tables["transcripts"][0]["status"] = "processing"
+        response = notes_client.post(
+            "/api/v1/notes/generate/stream", json=notes_client.note_request
+        )
+
+        assert response.status_code == 400
+        assert "clinical_notes" not in fake_db.tables
+
+
+class TestProviderStreaming:
+    """Tests for provider streaming implementations."""
+
+    async def test_default_stream_yields_whole_note(self):
+        """Test providers without streaming yield the complete note once."""
+        provider = StreamingProvider()
+        chunks = [c async for c in BaseLLMProvider.generate_note_stream(provider, "t", "SOAP")]
+        assert chunks == ["Subjective: toothache.\nPlan: filling."]
+
+    async def test_ollama_parses_json_lines(self):
+        """Test Ollama's newline-delimited stream is relayed fragment by fragment."""
+        lines = [
+            {"response": "Subjective", "done": False},
+            {"response": ": pain", "done": False},
+            {"response": "", "done": True},
+        ]
+
+        def handler(request):
+            assert json.loads(request.content)["stream"] is True
+            return httpx.Response(200, text="\n".join(json.dumps(line) for line in lines))
+
+        provider = OllamaProvider()
+        provider.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        chunks = [c async for c in provider.generate_note_stream("t", "SOAP")]
+
+        assert chunks == ["Subjective", ": pain"]
@@ -0,0 +1,203 @@
+"""Tests for cache-friendly prompt layout and usage reporting."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.metrics import metrics
+from app.services.llm.anthropic_provider import AnthropicProvider
+from app.services.llm.openai_provider import OpenAIProvider
+from app.services.llm.prompts import (
+    CLINICAL_SYSTEM_PROMPT,
+    build_analysis_prompt,
+    build_batch_generation_prompt,
+    build_generation_prompt,
+    build_transcript_block,
+)
+from app.services.llm.usage import LLMUsage, collect_usage, record_usage
+
+TRANSCRIPT = "Dr: Any pain today? Patient: Yes, lower left molar when chewing."
+
+
+def make_provider(provider_class, client, model):
+    """Build a provider around a fake SDK client without real credentials."""
+    provider = provider_class.__new__(provider_class)
+    provider.model = model
+    provider.client = client
+    return provider
+
+
+class FakeAnthropicClient:
+    """Records requests and reports cache writes, then reads, per cached prefix."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+        self.cached: set[tuple] = set()
+        self.messages = SimpleNamespace(create=self.create)
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        prefix = (
+            repr(kwargs.get("tools")),
+            kwargs["system"][0]["text"],
+            kwargs["messages"][0]["content"][0]["text"],
+        )
+        hit = prefix in self.cached
+        self.cached.add(prefix)
+        usage = SimpleNamespace(
+            input_tokens=20,
+            output_tokens=50,
+            cache_read_input_tokens=1000 if hit else 0,
+            cache_creation_input_tokens=0 if hit else 1000,
+        )
+        if kwargs.get("tools"):
+            block = SimpleNamespace(type="tool_use", input={"procedures": ["exam"]})
+        else:
+            block = SimpleNamespace(type="text", text="note")
+        return SimpleNamespace(content=[block], usage=usage)
+
+
+class FakeOpenAIClient:
+    """Records chat completion requests and reports cached prompt tokens."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        usage = SimpleNamespace(
+            prompt_tokens=1200,
+            completion_tokens=40,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=1024),
+        )
+        message = SimpleNamespace(content="{}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestPromptLayout:
+    """Tests that prompts about one transcript share a prefix."""
+
+    def test_transcript_comes_first(self):
+        """Test analysis, note and batch prompts all start with the transcript."""
+        block = build_transcript_block(TRANSCRIPT)
+        prompts = [
+            build_analysis_prompt(TRANSCRIPT, {"appointment_type": "exam"}),
+            build_generation_prompt(TRANSCRIPT, "SOAP: {{subjective}}"),
+            build_batch_generation_prompt(TRANSCRIPT, {"a": "SOAP", "b": "Referral"}),
+        ]
+        for prompt in prompts:
+            assert prompt.startswith(block)
+            assert prompt.count(TRANSCRIPT) == 1
+
+
+class TestAnthropicCaching:
+    """Tests for Anthropic cache breakpoints and cache usage."""
+
+    async def test_analysis_and_note_mark_prefix_cacheable(self):
+        """Test both requests mark the same system prompt and transcript as cacheable."""
+        client = FakeAnthropicClient()
+        provider = make_provider(AnthropicProvider, client, "claude-test")
+
+        await provider.analyze_transcript(TRANSCRIPT)
+        await provider.generate_note(TRANSCRIPT, "SOAP: {{subjective}}")
+
+        analysis, note = client.requests
+        for request in (analysis, note):
+            (system,) = request["system"]
+            assert system["text"] == CLINICAL_SYSTEM_PROMPT
+            assert system["cache_control"] == {"type": "ephemeral"}
+            transcript_block, instructions = request["messages"][0]["content"]
+            assert transcript_block["cache_control"] == {"type": "ephemeral"}
+            assert "cache_control" not in instructions
+        assert analysis["system"] == note["system"]
+        assert analysis["messages"][0]["content"][0] == note["messages"][0]["content"][0]
+
+    async def test_cache_tokens_reach_metrics(self):
+        """Test the second note on a transcript is reported as a cache read."""
+        provider = make_provider(AnthropicProvider, FakeAnthropicClient(), "claude-test")
+
+        await provider.generate_note(TRANSCRIPT, "SOAP")
+        await provider.generate_note(TRANSCRIPT, "Referral")
+
+        labels = {"provider": "anthropic", "model": "claude-test"}
+        assert metrics.get("llm_requests", **labels) == 2
+        assert metrics.get("llm_cache_write_tokens", **labels) == 1000
+        assert metrics.get("llm_cache_read_tokens", **labels) == 1000
+        assert metrics.get("llm_input_tokens", **labels) == 2040
+        assert metrics.get("llm_output_tokens", **labels) == 100
+
+    async def test_batched_notes_reuse_prefix(self):
+        """Test batched generation sends the same cached prefix as single notes."""
+        client = FakeAnthropicClient()
+        provider = make_provider(AnthropicProvider, client, "claude-test")
+
+        await provider.generate_note(TRANSCRIPT, "SOAP")
+        await provider.generate_notes(TRANSCRIPT, {"a": "SOAP", "b": "Referral"})
+
+        batch = client.requests[1]
+        assert batch["system"] == client.requests[0]["system"]
+        assert "=== NOTE a ===" in batch["messages"][0]["content"][1]["text"]
+        assert metrics.get("llm_cache_read_tokens", provider="anthropic", model="claude-test")
+
+
+class TestOpenAICaching:
+    """Tests for OpenAI prefix ordering and cached token reporting."""
+
+    async def test_static_prefix_and_cache_key(self):
+        """Test requests lead with the system prompt and transcript under one cache key."""
+        client = FakeOpenAIClient()
+        provider = make_provider(OpenAIProvider, client, "gpt-test")
+
+        await provider.analyze_transcript(TRANSCRIPT)
+        await provider.generate_note(TRANSCRIPT, "SOAP")
+
+        analysis, note = client.requests
+        block = build_transcript_block(TRANSCRIPT)
+        for request in (analysis, note):
+            system, user = request["messages"]
+            assert system == {"role": "system", "content": CLINICAL_SYSTEM_PROMPT}
+            assert user["content"].startswith(block)
+        assert analysis["prompt_cache_key"] == note["prompt_cache_key"]
+
+        other = make_provider(OpenAIProvider, client, "gpt-test")
+        await other.generate_note("A different transcript", "SOAP")
+        assert client.requests[-1]["prompt_cache_key"] != note["prompt_cache_key"]
+
+    async def test_cached_tokens_reach_metrics(self):
+        """Test cached prompt tokens are reported as cache reads."""
+        provider = make_provider(OpenAIProvider, FakeOpenAIClient(), "gpt-test")
+
+        await provider.generate_note(TRANSCRIPT, "SOAP")
+
+        labels = {"provider": "openai", "model": "gpt-test"}
+        assert metrics.get("llm_input_tokens", **labels) == 1200
+        assert metrics.get("llm_cache_read_tokens", **labels) == 1024
+        assert metrics.get("llm_cache_write_tokens", **labels) == 0
+
+
+class TestCollectUsage:
+    """Tests for collecting usage within a block."""
+
+    async def test_collects_concurrent_calls(self):
+        """Test usage recorded in gathered tasks reaches the enclosing collector."""
+        provider = make_provider(AnthropicProvider, FakeAnthropicClient(), "claude-test")
+
+        with collect_usage() as usage:
+            await asyncio.gather(
+                provider.generate_note(TRANSCRIPT, "SOAP"),
+                provider.generate_note(TRANSCRIPT, "Referral"),
+            )
+        record_usage(LLMUsage(provider="anthropic", model="claude-test"))
+
+        assert len(usage) == 2
+        assert {u.cache_read_tokens + u.cache_write_tokens for u in usage} == {1000}
+        assert all(u.uncached_input_tokens == 20 for u in usage)
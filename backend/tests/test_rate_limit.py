@@ -0,0 +1,256 @@
+"""Tests for LLM rate limiting and adaptive concurrency."""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+from app.services.llm.base import BaseLLMProvider
+from app.services.llm.rate_limit import (
+    AIMDLimiter,
+    RateLimitedProvider,
+    RateLimiter,
+    TokenBucket,
+    aclose_rate_limiters,
+    is_overload_error,
+)
+from app.services.transcription import TranscriptionService
+
+
+class FakeClock:
+    """Manually advanced clock whose sleep() just moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def overload_error(status: int = 429, retry_after: str | None = None) -> httpx.HTTPStatusError:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "https://api.example.com")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("overloaded", request=request, response=response)
+
+
+class FlakyProvider(BaseLLMProvider):
+    """Provider that fails with the queued errors before succeeding."""
+
+    name = "flaky"
+    model = "flaky-1"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def _call(self, result):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return result
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        return await self._call(AnalysisResult(summary="ok"))
+
+    async def generate_note(self, transcript, template, analysis=None):
+        return await self._call("note")
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        return await self._call("done")
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestTokenBucket:
+    """Tests for the in-process token bucket."""
+
+    async def test_burst_then_wait(self, clock):
+        """Test the bucket admits its capacity, then reports the refill wait."""
+        bucket = TokenBucket(rate_per_minute=60, clock=clock)
+
+        for _ in range(60):
+            assert await bucket.try_acquire() == 0
+        assert await bucket.try_acquire() == pytest.approx(1.0)
+
+        clock.now += 1.0
+        assert await bucket.try_acquire() == 0
+
+    async def test_weighted_acquire(self, clock):
+        """Test token amounts larger than one are charged in full."""
+        bucket = TokenBucket(rate_per_minute=600, clock=clock)
+
+        assert await bucket.try_acquire(500) == 0
+        assert await bucket.try_acquire(200) == pytest.approx(10.0)
+
+
+class TestAIMDLimiter:
+    """Tests for adaptive concurrency."""
+
+    async def test_backs_off_on_overload(self, clock):
+        """Test an overload halves the limit once per cooldown."""
+        limiter = AIMDLimiter(initial=8, clock=clock)
+
+        for _ in range(3):
+            await limiter.acquire()
+        for _ in range(3):
+            await limiter.release(overloaded=True)
+
+        assert limiter.limit == 4
+        clock.now += 2
+        await limiter.acquire()
+        await limiter.release(overloaded=True)
+        assert limiter.limit == 2
+
+    async def test_ramps_up_when_saturated(self, clock):
+        """Test successes raise the limit only while it is the bottleneck."""
+        limiter = AIMDLimiter(initial=2, maximum=3, clock=clock)
+
+        await limiter.acquire()
+        await limiter.release()
+        assert limiter.limit == 2
+
+        await limiter.acquire()
+        await limiter.acquire()
+        await limiter.release()
+        assert limiter.limit == 3
+        await limiter.release()
+
+        for _ in range(3):
+            await limiter.acquire()
+        for _ in range(3):
+            await limiter.release()
+        assert limiter.limit == 3
+
+    async def test_limit_bounds_in_flight(self):
+        """Test no more than limit callers hold a slot at once."""
+        limiter = AIMDLimiter(initial=2, maximum=2)
+        peak = 0
+
+        async def worker():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release()
+
+        await asyncio.gather(*(worker() for _ in range(6)))
+        assert peak == 2
+
+
+class TestRateLimiter:
+    """Tests for rate-limited provider calls."""
+
+    async def test_requests_bucket_delays_calls(self, clock):
+        """Test calls beyond the per-minute budget wait for a refill."""
+        limiter = RateLimiter(
+            "flaky:flaky-1",
+            requests=TokenBucket(rate_per_minute=2, clock=clock),
+            sleep=clock.sleep,
+        )
+        provider = RateLimitedProvider(FlakyProvider(), limiter)
+
+        for _ in range(3):
+            assert await provider.complete("hi") == "done"
+
+        assert clock.now == pytest.approx(30.0)
+
+    async def test_tokens_bucket_charges_estimate(self, clock):
+        """Test the tokens bucket is charged the prompt estimate plus max_tokens."""
+        tokens = TokenBucket(rate_per_minute=10_000, clock=clock)
+        limiter = RateLimiter("flaky:flaky-1", tokens=tokens, sleep=clock.sleep)
+        provider = RateLimitedProvider(FlakyProvider(), limiter)
+
+        await provider.complete("x" * 4000, max_tokens=1000)
+
+        assert await tokens.try_acquire(8000) == 0
+        assert await tokens.try_acquire(1) > 0
+
+    async def test_overload_retried_and_backs_off(self, clock):
+        """Test a 429 shrinks concurrency and is retried after Retry-After."""
+        metrics.reset()
+        concurrency = AIMDLimiter(initial=8, clock=clock)
+        limiter = RateLimiter("flaky:flaky-1", concurrency=concurrency, sleep=clock.sleep)
+        inner = FlakyProvider([overload_error(429, retry_after="7")])
+
+        note = await RateLimitedProvider(inner, limiter).generate_note("t", "SOAP")
+
+        assert note == "note"
+        assert inner.calls == 2
+        assert clock.sleeps == [7.0]
+        assert concurrency.limit == 4
+        assert metrics.get("llm_rate_limited", limiter="flaky:flaky-1") == 1
+
+    async def test_gives_up_after_max_retries(self, clock):
+        """Test persistent overload is raised once retries are exhausted."""
+        limiter = RateLimiter("flaky:flaky-1", max_retries=2, sleep=clock.sleep)
+        inner = FlakyProvider([overload_error(529)] * 5)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await RateLimitedProvider(inner, limiter).analyze_transcript("t")
+        assert inner.calls == 3
+        first, second = clock.sleeps
+        assert 0.5 <= first <= 1
+        assert 1 <= second <= 2
+
+    async def test_other_errors_not_retried(self, clock):
+        """Test non-overload errors propagate immediately."""
+        limiter = RateLimiter("flaky:flaky-1", sleep=clock.sleep)
+        inner = FlakyProvider([overload_error(400)])
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await RateLimitedProvider(inner, limiter).complete("hi")
+        assert inner.calls == 1
+        assert not is_overload_error(overload_error(400))
+
+
+class TestWhisperRateLimit:
+    """Tests for limiting Whisper requests."""
+
+    async def test_whisper_429_retried(self, tmp_path, clock):
+        """Test a rate-limited transcription request is retried."""
+        audio = tmp_path / "visit.wav"
+        audio.write_bytes(b"")
+        attempts = []
+
+        async def create(**kwargs):
+            attempts.append(kwargs["model"])
+            if len(attempts) == 1:
+                raise overload_error(429, retry_after="2")
+            return SimpleNamespace(text="hello", segments=[], language="en")
+
+        transcriptions = SimpleNamespace(create=create)
+        client = SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions))
+        service = TranscriptionService(client=client)
+        service.limiter = RateLimiter("openai:whisper-1", sleep=clock.sleep)
+
+        result = await service.transcribe_audio(audio)
+
+        assert result["text"] == "hello"
+        assert len(attempts) == 2
+        assert clock.sleeps == [2.0]
+
+    async def test_services_share_one_limiter(self, monkeypatch):
+        """Test per-task services share the loop's limiter and its learned window."""
+        monkeypatch.setattr(settings, "llm_rate_limit_enabled", True)
+        first = TranscriptionService(client=None)
+        first.limiter.concurrency.limit = 1
+
+        second = TranscriptionService(client=None)
+
+        assert second.limiter is first.limiter
+        assert second.limiter.concurrency.limit == 1
+        await aclose_rate_limiters()
+        assert TranscriptionService(client=None).limiter is not first.limiter
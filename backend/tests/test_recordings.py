@@ -0,0 +1,86 @@
+"""Tests for recording upload endpoint."""
+
+import hashlib
+import io
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api import recordings
+from app.api.deps import get_current_active_user, get_db
+from app.main import app
+from app.models.users import User, UserRole
+
+
+@pytest.fixture
+def upload_client(client, fake_db, monkeypatch):
+    """Test client with auth and database overridden and storage stubbed."""
+    user = User(
+        id=uuid4(),
+        email="staff@example.com",
+        full_name="Test Staff",
+        role=UserRole.STAFF,
+        created_at=datetime.now(UTC),
+    )
+    uploaded = {}
+
+    async def fake_upload_stream(bucket, storage_path, chunks, total_size, content_type):
+        parts = [chunk async for chunk in chunks]
+        uploaded.update(
+            path=storage_path, size=total_size, parts=parts, content_type=content_type
+        )
+        return sum(len(p) for p in parts)
+
+    monkeypatch.setattr(recordings, "upload_stream", fake_upload_stream)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+    client.uploaded = uploaded
+    yield client
+    app.dependency_overrides.clear()
+
+
+class TestUploadRecording:
+    """Tests for streaming uploads."""
+
+    def test_upload_streams_and_hashes(self, upload_client, fake_db):
+        """Test the upload is forwarded in chunks and its hash recorded."""
+        content = b"\x01\x02" * (recordings.UPLOAD_READ_SIZE + 10)
+        response = upload_client.post(
+            f"/api/v1/recordings/upload/{uuid4()}",
+            files={"file": ("visit.wav", content, "audio/wav")},
+        )
+
+        assert response.status_code == 201
+        body = response.json()
+        assert body["content_hash"] == hashlib.sha256(content).hexdigest()
+        assert body["file_size"] == len(content)
+        assert len(upload_client.uploaded["parts"]) == 3
+        assert b"".join(upload_client.uploaded["parts"]) == content
+        assert fake_db.tables["recordings"][0]["content_hash"] == body["content_hash"]
+
+    def test_oversized_upload_rejected(self, upload_client, monkeypatch):
+        """Test uploads over the limit are rejected without reaching storage."""
+        monkeypatch.setattr(recordings.settings, "max_upload_size_mb", 1)
+        response = upload_client.post(
+            f"/api/v1/recordings/upload/{uuid4()}",
+            files={"file": ("visit.wav", b"0" * (2 * 1024 * 1024), "audio/wav")},
+        )
+
+        assert response.status_code == 413
+        assert upload_client.uploaded == {}
+
+    async def test_limit_enforced_while_streaming(self):
+        """Test the size limit is enforced chunk by chunk even if the size was wrong."""
+        upload = UploadFile(io.BytesIO(b"x" * (3 * recordings.UPLOAD_READ_SIZE)), size=10)
+        received = []
+
+        with pytest.raises(HTTPException) as exc_info:
+            async for chunk in recordings._read_upload(
+                upload, recordings.UPLOAD_READ_SIZE + 1, hashlib.sha256()
+            ):
+                received.append(chunk)
+
+        assert exc_info.value.status_code == 413
+        assert len(received) == 1
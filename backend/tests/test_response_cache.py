@@ -0,0 +1,174 @@
+"""Tests for the LLM response cache."""
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.core.cache import LRUCache
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+from app.services.llm import response_cache
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.llm.response_cache import (
+    CachedProvider,
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+    response_cache_allowed,
+)
+
+
+class CountingProvider(BaseLLMProvider):
+    """Provider that numbers its responses so repeats are detectable."""
+
+    name = "counting"
+    model = "counting-1"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        return AnalysisResult()
+
+    async def generate_note(self, transcript, template, analysis=None):
+        self.calls += 1
+        return f"note {self.calls}"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        self.calls += 1
+        return f"completion {self.calls}"
+
+
+class BrokenBackend:
+    """Backend whose storage is unreachable."""
+
+    name = "broken"
+
+    async def get(self, key):
+        raise ConnectionError("cache unavailable")
+
+    async def set(self, key, value):
+        raise ConnectionError("cache unavailable")
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def cached():
+    """A counting provider behind an in-memory response cache."""
+    metrics.reset()
+    inner = CountingProvider()
+    return CachedProvider(inner, ResponseCache(MemoryBackend(LRUCache(16))))
+
+
+class TestCachedProvider:
+    """Tests for serving repeated requests from the cache."""
+
+    async def test_identical_completion_is_served_from_cache(self, cached):
+        """Test a repeated request does not reach the provider."""
+        first = await cached.complete("Summarize", system_prompt="Be brief")
+        second = await cached.complete("Summarize", system_prompt="Be brief")
+
+        assert first == second == "completion 1"
+        assert cached.provider.calls == 1
+        assert cached.cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert metrics.get("llm_response_cache_hits", backend="memory") == 1
+
+    async def test_request_parameters_are_part_of_key(self, cached):
+        """Test a different prompt, system prompt or temperature misses."""
+        await cached.complete("Summarize", system_prompt="Be brief")
+        await cached.complete("Summarize", system_prompt="Be thorough")
+        await cached.complete("Summarize", system_prompt="Be brief", temperature=0.0)
+        await cached.complete("Summarize differently", system_prompt="Be brief")
+
+        assert cached.provider.calls == 4
+
+    async def test_notes_are_cached(self, cached):
+        """Test single and batched note generation reuse identical requests."""
+        assert await cached.generate_note("transcript", "SOAP") == "note 1"
+        assert await cached.generate_note("transcript", "SOAP") == "note 1"
+        assert await cached.generate_note("transcript", "Referral") == "note 2"
+
+        templates = {"a": "SOAP", "b": "Referral"}
+        await cached.generate_notes("transcript", templates)
+        calls = cached.provider.calls
+        await cached.generate_notes("transcript", templates)
+
+        assert cached.provider.calls == calls
+
+    async def test_backend_failure_is_a_miss(self):
+        """Test an unreachable backend falls through to the provider."""
+        cached = CachedProvider(CountingProvider(), ResponseCache(BrokenBackend()))
+
+        assert await cached.complete("Summarize") == "completion 1"
+        assert await cached.complete("Summarize") == "completion 2"
+
+
+class TestBackends:
+    """Tests for the storage backends."""
+
+    async def test_sqlite_persists_across_instances(self, tmp_path):
+        """Test responses survive a new backend on the same file."""
+        path = tmp_path / "cache" / "llm.sqlite3"
+        await SQLiteBackend(path, ttl_seconds=60).set("k", "response")
+
+        assert await SQLiteBackend(path, ttl_seconds=60).get("k") == "response"
+
+    async def test_sqlite_entries_expire(self, tmp_path):
+        """Test entries past their TTL are not returned."""
+        backend = SQLiteBackend(tmp_path / "llm.sqlite3", ttl_seconds=-1)
+        await backend.set("k", "response")
+
+        assert await backend.get("k") is None
+
+    async def test_encrypted_at_rest(self):
+        """Test the backend only ever sees ciphertext when a key is set."""
+        lru = LRUCache(4)
+        cache = ResponseCache(MemoryBackend(lru), Fernet.generate_key().decode())
+
+        await cache.set("k", "Patient reports pain in tooth 19")
+
+        stored = lru.get("k")
+        assert "tooth 19" not in stored
+        assert await cache.get("k") == "Patient reports pain in tooth 19"
+
+
+class TestPHIGuard:
+    """Tests for disabling the cache in PHI-sensitive deployments."""
+
+    @pytest.fixture
+    def cache_settings(self, monkeypatch):
+        settings = response_cache.settings
+        monkeypatch.setattr(settings, "llm_response_cache_enabled", True)
+        monkeypatch.setattr(settings, "llm_response_cache_encryption_key", "")
+        monkeypatch.setattr(settings, "phi_sensitive", True)
+        return settings
+
+    def test_phi_deployment_requires_encryption_key(self, cache_settings, monkeypatch):
+        """Test the cache stays off for PHI until a key is configured."""
+        assert not response_cache_allowed()
+
+        monkeypatch.setattr(
+            cache_settings, "llm_response_cache_encryption_key", Fernet.generate_key().decode()
+        )
+        assert response_cache_allowed()
+
+    def test_non_phi_deployment_may_cache_plaintext(self, cache_settings, monkeypatch):
+        """Test deployments without PHI can cache without a key."""
+        monkeypatch.setattr(cache_settings, "phi_sensitive", False)
+        assert response_cache_allowed()
+
+        monkeypatch.setattr(cache_settings, "llm_response_cache_enabled", False)
+        assert not response_cache_allowed()
+
+    def test_factory_wraps_providers_when_allowed(self, cache_settings, monkeypatch):
+        """Test providers from the factory are cached only when allowed."""
+        monkeypatch.setattr(cache_settings, "llm_rate_limit_enabled", False)
+        LLMProviderFactory.register("counting", CountingProvider)
+
+        assert isinstance(LLMProviderFactory.get_provider("counting"), CountingProvider)
+
+        monkeypatch.setattr(cache_settings, "phi_sensitive", False)
+        provider = LLMProviderFactory.get_provider("counting")
+        assert isinstance(provider, CachedProvider)
+        assert isinstance(provider.provider, CountingProvider)
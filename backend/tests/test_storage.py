@@ -0,0 +1,144 @@
+"""Tests for streaming storage access."""
+
+import tracemalloc
+
+import httpx
+import pytest
+
+from app.services.storage import download_to_file, object_url, upload_stream
+
+
+class ChunkedBody(httpx.AsyncByteStream):
+    """Response body generated on the fly so the test never holds it in memory."""
+
+    def __init__(self, total: int, piece: int = 64 * 1024):
+        self.total = total
+        self.piece = piece
+
+    async def __aiter__(self):
+        sent = 0
+        while sent < self.total:
+            size = min(self.piece, self.total - sent)
+            yield b"a" * size
+            sent += size
+
+
+def storage_client(total: int, status_code: int = 200) -> httpx.AsyncClient:
+    """Client whose transport serves a body of `total` bytes."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path.startswith("/storage/v1/object/recordings/")
+        return httpx.Response(status_code, stream=ChunkedBody(total))
+
+    return httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="https://example.supabase.co"
+    )
+
+
+def test_object_url_encodes_path(monkeypatch):
+    """Test file names with spaces or reserved characters form a valid URL."""
+    from app.services import storage
+
+    monkeypatch.setattr(storage.settings, "supabase_url", "https://example.supabase.co/")
+
+    url = object_url("recordings", "practice/visit #2 (50%).wav")
+
+    assert url == (
+        "https://example.supabase.co/storage/v1/object/recordings/"
+        "practice/visit%20%232%20%2850%25%29.wav"
+    )
+
+
+class TestDownloadToFile:
+    """Tests for streaming downloads."""
+
+    async def test_writes_full_object(self, tmp_path):
+        """Test the whole object lands on disk."""
+        dest = tmp_path / "audio.mp3"
+        async with storage_client(3 * 1024 * 1024 + 17) as client:
+            written = await download_to_file(
+                "recordings", "a/b/audio.mp3", dest, chunk_size=256 * 1024, client=client
+            )
+
+        assert written == 3 * 1024 * 1024 + 17
+        assert dest.stat().st_size == written
+
+    async def test_memory_bounded_by_chunk_size(self, tmp_path):
+        """Test peak memory does not grow with the size of the recording."""
+        chunk_size = 256 * 1024
+        async with storage_client(32 * 1024 * 1024) as client:
+            tracemalloc.start()
+            await download_to_file(
+                "recordings", "a/b/long.wav", tmp_path / "long.wav",
+                chunk_size=chunk_size, client=client,
+            )
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        assert peak < 8 * chunk_size
+
+    async def test_http_error_raises(self, tmp_path):
+        """Test a failed download raises instead of writing an empty file."""
+        async with storage_client(10, status_code=404) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await download_to_file("recordings", "missing.wav", tmp_path / "x", client=client)
+
+
+class TestUploadStream:
+    """Tests for resumable uploads."""
+
+    async def test_parts_are_fixed_size(self):
+        """Test chunks are regrouped into fixed-size PATCH requests with offsets."""
+        patches = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.method == "POST":
+                assert request.headers["Upload-Length"] == "25"
+                assert "bucketName" in request.headers["Upload-Metadata"]
+                return httpx.Response(201, headers={"Location": "https://s/upload/abc"})
+            assert request.method == "PATCH"
+            offset = int(request.headers["Upload-Offset"])
+            patches.append((offset, request.content))
+            return httpx.Response(
+                204, headers={"Upload-Offset": str(offset + len(request.content))}
+            )
+
+        async def chunks():
+            for piece in (b"abc", b"defghijk", b"lmnopqrstuvwxy", b""):
+                yield piece
+
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="https://example.supabase.co"
+        ) as client:
+            uploaded = await upload_stream(
+                "recordings", "a/b.wav", chunks(), total_size=25,
+                content_type="audio/wav", part_size=10, client=client,
+            )
+
+        assert uploaded == 25
+        assert [offset for offset, _ in patches] == [0, 10, 20]
+        assert [len(part) for _, part in patches] == [10, 10, 5]
+
+    async def test_failed_stream_cancels_upload(self):
+        """Test the partial upload is deleted when the source stream fails."""
+        methods = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            methods.append(request.method)
+            if request.method == "POST":
+                return httpx.Response(201, headers={"Location": "https://s/upload/abc"})
+            return httpx.Response(204, headers={"Upload-Offset": "4"})
+
+        async def chunks():
+            yield b"abcd"
+            raise ValueError("too large")
+
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="https://example.supabase.co"
+        ) as client:
+            with pytest.raises(ValueError):
+                await upload_stream(
+                    "recordings", "a/b.wav", chunks(), total_size=100,
+                    content_type="audio/wav", part_size=4, client=client,
+                )
+
+        assert methods == ["POST", "PATCH", "DELETE"]
@@ -0,0 +1,201 @@
+"""Tests for schema-constrained transcript analysis."""
+
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core.metrics import metrics
+from app.models.notes import AnalysisResult
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.anthropic_provider import AnthropicProvider
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.llm.ollama_provider import OllamaProvider
+from app.services.llm.openai_provider import OpenAIProvider
+from app.services.llm.structured import (
+    ANALYSIS_TOOL_NAME,
+    AnalysisParseError,
+    analysis_schema,
+    parse_analysis,
+)
+from app.services.note_generator import NoteGeneratorService
+
+ANALYSIS = {
+    "chief_complaint": "Toothache",
+    "procedures": ["Composite filling #19"],
+    "findings": ["Caries on #19"],
+    "recommendations": ["Floss daily"],
+    "summary": "Filling placed.",
+}
+
+
+def make_provider(provider_class, client, model):
+    """Build a provider around a fake SDK client without real credentials."""
+    provider = provider_class.__new__(provider_class)
+    provider.model = model
+    provider.client = client
+    return provider
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestAnalysisSchema:
+    """Tests for the schema derived from AnalysisResult."""
+
+    def test_schema_is_strict(self):
+        """Test every model-produced field is required and nothing else is allowed."""
+        schema = analysis_schema()
+
+        assert schema["required"] == list(schema["properties"])
+        model_fields = set(AnalysisResult.model_fields) - {"entities", "variables"}
+        assert set(schema["properties"]) == model_fields
+        assert schema["additionalProperties"] is False
+        assert "title" not in json.dumps(schema)
+        assert "default" not in json.dumps(schema)
+
+
+class TestParseAnalysis:
+    """Tests for the shared analysis parser."""
+
+    def test_builds_entities(self):
+        """Test entities are derived from the extracted lists."""
+        analysis = parse_analysis(ANALYSIS, "anthropic")
+
+        assert analysis.chief_complaint == "Toothache"
+        assert [(e.entity_type, e.value) for e in analysis.entities] == [
+            ("procedure", "Composite filling #19"),
+            ("finding", "Caries on #19"),
+            ("recommendation", "Floss daily"),
+        ]
+        assert metrics.get("llm_analyses", provider="anthropic") == 1
+
+    def test_accepts_fenced_json_text(self):
+        """Test JSON text inside a markdown code block is decoded."""
+        analysis = parse_analysis(f"```json\n{json.dumps(ANALYSIS)}\n```", "ollama")
+
+        assert analysis.procedures == ["Composite filling #19"]
+
+    @pytest.mark.parametrize(
+        "raw",
+        ["not json", None, ["a list"], {"procedures": "not a list"}],
+    )
+    def test_failures_raise_and_are_counted(self, raw):
+        """Test malformed output raises instead of becoming an empty analysis."""
+        with pytest.raises(AnalysisParseError):
+            parse_analysis(raw, "openai")
+
+        assert metrics.get("llm_analysis_parse_failures", provider="openai") == 1
+        assert metrics.get("llm_analyses", provider="openai") == 1
+
+
+class TestProviderRequests:
+    """Tests that each provider asks for schema-constrained output."""
+
+    async def test_anthropic_forces_strict_tool(self):
+        """Test Claude must answer through the schema-checked analysis tool."""
+        requests = []
+
+        async def create(**kwargs):
+            requests.append(kwargs)
+            block = SimpleNamespace(type="tool_use", input=ANALYSIS)
+            return SimpleNamespace(content=[block], usage=None)
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        provider = make_provider(AnthropicProvider, client, "claude-test")
+
+        analysis = await provider.analyze_transcript("Patient has a toothache.")
+
+        (tool,) = requests[0]["tools"]
+        assert tool["name"] == ANALYSIS_TOOL_NAME
+        assert tool["input_schema"] == analysis_schema()
+        assert tool["strict"] is True
+        assert requests[0]["tool_choice"] == {"type": "tool", "name": ANALYSIS_TOOL_NAME}
+        assert analysis.findings == ["Caries on #19"]
+
+    async def test_anthropic_note_without_text_rejected(self):
+        """Test notes are requested without tools and an empty answer is not saved."""
+        requests = []
+
+        async def create(**kwargs):
+            requests.append(kwargs)
+            block = SimpleNamespace(type="tool_use", input=ANALYSIS)
+            return SimpleNamespace(content=[block], stop_reason="tool_use", usage=None)
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        provider = make_provider(AnthropicProvider, client, "claude-test")
+
+        with pytest.raises(ValueError):
+            await provider.generate_note("Patient has a toothache.", "SOAP")
+        assert "tools" not in requests[0]
+
+    async def test_openai_uses_strict_json_schema(self):
+        """Test GPT is constrained to the analysis JSON schema."""
+        requests = []
+
+        async def create(**kwargs):
+            requests.append(kwargs)
+            message = SimpleNamespace(content=json.dumps(ANALYSIS))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        provider = make_provider(OpenAIProvider, client, "gpt-test")
+
+        analysis = await provider.analyze_transcript("Patient has a toothache.")
+
+        response_format = requests[0]["response_format"]
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["strict"] is True
+        assert response_format["json_schema"]["schema"] == analysis_schema()
+        assert analysis.summary == "Filling placed."
+
+    async def test_ollama_sends_schema_as_format(self):
+        """Test Ollama's output is constrained with the analysis schema."""
+        payloads = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={"response": json.dumps(ANALYSIS), "done": True})
+
+        provider = OllamaProvider()
+        provider.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        analysis = await provider.analyze_transcript("Patient has a toothache.")
+
+        assert payloads[0]["format"] == analysis_schema()
+        assert analysis.chief_complaint == "Toothache"
+        await provider.aclose()
+
+
+class MalformedProvider(BaseLLMProvider):
+    """Provider whose analysis never matches the schema."""
+
+    name = "malformed"
+    model = "malformed-1"
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        return parse_analysis("Sorry, I can't help with that.", self.name)
+
+    async def generate_note(self, transcript, template, analysis=None):
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        return prompt
+
+
+async def test_malformed_analysis_is_not_stored(fake_db):
+    """Test a failed parse still yields a note but leaves no stored analysis."""
+    LLMProviderFactory.register("malformed", MalformedProvider)
+    service = NoteGeneratorService("malformed", analysis_store=AnalysisStore(fake_db))
+
+    note, analysis = await service.generate("Patient has a toothache.", "SOAP")
+
+    assert note == "note"
+    assert analysis["chief_complaint"] is None
+    assert fake_db.tables.get("transcript_analyses", []) == []
+    assert metrics.get("llm_analysis_parse_failures", provider="malformed") == 1
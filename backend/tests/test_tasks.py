@@ -0,0 +1,167 @@
+"""Tests for Celery task workflows."""
+
+from unittest import mock
+
+import pytest
+from celery.canvas import _chain
+
+from app.workers import tasks
+
+
+@pytest.fixture
+def make_appointment(fake_db, monkeypatch):
+    """Factory for an appointment with uploaded recordings and templates."""
+    monkeypatch.setattr("app.db.client.get_supabase_client", lambda: fake_db)
+
+    def make(recordings: int = 2, templates: int = 2) -> str:
+        template_ids = [
+            fake_db.table("templates").insert({"content": f"T{i}"}).execute().data[0]["id"]
+            for i in range(templates)
+        ]
+        appointment = fake_db.table("appointments").insert(
+            {"template_ids": template_ids, "status": "in_progress"}
+        ).execute().data[0]
+        for _ in range(recordings):
+            fake_db.table("recordings").insert(
+                {"appointment_id": appointment["id"], "status": "uploaded"}
+            ).execute()
+        return appointment["id"]
+
+    return make
+
+
+def job(transcript_id, recording_id, needs_transcription, notes=None):
+    return {
+        "transcript_id": transcript_id,
+        "recording_id": recording_id,
+        "needs_transcription": needs_transcription,
+        "notes": notes or [["n1", "T"]],
+    }
+
+
+class TestAppointmentWorkflow:
+    """Tests for the appointment chord."""
+
+    def test_workflow_chains_transcription_before_notes(self):
+        """Test pending recordings transcribe before their notes are generated."""
+        workflow = tasks.build_appointment_workflow(
+            "appt", "user", [job("tr1", "rec1", True), job("tr2", "rec2", False)]
+        )
+
+        header = list(workflow.tasks)
+        assert isinstance(header[0], _chain)
+        assert [t.task for t in header[0].tasks] == [
+            tasks.transcribe_recording_task.name,
+            tasks.generate_transcript_notes_task.name,
+        ]
+        assert header[1].task == tasks.generate_transcript_notes_task.name
+        assert workflow.body.task == tasks.complete_appointment_task.name
+
+    def test_notes_batched_per_transcript(self, monkeypatch):
+        """Test notes are split into batches of llm_batch_max_templates."""
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "llm_batch_generation", True)
+        monkeypatch.setattr(settings, "llm_batch_max_templates", 2)
+        notes = [["n1", "A"], ["n2", "B"], ["n3", "C"]]
+
+        sigs = tasks.note_generation_signatures("transcript", notes)
+
+        assert [s.task for s in sigs] == [tasks.generate_notes_batch_task.name] * 2
+        assert [s.args[1] for s in sigs] == [notes[:2], notes[2:]]
+
+    def test_batching_disabled_generates_per_note(self, monkeypatch):
+        """Test each note gets its own task when batching is off."""
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "llm_batch_generation", False)
+        sigs = tasks.note_generation_signatures("transcript", [["n1", "A"], ["n2", "B"]])
+
+        assert [s.task for s in sigs] == [tasks.generate_note_task.name] * 2
+
+    def test_process_appointment_launches_workflow_without_waiting(
+        self, make_appointment, fake_db
+    ):
+        """Test processing queues the workflow instead of retrying until transcripts exist."""
+        appointment_id = make_appointment()
+        with mock.patch.object(tasks, "build_appointment_workflow") as build:
+            build.return_value.apply_async.return_value.id = "workflow-1"
+            result = tasks.process_appointment_task.run(appointment_id, "user-1")
+
+        assert result["workflow_id"] == "workflow-1"
+        assert result["notes_queued"] == 4
+        jobs = build.call_args.args[2]
+        assert len(jobs) == 2
+        assert all(j["needs_transcription"] for j in jobs)
+        assert len(fake_db.tables["transcripts"]) == 2
+
+    def test_complete_appointment_marks_completed(self, make_appointment, fake_db):
+        """Test the chord body marks the appointment completed."""
+        appointment_id = make_appointment()
+        tasks.complete_appointment_task.run(appointment_id, "user-1", 2)
+
+        row = fake_db.table("appointments").select("*").eq("id", appointment_id).single().execute()
+        assert row.data["status"] == "completed"
+
+
+class TestPlanAppointment:
+    """Tests for creating transcript and note records in bulk."""
+
+    def test_creates_note_per_transcript_and_template(self, make_appointment, fake_db):
+        """Test every transcript x template pair gets a note record."""
+        jobs = tasks.plan_appointment(fake_db, make_appointment(recordings=4, templates=3))
+
+        assert len(jobs) == 4
+        assert all(len(j["notes"]) == 3 for j in jobs)
+        assert len(fake_db.tables["clinical_notes"]) == 12
+
+    def test_round_trips_are_constant(self, make_appointment, fake_db):
+        """Test the number of queries does not grow with recordings or templates."""
+        counts = []
+        for recordings, templates in ((1, 1), (4, 3), (8, 5)):
+            appointment_id = make_appointment(recordings=recordings, templates=templates)
+            before = fake_db.executed
+            tasks.plan_appointment(fake_db, appointment_id)
+            counts.append(fake_db.executed - before)
+
+        assert len(set(counts)) == 1
+        assert counts[0] == 7
+
+    def test_rerun_skips_existing_notes(self, make_appointment, fake_db):
+        """Test planning again does not duplicate transcripts or notes."""
+        appointment_id = make_appointment(recordings=2, templates=2)
+        tasks.plan_appointment(fake_db, appointment_id)
+        for note in fake_db.tables["clinical_notes"]:
+            note.update({"generated_content": "note", "status": "generated"})
+        jobs = tasks.plan_appointment(fake_db, appointment_id)
+
+        assert all(j["notes"] == [] for j in jobs)
+        assert len(fake_db.tables["transcripts"]) == 2
+        assert len(fake_db.tables["clinical_notes"]) == 4
+
+    def test_rerun_regenerates_errored_drafts(self, make_appointment, fake_db):
+        """Test a retry picks up a draft whose generation failed."""
+        appointment_id = make_appointment(recordings=1, templates=2)
+        tasks.plan_appointment(fake_db, appointment_id)
+        failed, generated = fake_db.tables["clinical_notes"]
+        failed["generated_content"] = "Error generating note: provider unavailable"
+        generated.update({"generated_content": "note", "status": "generated"})
+
+        (job,) = tasks.plan_appointment(fake_db, appointment_id)
+
+        assert [note_id for note_id, _ in job["notes"]] == [failed["id"]]
+
+    def test_rerun_regenerates_empty_drafts(self, make_appointment, fake_db):
+        """Test a retry picks up the drafts a failed run left without content."""
+        appointment_id = make_appointment(recordings=2, templates=2)
+        first = tasks.plan_appointment(fake_db, appointment_id)
+        fake_db.tables["clinical_notes"][0].update(
+            {"generated_content": "note", "status": "generated"}
+        )
+
+        retry = tasks.plan_appointment(fake_db, appointment_id)
+
+        planned = sorted(note_id for job in first for note_id, _ in job["notes"])
+        retried = sorted(note_id for job in retry for note_id, _ in job["notes"])
+        assert retried == [n for n in planned if n != fake_db.tables["clinical_notes"][0]["id"]]
+        assert len(fake_db.tables["clinical_notes"]) == 4
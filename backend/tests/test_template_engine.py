@@ -3,6 +3,7 @@
 import pytest
 
 from app.models.notes import AnalysisResult
+from app.models.templates import TemplateVariable
 from app.services.template_engine import TemplateEngine, DEFAULT_TEMPLATES
 
 
@@ -183,6 +184,58 @@ class TestVariableExtraction:
         variables = engine.extract_variables(template)
         assert variables.count("name") == 1
 
+    def test_extract_attribute_access_and_filter_arguments(self, engine):
+        """Test names used through attributes and as filter arguments are found."""
+        template = "{{ patient.name }} {{ notes | default(fallback_notes) | truncate(limit) }}"
+        variables = engine.extract_variables(template)
+        assert variables == ["patient", "notes", "fallback_notes", "limit"]
+
+    def test_extract_elif_and_nested_loops(self, engine):
+        """Test elif conditions and inner loop sources are found, loop variables are not."""
+        template = """
+        {% if urgent %}Urgent{% elif routine %}Routine{% endif %}
+        {% for visit in visits %}
+          {% for tooth in visit.teeth %}{{ tooth }} {{ charting_system }}{% endfor %}
+        {% endfor %}
+        """
+        variables = engine.extract_variables(template)
+        assert variables == ["urgent", "routine", "visits", "charting_system"]
+
+    def test_extract_skips_names_the_template_sets(self, engine):
+        """Test set blocks report their inputs, not the names they assign."""
+        template = "{% set heading = title | upper %}{{ heading }}: {{ body }}"
+        variables = engine.extract_variables(template)
+        assert variables == ["title", "body"]
+
+    def test_extract_memoized(self, engine, monkeypatch):
+        """Test a template is parsed once however often its variables are read."""
+        parsed = []
+        parse_template = engine.env.parse
+
+        def counting_parse(source, *args, **kwargs):
+            parsed.append(source)
+            return parse_template(source, *args, **kwargs)
+
+        monkeypatch.setattr(engine.env, "parse", counting_parse)
+        for _ in range(3):
+            assert engine.extract_variables("{{ a }}{{ b }}") == ["a", "b"]
+        assert len(parsed) == 1
+
+    def test_extract_syntax_error(self, engine):
+        """Test an unparseable template raises ValueError."""
+        with pytest.raises(ValueError, match="Template syntax error"):
+            engine.extract_variables("{% if unclosed %}")
+
+    def test_declare_variables_keeps_definitions(self, engine):
+        """Test declared definitions are kept for used names and others added."""
+        declared = [
+            TemplateVariable(name="assessment", description="Diagnosis", required=True),
+            TemplateVariable(name="removed", description="No longer in the template"),
+        ]
+        variables = engine.declare_variables("{{ date }} {{ assessment }}", declared)
+        assert [v.name for v in variables] == ["date", "assessment"]
+        assert variables[1].required is True
+
 
 class TestBuildVariablesFromAnalysis:
     """Tests for building template variables from analysis results."""
@@ -256,6 +309,43 @@ class TestSyntaxErrors:
             engine.render(template, {"x": True})
 
 
+class TestCompiledTemplateCache:
+    """Tests for reusing compiled templates."""
+
+    def test_template_compiled_once(self, engine, monkeypatch):
+        """Test repeated renders of one template compile it a single time."""
+        compiled = []
+        compile_template = engine.env.compile
+
+        def counting_compile(source, *args, **kwargs):
+            compiled.append(source)
+            return compile_template(source, *args, **kwargs)
+
+        monkeypatch.setattr(engine.env, "compile", counting_compile)
+
+        for name in ("Alice", "Bob", "Carol"):
+            assert engine.render("Hello {{ name }}!", {"name": name}) == f"Hello {name}!"
+
+        assert len(compiled) == 1
+        assert engine.templates.stats()["hits"] == 2
+
+    def test_edited_template_recompiled(self, engine):
+        """Test edited content is compiled rather than served stale."""
+        assert engine.render("v1 {{ x }}", {"x": 1}) == "v1 1"
+        assert engine.render("v2 {{ x }}", {"x": 1}) == "v2 1"
+        assert engine.render("v1 {{ x }}", {"x": 2}) == "v1 2"
+        assert len(engine.templates) == 2
+
+    def test_cache_is_bounded(self):
+        """Test the least recently used template is evicted."""
+        engine = TemplateEngine(max_templates=2)
+        for i in range(3):
+            engine.render(f"{i} {{{{ x }}}}", {"x": i})
+
+        assert len(engine.templates) == 2
+        assert engine.templates.stats()["evictions"] == 1
+
+
 class TestDefaultTemplates:
     """Tests for default template definitions."""
 
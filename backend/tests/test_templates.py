@@ -0,0 +1,94 @@
+"""Tests for template endpoints."""
+
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+
+from app.api.deps import get_current_active_user, get_db
+from app.main import app
+from app.models.users import User, UserRole
+
+
+@pytest.fixture
+def templates_client(client, fake_db):
+    """Test client with auth and database overridden."""
+    user = User(
+        id=uuid4(),
+        email="dentist@example.com",
+        full_name="Test Dentist",
+        role=UserRole.DENTIST,
+        created_at=datetime.now(UTC),
+    )
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+    yield client
+    app.dependency_overrides.clear()
+
+
+def create(client, content: str, variables: list[dict] | None = None) -> dict:
+    response = client.post(
+        "/api/v1/templates/",
+        json={"name": "Exam", "content": content, "variables": variables or []},
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestTemplateVariables:
+    """Tests for storing template variables when templates are written."""
+
+    def test_create_stores_extracted_variables(self, templates_client, fake_db):
+        """Test the variables a template uses are stored with declared details kept."""
+        template = create(
+            templates_client,
+            "{{ patient.name }}: {% for p in procedures %}{{ p }}{% endfor %}",
+            [{"name": "procedures", "description": "Procedures performed", "required": True}],
+        )
+
+        assert [v["name"] for v in template["variables"]] == ["patient", "procedures"]
+        assert fake_db.tables["templates"][0]["variables"][1]["description"] == (
+            "Procedures performed"
+        )
+
+    def test_create_rejects_invalid_template(self, templates_client):
+        """Test a template that does not parse is rejected."""
+        response = templates_client.post(
+            "/api/v1/templates/", json={"name": "Broken", "content": "{% if x %}"}
+        )
+
+        assert response.status_code == 400
+        assert "Template syntax error" in response.json()["detail"]
+
+    def test_content_update_recomputes_variables(self, templates_client, fake_db):
+        """Test editing content refreshes variables, keeps definitions and bumps the version."""
+        template = create(
+            templates_client,
+            "{{ assessment }}",
+            [{"name": "assessment", "description": "Diagnosis"}],
+        )
+        fake_db.tables["templates"][0]["version"] = 1
+
+        response = templates_client.patch(
+            f"/api/v1/templates/{template['id']}",
+            json={"content": "{{ assessment }} {% if urgent %}URGENT{% endif %}"},
+        )
+
+        updated = response.json()
+        assert [v["name"] for v in updated["variables"]] == ["assessment", "urgent"]
+        assert updated["variables"][0]["description"] == "Diagnosis"
+        assert updated["version"] == 2
+
+    def test_reads_do_not_parse(self, templates_client, monkeypatch):
+        """Test stored variables are returned without extracting them again."""
+        from app.services.template_engine import TemplateEngine
+
+        template = create(templates_client, "{{ date }}")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("variables recomputed on read")
+
+        monkeypatch.setattr(TemplateEngine, "extract_variables", fail)
+        response = templates_client.get(f"/api/v1/templates/{template['id']}")
+
+        assert [v["name"] for v in response.json()["variables"]] == ["date"]
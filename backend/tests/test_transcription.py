@@ -0,0 +1,442 @@
+"""Tests for transcription service."""
+
+import asyncio
+import math
+import time
+import wave
+from array import array
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.audio import find_split_points, split_on_silence
+from app.services.transcription import TranscriptionService
+
+SAMPLE_RATE = 8000
+
+
+def write_wav(path: Path, pattern: list[tuple[str, float]]) -> Path:
+    """Write a mono 16-bit WAV built from ('tone'|'silence', seconds) parts."""
+    samples = array("h")
+    for kind, seconds in pattern:
+        count = int(seconds * SAMPLE_RATE)
+        if kind == "tone":
+            samples.extend(
+                int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE)) for i in range(count)
+            )
+        else:
+            samples.extend([0] * count)
+
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return path
+
+
+class StubWhisperClient:
+    """Stand-in for the async OpenAI client that records calls and sleeps per request."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, file, language, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        with wave.open(str(file), "rb") as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        name = Path(file).stem
+        return SimpleNamespace(
+            text=f" {name} ",
+            segments=[{"start": 0.0, "end": duration, "text": name}],
+            language=language,
+        )
+
+
+@pytest.fixture
+def long_recording(tmp_path):
+    """Four 3-second utterances separated by one second of silence."""
+    pattern = []
+    for _ in range(4):
+        pattern += [("tone", 3.0), ("silence", 1.0)]
+    return write_wav(tmp_path / "appointment.wav", pattern)
+
+
+class TestSplitPoints:
+    """Tests for choosing chunk boundaries."""
+
+    def test_no_split_when_short(self):
+        """Test that short audio is not split."""
+        cuts = find_split_points(
+            [0.5] * 10, max_windows=20, min_silence_windows=2, threshold=0.1
+        )
+        assert cuts == []
+
+    def test_split_prefers_silence(self):
+        """Test cuts land in the middle of a silent run."""
+        levels = [0.5] * 12 + [0.0] * 4 + [0.5] * 14
+        cuts = find_split_points(levels, max_windows=20, min_silence_windows=2, threshold=0.1)
+        assert cuts == [14]
+
+    def test_hard_cut_without_silence(self):
+        """Test audio without silence is cut at the maximum length."""
+        cuts = find_split_points([0.5] * 50, max_windows=20, min_silence_windows=2, threshold=0.1)
+        assert cuts == [20, 40]
+
+
+class TestSplitOnSilence:
+    """Tests for writing chunk files."""
+
+    def test_chunks_cover_recording(self, long_recording, tmp_path):
+        """Test chunks are contiguous and respect the maximum length."""
+        chunks = split_on_silence(long_recording, tmp_path, max_chunk_seconds=5)
+
+        assert len(chunks) == 4
+        assert chunks[0].offset_seconds == 0
+        for prev, nxt in zip(chunks, chunks[1:]):
+            assert nxt.offset_seconds == pytest.approx(prev.offset_seconds + prev.duration_seconds)
+        assert sum(c.duration_seconds for c in chunks) == pytest.approx(16.0)
+        assert all(c.duration_seconds <= 5 for c in chunks)
+
+    def test_cuts_fall_in_silence(self, long_recording, tmp_path):
+        """Test each cut lands inside a silent gap."""
+        chunks = split_on_silence(long_recording, tmp_path, max_chunk_seconds=5)
+        for chunk in chunks[1:]:
+            # Silence occupies [3, 4), [7, 8), [11, 12) seconds
+            assert chunk.offset_seconds % 4 >= 3
+
+
+class TestChunkedTranscription:
+    """Tests for chunked transcription against a stubbed Whisper client."""
+
+    async def test_offsets_are_corrected(self, long_recording):
+        """Test segment timestamps are shifted by chunk offsets."""
+        service = TranscriptionService(client=StubWhisperClient(), concurrency=2)
+        result = await service.transcribe_chunked(long_recording, max_chunk_seconds=5)
+
+        starts = [s.start_time for s in result["segments"]]
+        assert starts == sorted(starts)
+        assert starts[0] == 0
+        assert result["segments"][-1].end_time == pytest.approx(16.0)
+        assert result["text"] == "chunk_0000 chunk_0001 chunk_0002 chunk_0003"
+        assert result["language"] == "en"
+
+    async def test_concurrency_is_bounded(self, long_recording):
+        """Test no more than the configured number of chunk requests run at once."""
+        client = StubWhisperClient(delay=0.05)
+        service = TranscriptionService(client=client, concurrency=2)
+        await service.transcribe_chunked(long_recording, max_chunk_seconds=5)
+
+        assert client.calls == 4
+        assert client.max_in_flight == 2
+
+    async def test_wall_time_scales_with_concurrency(self, long_recording):
+        """Test more concurrency finishes a long recording faster."""
+        timings = {}
+        for concurrency in (1, 4):
+            service = TranscriptionService(
+                client=StubWhisperClient(delay=0.1), concurrency=concurrency
+            )
+            start = time.perf_counter()
+            await service.transcribe_chunked(long_recording, max_chunk_seconds=5)
+            timings[concurrency] = time.perf_counter() - start
+
+        assert timings[4] < timings[1] / 2
+
+    async def test_short_recording_uses_single_request(self, tmp_path):
+        """Test audio under the chunk length is sent in one request."""
+        path = write_wav(tmp_path / "short.wav", [("tone", 2.0)])
+        client = StubWhisperClient()
+        service = TranscriptionService(client=client)
+
+        result = await service.transcribe(path)
+
+        assert client.calls == 1
+        assert result["text"].strip() == "short"
+
+    async def test_high_rate_wav_resampled_before_splitting(self, tmp_path, monkeypatch):
+        """Test WAV audio that is not 16 kHz mono is converted before it is split."""
+        from app.services import transcription
+
+        stereo = tmp_path / "stereo.wav"
+        with wave.open(str(stereo), "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(48000)
+            wav.writeframes(b"\0\0" * 2 * 48000)
+        converted = []
+
+        def convert(source, dest):
+            converted.append(Path(source))
+            return write_wav(Path(dest), [("tone", 3.0), ("silence", 1.0), ("tone", 3.0)])
+
+        monkeypatch.setattr(transcription, "convert_to_wav", convert)
+        service = TranscriptionService(client=StubWhisperClient())
+
+        result = await service.transcribe_chunked(stereo, max_chunk_seconds=5)
+
+        assert converted == [stereo]
+        assert result["text"] == "chunk_0000 chunk_0001"
+
+    def test_long_compressed_recording_is_chunked(self, tmp_path, monkeypatch):
+        """Test a long recording under the size limit is chunked whatever its format."""
+        from app.services import transcription
+
+        path = tmp_path / "appointment.webm"
+        path.write_bytes(b"\0" * 1024)
+        durations = {"long": 90 * 60.0, "short": 60.0, "unknown": None}
+        service = TranscriptionService(client=StubWhisperClient())
+
+        chunked = {}
+        for name, duration in durations.items():
+            monkeypatch.setattr(transcription, "audio_duration", lambda _, d=duration: d)
+            chunked[name] = service.needs_chunking(path)
+
+        assert chunked == {"long": True, "short": False, "unknown": True}
+
+    def test_small_recording_sent_whole_without_ffprobe(self, tmp_path, monkeypatch):
+        """Test hosts without ffmpeg fall back to a single request instead of failing."""
+        from app.services import audio
+
+        path = tmp_path / "appointment.webm"
+        path.write_bytes(b"\0" * 1024)
+        monkeypatch.setattr(audio.shutil, "which", lambda name: None)
+
+        assert not TranscriptionService(client=StubWhisperClient()).needs_chunking(path)
+
+
+class TestNonBlocking:
+    """Tests that transcription does not block the event loop."""
+
+    async def test_event_loop_stays_responsive(self, long_recording):
+        """Test other coroutines keep running while a recording is transcribed."""
+        service = TranscriptionService(client=StubWhisperClient(delay=0.2), concurrency=4)
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        await service.transcribe_chunked(long_recording, max_chunk_seconds=5)
+        beat.cancel()
+
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        assert len(ticks) > 10
+        assert max(gaps) < 0.1
+
+
+class TestTranscriptCache:
+    """Tests for reusing transcripts of identical audio."""
+
+    @pytest.fixture
+    def pipeline(self, fake_db, monkeypatch):
+        """Wire process_transcription_task to the fake database and a stub transcriber."""
+        from app.core.metrics import metrics
+        from app.services import transcription
+        from app.services.checkpoints import CheckpointStore
+        from app.services.transcript_cache import TranscriptCache
+
+        calls = []
+
+        async def fake_transcribe(self, storage_path, language="en", checkpoint=None):
+            calls.append(storage_path)
+            return {"text": "patient reports pain", "segments": [], "language": language}
+
+        monkeypatch.setattr(transcription, "get_supabase_client", lambda: fake_db)
+        monkeypatch.setattr(transcription, "transcript_cache", TranscriptCache(max_entries=2))
+        monkeypatch.setattr(transcription, "get_checkpoint_store", CheckpointStore)
+        monkeypatch.setattr(
+            transcription.TranscriptionService, "transcribe_from_storage", fake_transcribe
+        )
+        metrics.reset()
+
+        def add_upload(content_hash, practice_id="practice-1"):
+            appointment = fake_db.table("appointments").insert(
+                {"practice_id": practice_id}
+            ).execute().data[0]
+            recording = fake_db.table("recordings").insert({
+                "storage_path": f"r/{len(calls)}.wav",
+                "content_hash": content_hash,
+                "appointment_id": appointment["id"],
+            }).execute().data[0]
+            transcript = fake_db.table("transcripts").insert(
+                {"recording_id": recording["id"], "status": "pending"}
+            ).execute().data[0]
+            return transcript["id"], recording["id"]
+
+        return SimpleNamespace(calls=calls, add_upload=add_upload, metrics=metrics)
+
+    async def test_duplicate_audio_reuses_transcript(self, pipeline, fake_db):
+        """Test a re-upload of the same audio does not call Whisper again."""
+        from app.services.transcription import process_transcription_task
+
+        first = pipeline.add_upload("abc123")
+        await process_transcription_task(*first)
+        second = pipeline.add_upload("abc123")
+        await process_transcription_task(*second)
+
+        assert len(pipeline.calls) == 1
+        reused = fake_db.table("transcripts").select("*").eq("id", second[0]).single().execute()
+        assert reused.data["content"] == "patient reports pain"
+        assert reused.data["status"] == "completed"
+        assert pipeline.metrics.get("transcript_cache_hits") == 1
+        assert pipeline.metrics.get("transcript_cache_misses") == 1
+
+    async def test_different_audio_is_transcribed(self, pipeline):
+        """Test different content hashes miss the cache."""
+        from app.services.transcription import process_transcription_task
+
+        await process_transcription_task(*pipeline.add_upload("abc123"))
+        await process_transcription_task(*pipeline.add_upload("def456"))
+
+        assert len(pipeline.calls) == 2
+
+    async def test_language_is_part_of_key(self, pipeline):
+        """Test the same audio in another language is transcribed again."""
+        from app.services.transcription import process_transcription_task
+
+        await process_transcription_task(*pipeline.add_upload("abc123"))
+        await process_transcription_task(*pipeline.add_upload("abc123"), language="es")
+
+        assert len(pipeline.calls) == 2
+
+    async def test_other_practice_is_transcribed(self, pipeline):
+        """Test identical audio uploaded by another practice is not served its transcript."""
+        from app.services.transcription import process_transcription_task
+
+        await process_transcription_task(*pipeline.add_upload("abc123"))
+        await process_transcription_task(*pipeline.add_upload("abc123", "practice-2"))
+        await process_transcription_task(*pipeline.add_upload("abc123", "practice-2"))
+
+        assert len(pipeline.calls) == 2
+
+    async def test_edited_transcript_not_reused(self, pipeline, fake_db):
+        """Test a clinician-corrected transcript is not served as Whisper output."""
+        from app.api.transcripts import update_transcript
+        from app.services.transcription import process_transcription_task
+
+        first = pipeline.add_upload("abc123")
+        await process_transcription_task(*first)
+        await update_transcript(
+            first[0], "corrected text", SimpleNamespace(id="user-1"), fake_db
+        )
+        second = pipeline.add_upload("abc123")
+        await process_transcription_task(*second)
+
+        assert len(pipeline.calls) == 2
+        reused = fake_db.table("transcripts").select("*").eq("id", second[0]).single().execute()
+        assert reused.data["content"] == "patient reports pain"
+
+
+class TestCheckpointedRetries:
+    """Tests for resuming transcription after a failure."""
+
+    @pytest.fixture
+    def checkpoint(self):
+        from app.services.checkpoints import CheckpointStore, JobCheckpoint
+
+        return JobCheckpoint(CheckpointStore(), "transcript:test")
+
+    async def test_retry_skips_transcribed_chunks(self, long_recording, checkpoint):
+        """Test a retry only sends the chunks the failed attempt did not finish."""
+        client = StubWhisperClient()
+        create = client.create
+
+        async def fail_on_last_chunk(model, file, language, **kwargs):
+            if Path(file).stem == "chunk_0003":
+                raise RuntimeError("network error")
+            return await create(model, file, language, **kwargs)
+
+        client.audio.transcriptions.create = fail_on_last_chunk
+        service = TranscriptionService(client=client, concurrency=1)
+        with pytest.raises(RuntimeError):
+            await service.transcribe_chunked(
+                long_recording, max_chunk_seconds=5, checkpoint=checkpoint
+            )
+        assert client.calls == 3
+
+        retry_client = StubWhisperClient()
+        service = TranscriptionService(client=retry_client)
+        result = await service.transcribe_chunked(
+            long_recording, max_chunk_seconds=5, checkpoint=checkpoint
+        )
+
+        assert retry_client.calls == 1
+        assert result["text"] == "chunk_0000 chunk_0001 chunk_0002 chunk_0003"
+        assert result["segments"][-1].end_time == pytest.approx(16.0)
+
+    async def test_retry_reuses_download(self, tmp_path, monkeypatch, checkpoint):
+        """Test the recording is downloaded once across attempts and removed after."""
+        from app.services import transcription
+
+        monkeypatch.setattr(transcription.settings, "checkpoint_dir", str(tmp_path))
+        source = write_wav(tmp_path / "source.wav", [("tone", 1.0)])
+        downloads = []
+
+        async def fake_download(bucket, storage_path, dest, **kwargs):
+            downloads.append(storage_path)
+            Path(dest).write_bytes(source.read_bytes())
+            return source.stat().st_size
+
+        monkeypatch.setattr(transcription, "download_to_file", fake_download)
+        client = StubWhisperClient()
+        service = TranscriptionService(client=client)
+
+        await service.transcribe_from_storage("r/visit.wav", checkpoint=checkpoint)
+        await service.transcribe_from_storage("r/visit.wav", checkpoint=checkpoint)
+
+        assert downloads == ["r/visit.wav"]
+        kept = Path(checkpoint.get("audio")["path"])
+        assert kept.exists()
+
+        transcription.discard_progress(checkpoint)
+        assert not kept.exists()
+        assert checkpoint.get("audio") is None
+
+    @pytest.mark.parametrize("keep_progress", [True, False])
+    async def test_failed_job_keeps_download_only_for_retry(
+        self, tmp_path, monkeypatch, fake_db, keep_progress
+    ):
+        """Test a failure deletes the downloaded recording unless a retry will resume it."""
+        from app.services import transcription
+        from app.services.checkpoints import CheckpointStore
+
+        store = CheckpointStore()
+        monkeypatch.setattr(transcription, "get_supabase_client", lambda: fake_db)
+        monkeypatch.setattr(transcription, "get_checkpoint_store", lambda: store)
+        monkeypatch.setattr(transcription.settings, "checkpoint_dir", str(tmp_path))
+        source = write_wav(tmp_path / "source.wav", [("tone", 1.0)])
+
+        async def fake_download(bucket, storage_path, dest, **kwargs):
+            Path(dest).write_bytes(source.read_bytes())
+            return source.stat().st_size
+
+        async def fail(self, audio_path, language="en", checkpoint=None):
+            raise RuntimeError("Whisper unavailable")
+
+        monkeypatch.setattr(transcription, "download_to_file", fake_download)
+        monkeypatch.setattr(TranscriptionService, "transcribe", fail)
+        recording = fake_db.table("recordings").insert({"storage_path": "r/visit.wav"}).execute()
+        transcript = fake_db.table("transcripts").insert({"status": "pending"}).execute()
+        transcript_id = transcript.data[0]["id"]
+
+        with pytest.raises(RuntimeError):
+            await transcription.process_transcription_task(
+                transcript_id, recording.data[0]["id"], keep_progress=keep_progress
+            )
+
+        kept = list((tmp_path / "notesmith-checkpoints").iterdir())
+        assert bool(kept) is keep_progress
+        saved = transcription.transcription_checkpoint(transcript_id).get("audio")
+        assert (saved is not None) is keep_progress
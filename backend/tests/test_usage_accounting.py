@@ -0,0 +1,327 @@
+"""Tests for LLM token and cost accounting."""
+
+import re
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.api.deps import get_current_active_user, get_db
+from app.core.metrics import metrics
+from app.main import app
+from app.models.notes import AnalysisResult
+from app.models.users import User, UserRole
+from app.services import note_generator
+from app.services.analysis_store import AnalysisStore
+from app.services.llm.anthropic_provider import AnthropicProvider
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.services.llm.pricing import model_price, usage_cost
+from app.services.llm.usage import LLMUsage, collect_usage, record_usage
+from app.services.usage_accounting import rollup, split_usage
+
+
+class MeteredProvider(BaseLLMProvider):
+    """Provider that reports fixed usage for every call."""
+
+    name = "metered"
+    model = "gpt-4o"
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        record_usage(LLMUsage(self.name, self.model, 1000, 200, operation="analysis"))
+        return AnalysisResult(chief_complaint="Toothache")
+
+    async def generate_note(self, transcript, template, analysis=None):
+        record_usage(LLMUsage(self.name, self.model, 1200, 301, 1024, operation="generation"))
+        return "note"
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        record_usage(LLMUsage(self.name, self.model, 1500, 601, 1024, operation="generation"))
+        keys = re.findall(r"^=== NOTE (\S+) ===$", prompt, re.MULTILINE)
+        return "\n".join(f"=== NOTE {key} ===\nnote {key}\n=== END NOTE {key} ===" for key in keys)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def practice(fake_db, monkeypatch):
+    """A practice with one appointment, its transcript and two draft notes."""
+    LLMProviderFactory.register("metered", MeteredProvider)
+    monkeypatch.setattr(note_generator.settings, "default_llm_provider", "metered")
+    monkeypatch.setattr(note_generator.settings, "llm_rate_limit_enabled", False)
+    monkeypatch.setattr(note_generator, "get_supabase_client", lambda: fake_db)
+    monkeypatch.setattr(note_generator, "_analysis_store", AnalysisStore(fake_db))
+
+    def insert(table, row):
+        return fake_db.table(table).insert(row).execute().data[0]["id"]
+
+    practice_id = insert("practices", {"name": "Smile Dental"})
+    appointment_id = insert("appointments", {"practice_id": practice_id})
+    recording_id = insert("recordings", {"appointment_id": appointment_id})
+    transcript_id = insert("transcripts", {"recording_id": recording_id})
+    templates = [insert("templates", {"content": name}) for name in ("SOAP", "Referral")]
+    notes = [
+        insert("clinical_notes", {
+            "transcript_id": transcript_id, "template_id": template_id, "status": "draft"
+        })
+        for template_id in templates
+    ]
+    return SimpleNamespace(
+        id=practice_id, appointment_id=appointment_id, templates=templates, notes=notes
+    )
+
+
+class TestPricing:
+    """Tests for model prices and call costs."""
+
+    def test_dated_models_match_by_prefix(self):
+        """Test dated releases use their family's price, preferring the longest match."""
+        assert model_price("claude-sonnet-4-20250514").input == 3.0
+        assert model_price("gpt-4o-mini-2024-07-18").input == 0.15
+        assert model_price("llama3.1") is None
+
+    def test_cached_tokens_priced_separately(self):
+        """Test cache reads and writes are billed at their own rates."""
+        usage = LLMUsage(
+            "anthropic", "claude-sonnet-4-20250514",
+            input_tokens=1_000_000, output_tokens=100_000,
+            cache_read_tokens=500_000, cache_write_tokens=100_000,
+        )
+
+        # 400k uncached * $3 + 500k * $0.30 + 100k * $3.75 + 100k * $15, per million
+        assert usage_cost(usage) == pytest.approx(1.2 + 0.15 + 0.375 + 1.5)
+
+    def test_settings_override_prices(self, monkeypatch):
+        """Test LLM_PRICING adds models, with cache reads at the input price by default."""
+        from app.services.llm import pricing
+
+        monkeypatch.setattr(
+            pricing.settings, "llm_pricing", {"llama": {"input": 1.0, "output": 2.0}}
+        )
+        usage = LLMUsage("ollama", "llama3.1", 2_000_000, 1_000_000, cache_read_tokens=1_000_000)
+
+        assert usage_cost(usage) == pytest.approx(4.0)
+        assert usage_cost(LLMUsage("ollama", "mistral", 1_000_000)) == 0.0
+
+
+class TestSplitUsage:
+    """Tests for dividing shared calls between notes."""
+
+    def test_shares_add_up(self):
+        """Test whole-token shares sum to the call's usage and keep its latency."""
+        usage = LLMUsage("openai", "gpt-4o", 1001, 7, 500, latency_ms=900.0)
+
+        shares = split_usage(usage, 3)
+
+        assert [s.input_tokens for s in shares] == [334, 334, 333]
+        assert sum(s.output_tokens for s in shares) == 7
+        assert sum(s.cache_read_tokens for s in shares) == 500
+        assert {s.latency_ms for s in shares} == {900.0}
+
+
+class TestRecordNoteUsage:
+    """Tests for attributing usage to notes, appointments and practices."""
+
+    async def test_single_note_usage_stored(self, practice, fake_db):
+        """Test a note's analysis and generation are stored with their attribution."""
+        note_id = practice.notes[0]
+
+        await note_generator.generate_clinical_note_task(note_id, "Transcript", "SOAP")
+
+        rows = fake_db.tables["llm_usage"]
+        assert [row["operation"] for row in rows] == ["analysis", "generation"]
+        for row in rows:
+            assert row["note_id"] == note_id
+            assert row["template_id"] == practice.templates[0]
+            assert row["appointment_id"] == practice.appointment_id
+            assert row["practice_id"] == practice.id
+        assert rows[1]["cost_usd"] == pytest.approx(
+            (176 * 2.5 + 1024 * 1.25 + 301 * 10) / 1_000_000
+        )
+
+    async def test_batched_usage_split_between_notes(self, practice, fake_db):
+        """Test shared calls are divided so per-note totals add up to the calls."""
+        n1, n2 = practice.notes
+
+        with collect_usage() as usage:
+            await note_generator.generate_clinical_notes_task(
+                [[n1, "SOAP"], [n2, "Referral"]], "Transcript"
+            )
+
+        rows = fake_db.tables["llm_usage"]
+        assert len(rows) == 2 * len(usage)
+        assert sum(row["input_tokens"] for row in rows) == sum(u.input_tokens for u in usage)
+        assert sum(row["output_tokens"] for row in rows) == 801
+        per_note = {
+            note_id: sum(r["output_tokens"] for r in rows if r["note_id"] == note_id)
+            for note_id in (n1, n2)
+        }
+        assert per_note == {n1: 401, n2: 400}
+
+    async def test_streamed_note_usage_stored(self, practice, fake_db):
+        """Test usage recorded while the stream is consumed is attributed to the note."""
+        note_id = practice.notes[0]
+
+        parts = [
+            text
+            async for text in note_generator.stream_clinical_note(note_id, "Transcript", "SOAP")
+        ]
+
+        assert parts == ["note"]
+        rows = fake_db.tables["llm_usage"]
+        assert [row["operation"] for row in rows] == ["analysis", "generation"]
+        assert {row["note_id"] for row in rows} == {note_id}
+
+    async def test_pre_analysis_attributed_to_its_notes(self, practice, fake_db):
+        """Test the analysis run before the note tasks is split between their notes."""
+        n1, n2 = practice.notes
+
+        await note_generator.analyze_for_notes("Transcript", [[n1, "SOAP"], [n2, "Referral"]])
+        await note_generator.generate_clinical_note_task(n1, "Transcript", "SOAP")
+
+        rows = fake_db.tables["llm_usage"]
+        analysis = [row for row in rows if row["operation"] == "analysis"]
+        assert {row["note_id"]: row["input_tokens"] for row in analysis} == {n1: 500, n2: 500}
+        # The note task reused the stored analysis
+        assert [row["operation"] for row in rows if row["note_id"] == n1] == [
+            "analysis", "generation"
+        ]
+
+    async def test_failed_generation_still_counted(self, practice, fake_db, monkeypatch):
+        """Test tokens spent before a failure are recorded."""
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("provider unavailable")
+
+        monkeypatch.setattr(MeteredProvider, "generate_note", fail)
+
+        with pytest.raises(RuntimeError):
+            await note_generator.generate_clinical_note_task(
+                practice.notes[0], "Transcript", "SOAP"
+            )
+
+        (row,) = fake_db.tables["llm_usage"]
+        assert row["operation"] == "analysis"
+
+
+class TestProviderUsage:
+    """Tests for latency and operation reported by providers."""
+
+    async def test_anthropic_reports_latency_and_operation(self):
+        """Test each call records how long it took and what it was for."""
+
+        async def create(**kwargs):
+            usage = SimpleNamespace(
+                input_tokens=10,
+                output_tokens=5,
+                cache_read_input_tokens=0,
+                cache_creation_input_tokens=0,
+            )
+            if kwargs.get("tools"):
+                block = SimpleNamespace(type="tool_use", input={})
+            else:
+                block = SimpleNamespace(type="text", text="note")
+            return SimpleNamespace(content=[block], usage=usage)
+
+        provider = AnthropicProvider.__new__(AnthropicProvider)
+        provider.model = "claude-test"
+        provider.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+
+        with collect_usage() as usage:
+            await provider.analyze_transcript("Transcript")
+            await provider.generate_note("Transcript", "SOAP")
+
+        assert [u.operation for u in usage] == ["analysis", "generation"]
+        assert all(u.latency_ms > 0 for u in usage)
+        assert metrics.get("llm_latency_ms", provider="anthropic", model="claude-test") > 0
+
+
+@pytest.fixture
+def usage_client(client, fake_db, practice):
+    """Test client for a user of the practice, with usage rows from two practices."""
+    user = User(
+        id=uuid4(),
+        email="dentist@example.com",
+        full_name="Test Dentist",
+        role=UserRole.DENTIST,
+        practice_id=practice.id,
+        created_at=datetime.now(UTC),
+    )
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    def row(note_id, template_id, practice_id, created_at, **usage):
+        return {
+            "note_id": note_id,
+            "template_id": template_id,
+            "appointment_id": practice.appointment_id,
+            "practice_id": practice_id,
+            "provider": "openai",
+            "model": "gpt-4o",
+            "operation": "generation",
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+            "latency_ms": 100.0,
+            "cost_usd": 0.0,
+            "created_at": created_at,
+            **usage,
+        }
+
+    (n1, n2), (t1, t2) = practice.notes, practice.templates
+    fake_db.tables["llm_usage"] = [
+        row(n1, t1, practice.id, "2026-01-01T00:00:00+00:00", input_tokens=100, cost_usd=0.5),
+        row(n1, t1, practice.id, "2026-02-01T00:00:00+00:00", output_tokens=50, cost_usd=0.25,
+            operation="analysis", latency_ms=300.0),
+        row(n2, t2, practice.id, "2026-03-01T00:00:00+00:00", input_tokens=10, cost_usd=0.125),
+        row(n1, t1, str(uuid4()), "2026-01-01T00:00:00+00:00", input_tokens=999, cost_usd=9.0),
+    ]
+    yield client
+    app.dependency_overrides.clear()
+
+
+class TestUsageAPI:
+    """Tests for the usage rollup endpoints."""
+
+    def test_note_usage(self, usage_client, practice):
+        """Test a note's rollup covers only its own practice's rows."""
+        response = usage_client.get(f"/api/v1/usage/notes/{practice.notes[0]}")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["totals"]["requests"] == 2
+        assert body["totals"]["input_tokens"] == 100
+        assert body["totals"]["cost_usd"] == 0.75
+        assert body["totals"]["avg_latency_ms"] == 200.0
+        assert set(body["by_operation"]) == {"analysis", "generation"}
+
+    def test_appointment_usage_by_template(self, usage_client, practice):
+        """Test an appointment's rollup breaks cost down per template."""
+        response = usage_client.get(f"/api/v1/usage/appointments/{practice.appointment_id}")
+
+        by_template = response.json()["by_template"]
+        assert by_template[practice.templates[0]]["cost_usd"] == 0.75
+        assert by_template[practice.templates[1]]["cost_usd"] == 0.125
+
+    def test_practice_usage_over_period(self, usage_client):
+        """Test the practice rollup honours since and until."""
+        everything = usage_client.get("/api/v1/usage/practice").json()
+        february = usage_client.get(
+            "/api/v1/usage/practice",
+            params={"since": "2026-01-15T00:00:00Z", "until": "2026-02-15T00:00:00Z"},
+        ).json()
+
+        assert everything["totals"]["requests"] == 3
+        assert everything["totals"]["cost_usd"] == 0.875
+        assert february["totals"]["requests"] == 1
+        assert february["totals"]["output_tokens"] == 50
+
+    def test_rollup_of_no_rows(self):
+        """Test an empty rollup is all zeros."""
+        assert rollup([]).totals.requests == 0
@@ -0,0 +1,134 @@
+"""Tests for the persistent Celery worker event loop."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.llm.base import BaseLLMProvider, LLMProviderFactory
+from app.workers.loop import WorkerLoop
+
+
+class ClosingProvider(BaseLLMProvider):
+    """Provider that only records when it is closed."""
+
+    name = "fake-worker-loop"
+    closed = 0
+
+    async def analyze_transcript(self, transcript, context=None, fields=None):
+        raise NotImplementedError
+
+    async def generate_note(self, transcript, template, analysis=None):
+        raise NotImplementedError
+
+    async def complete(self, prompt, system_prompt=None, max_tokens=4096, temperature=0.3):
+        raise NotImplementedError
+
+    async def aclose(self):
+        ClosingProvider.closed += 1
+
+
+@pytest.fixture
+def loop():
+    """A worker loop that is stopped after the test."""
+    worker_loop = WorkerLoop()
+    yield worker_loop
+    worker_loop.stop()
+
+
+async def current_loop():
+    return asyncio.get_running_loop()
+
+
+class TestWorkerLoop:
+    """Tests for running task coroutines on one long-lived loop."""
+
+    def test_same_loop_across_tasks(self, loop):
+        """Test consecutive tasks run on the same event loop."""
+        first = loop.run(current_loop())
+        second = loop.run(current_loop())
+
+        assert first is second
+        assert not first.is_closed()
+
+    def test_providers_survive_across_tasks(self, loop):
+        """Test a shared provider built by one task is reused by the next."""
+        LLMProviderFactory.register("fake-worker-loop", ClosingProvider)
+
+        async def provider():
+            return LLMProviderFactory.get_provider("fake-worker-loop")
+
+        assert loop.run(provider()) is loop.run(provider())
+
+    def test_stop_closes_providers(self, loop):
+        """Test stopping the loop closes providers bound to it."""
+        LLMProviderFactory.register("fake-worker-loop", ClosingProvider)
+        ClosingProvider.closed = 0
+
+        async def provider():
+            return LLMProviderFactory.get_provider("fake-worker-loop")
+
+        event_loop = loop.run(current_loop())
+        loop.run(provider())
+        loop.stop()
+
+        assert ClosingProvider.closed == 1
+        assert event_loop.is_closed()
+        assert not loop.running
+
+    def test_restarts_after_stop(self, loop):
+        """Test the loop starts again on demand after being stopped."""
+        first = loop.run(current_loop())
+        loop.stop()
+
+        assert loop.run(current_loop()) is not first
+
+    def test_exceptions_propagate(self, loop):
+        """Test errors raised by the coroutine reach the caller."""
+
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            loop.run(fail())
+
+    def test_concurrent_submissions_overlap(self, loop):
+        """Test coroutines submitted from several threads run concurrently."""
+        results = []
+
+        def submit():
+            results.append(loop.run(asyncio.sleep(0.2, result=True)))
+
+        threads = [threading.Thread(target=submit) for _ in range(5)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [True] * 5
+        assert time.perf_counter() - start < 0.6
+
+    def test_in_flight_limit(self):
+        """Test no more than max_in_flight coroutines run at once."""
+        loop = WorkerLoop(max_in_flight=2)
+        active = []
+        peak = []
+
+        async def job():
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.05)
+            active.pop()
+
+        threads = [threading.Thread(target=loop.run, args=(job(),)) for _ in range(6)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            loop.stop()
+
+        assert max(peak) == 2
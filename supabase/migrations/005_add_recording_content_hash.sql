@@ -0,0 +1,9 @@
+-- Add content_hash to recordings
+-- SHA-256 of the uploaded audio, computed while the upload is streamed to storage
+
+ALTER TABLE recordings
+ADD COLUMN content_hash VARCHAR(64);
+
+CREATE INDEX idx_recordings_content_hash ON recordings(content_hash);
+
+COMMENT ON COLUMN recordings.content_hash IS 'SHA-256 hex digest of the uploaded audio file';
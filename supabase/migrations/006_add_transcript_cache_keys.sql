@@ -0,0 +1,13 @@
+-- Add cache keys to transcripts
+-- Completed transcripts are reused when identical audio is uploaded again,
+-- keyed by (audio_hash, language, model)
+
+ALTER TABLE transcripts
+ADD COLUMN audio_hash VARCHAR(64),
+ADD COLUMN model VARCHAR(50);
+
+CREATE INDEX idx_transcripts_cache_key ON transcripts(audio_hash, language, model)
+WHERE status = 'completed';
+
+COMMENT ON COLUMN transcripts.audio_hash IS 'content_hash of the recording this transcript was produced from';
+COMMENT ON COLUMN transcripts.model IS 'Transcription model used (e.g. whisper-1)';
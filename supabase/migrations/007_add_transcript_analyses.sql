@@ -0,0 +1,21 @@
+-- Transcript analyses shared across note generations
+-- One analysis per (transcript content, provider, model, prompt version) is
+-- reused by every note generated from that transcript
+
+CREATE TABLE transcript_analyses (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    cache_key VARCHAR(255) NOT NULL UNIQUE,
+    transcript_hash VARCHAR(64) NOT NULL,
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(20) NOT NULL,
+    analysis JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_transcript_analyses_transcript_hash ON transcript_analyses(transcript_hash);
+
+-- Only the backend (service role) reads or writes analyses
+ALTER TABLE transcript_analyses ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE transcript_analyses IS 'Cached LLM analyses keyed by transcript hash, provider, model and prompt version';
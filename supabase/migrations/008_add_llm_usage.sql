@@ -0,0 +1,34 @@
+-- LLM usage and cost accounting
+-- One row per LLM call (or per note's share of a batched call), attributed
+-- to the note, template, appointment and practice it was made for
+
+CREATE TABLE llm_usage (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    note_id UUID REFERENCES clinical_notes(id) ON DELETE SET NULL,
+    template_id UUID REFERENCES templates(id) ON DELETE SET NULL,
+    appointment_id UUID REFERENCES appointments(id) ON DELETE SET NULL,
+    practice_id UUID REFERENCES practices(id) ON DELETE CASCADE,
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    operation VARCHAR(20) NOT NULL, -- 'analysis', 'generation', 'completion'
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_llm_usage_note_id ON llm_usage(note_id);
+CREATE INDEX idx_llm_usage_appointment_id ON llm_usage(appointment_id);
+CREATE INDEX idx_llm_usage_practice_created ON llm_usage(practice_id, created_at);
+
+-- Written by the backend (service role); readable within the practice
+ALTER TABLE llm_usage ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view LLM usage for their practice"
+    ON llm_usage FOR SELECT
+    USING (practice_id = get_user_practice_id());
+
+COMMENT ON TABLE llm_usage IS 'Tokens, latency and estimated cost of LLM calls per note, appointment and practice';
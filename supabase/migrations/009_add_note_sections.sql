@@ -0,0 +1,8 @@
+-- Add section boundaries to clinical notes
+-- Generated notes are stored split at their template's headings (SUBJECTIVE:,
+-- PLAN:, ...) so single sections can be regenerated without the rest
+
+ALTER TABLE clinical_notes
+ADD COLUMN sections JSONB NOT NULL DEFAULT '[]';
+
+COMMENT ON COLUMN clinical_notes.sections IS 'Generated content split into [{name, heading, content}] at the template''s section headings';